@@ -0,0 +1 @@
+"""Módulo de cache em memória (LRU + TTL) para resultados dos controles."""
@@ -0,0 +1,50 @@
+"""Cache de respostas completas do pipeline (LLM + sanitização de saída).
+
+Para provedores determinísticos (mock, Ollama com temperatura baixa), o mesmo
+prompt sanitizado gera a mesma resposta. A chave combina o prompt normalizado
+com provedor, modelo e versões das regras (firewall, recognizers), de modo que
+trocar qualquer um deles não reaproveita respostas antigas. Trocar o provedor
+em /api/provider esvazia o cache por completo.
+"""
+import unicodedata
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from cache.ttl_cache import TTLCache, make_key
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Forma canônica do prompt: NFC e espaços colapsados."""
+    return " ".join(unicodedata.normalize("NFC", prompt or "").split())
+
+
+class ResponseCache:
+    """Respostas (llm_response + saída sanitizada) por prompt e versões do pipeline."""
+
+    def __init__(
+        self,
+        version_parts: Callable[[], Sequence[object]],
+        max_size: int = 1000,
+        ttl: float = 300.0,
+        enabled: bool = False,
+    ):
+        # Provedor, modelo e versões das regras no momento da consulta
+        self.version_parts = version_parts
+        self.enabled = enabled
+        self.cache = TTLCache(max_size=max_size, ttl=ttl)
+
+    def key(self, prompt: str) -> str:
+        return make_key(*self.version_parts(), normalize_prompt(prompt))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.cache.get(key)
+
+    def set(self, key: str, llm_response: Dict[str, Any], output: Dict[str, Any]) -> None:
+        # Só respostas bem-sucedidas do próprio provedor (nem falhas, nem fallback)
+        if llm_response.get("success") and not llm_response.get("fallback_from"):
+            self.cache.set(key, {"llm_response": llm_response, "output": output})
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+    def stats(self) -> Dict[str, object]:
+        return {"enabled": self.enabled, **self.cache.stats()}
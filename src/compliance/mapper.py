@@ -34,13 +34,20 @@ class ComplianceMapper:
                 "enisa": ["ENISA AI Security Guidelines"]
             }
         }
+        # Nomes usados pelo pipeline (main.py) -> nomes do mapeamento
+        self.control_aliases = {
+            "firewall": "firewall_llm",
+            "input_sanitizer": "input_sanitization",
+            "rbac": "rbac_adaptive",
+            "output_sanitizer": "output_sanitization",
+        }
     
     def map_controls(self, controls_applied: List[str]) -> Dict[str, any]:
         """
         Mapeia controles aplicados para requisitos de conformidade.
         
         Args:
-            controls_applied: Lista de controles aplicados
+            controls_applied: Lista de controles aplicados (nomes ou dicts {"control": ...})
         
         Returns:
             Dict com mapeamento de conformidade
@@ -53,7 +60,9 @@ class ComplianceMapper:
         }
         
         # Mapeia cada controle
-        for control in controls_applied:
+        for item in controls_applied:
+            control = item.get("control") if isinstance(item, dict) else item
+            control = self.control_aliases.get(control, control)
             if control in self.control_mappings:
                 compliance_evidence["compliance_mapping"][control] = self.control_mappings[control]
                 
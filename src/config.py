@@ -14,6 +14,19 @@ LLM_PROVIDER = os.getenv("LLM_PROVIDER", "mock")
 # Configurações do Ollama (se LLM_PROVIDER=ollama)
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1")
+# Pool de conexões persistentes com o Ollama e timeouts (segundos)
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "20"))
+OLLAMA_MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "10"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "30"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "60"))
+OLLAMA_POOL_TIMEOUT = float(os.getenv("OLLAMA_POOL_TIMEOUT", "10"))
+# Vários backends Ollama: EWMA de latência, ejeção após falhas consecutivas e hedge pelo p95
+OLLAMA_EWMA_ALPHA = float(os.getenv("OLLAMA_EWMA_ALPHA", "0.3"))
+OLLAMA_EJECT_AFTER = int(os.getenv("OLLAMA_EJECT_AFTER", "3"))
+OLLAMA_EJECT_SECONDS = float(os.getenv("OLLAMA_EJECT_SECONDS", "30"))
+OLLAMA_HEDGE_MIN_DELAY = float(os.getenv("OLLAMA_HEDGE_MIN_DELAY", "0.05"))  # segundos
+OLLAMA_HEDGE_MIN_SAMPLES = int(os.getenv("OLLAMA_HEDGE_MIN_SAMPLES", "20"))
 
 # Configurações da aplicação
 APP_ENV = os.getenv("APP_ENV", "dev")
@@ -25,5 +38,137 @@ CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8001"))
 
 # Configurações de segurança
 MAX_PROMPT_LENGTH = int(os.getenv("MAX_PROMPT_LENGTH", "5000"))
+# Prompts acima de MAX_PROMPT_LENGTH e até este limite são varridos em janelas
+# sobrepostas (0 desativa: prompts longos continuam sendo rejeitados)
+FIREWALL_STREAM_MAX_LENGTH = int(os.getenv("FIREWALL_STREAM_MAX_LENGTH", "0"))
+FIREWALL_WINDOW_SIZE = int(os.getenv("FIREWALL_WINDOW_SIZE", "8192"))
+# Extensão máxima de uma regra na varredura em janelas (espaços já colapsados);
+# regras acima disso, ou sem limite, são recusadas quando a varredura está ativa
+FIREWALL_MAX_RULE_SPAN = int(os.getenv("FIREWALL_MAX_RULE_SPAN", "256"))
+# Orçamento de CPU (time.thread_time) por requisição na varredura em janelas (ms)
+FIREWALL_SCAN_BUDGET_MS = float(os.getenv("FIREWALL_SCAN_BUDGET_MS", "50"))
+# Classificador de n-gramas (2º estágio, só com sinais fracos); vazio desativa
+FIREWALL_CLASSIFIER_PATH = os.getenv("FIREWALL_CLASSIFIER_PATH", "")
+# Peso do classificador no risk_score final (0-1)
+FIREWALL_CLASSIFIER_WEIGHT = float(os.getenv("FIREWALL_CLASSIFIER_WEIGHT", "0.5"))
+# Probabilidade a partir da qual o classificador bloqueia sozinho
+FIREWALL_CLASSIFIER_THRESHOLD = float(os.getenv("FIREWALL_CLASSIFIER_THRESHOLD", "0.9"))
 RATE_LIMIT_REQUESTS = int(os.getenv("RATE_LIMIT_REQUESTS", "100"))
 RATE_LIMIT_WINDOW = int(os.getenv("RATE_LIMIT_WINDOW", "60"))  # segundos
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+# Teto de chaves (IPs/usuários) com bucket em memória; as menos recentes são descartadas
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Regras do firewall (bundle JSON versionado; vazio = firewall_llm/rules.json)
+FIREWALL_RULES_PATH = os.getenv("FIREWALL_RULES_PATH", "")
+# Intervalo (s) para verificar mudanças no arquivo de regras; 0 desativa
+FIREWALL_RULES_WATCH_INTERVAL = float(os.getenv("FIREWALL_RULES_WATCH_INTERVAL", "0"))
+
+# Cache de vereditos (firewall) e de resultados do Presidio; tamanho 0 desativa
+VERDICT_CACHE_SIZE = int(os.getenv("VERDICT_CACHE_SIZE", "10000"))
+VERDICT_CACHE_TTL = float(os.getenv("VERDICT_CACHE_TTL", "300"))  # segundos
+
+# Presidio: idiomas preferidos (o primeiro suportado é resolvido uma vez por processo)
+PII_LANGUAGES = [lang.strip() for lang in os.getenv("PII_LANGUAGES", "pt,en").split(",") if lang.strip()]
+# Carrega o pipeline NLP no startup em vez de no primeiro request
+PII_WARMUP = os.getenv("PII_WARMUP", "false").lower() in ("1", "true", "yes")
+# Pré-triagem por regex: pula o NER quando não há nenhum sinal de PII
+PII_PRESCREEN = os.getenv("PII_PRESCREEN", "true").lower() in ("1", "true", "yes")
+# Força o NER em todos os textos, ignorando a pré-triagem (ex.: nomes só em minúsculas)
+PII_FORCE_NER = os.getenv("PII_FORCE_NER", "false").lower() in ("1", "true", "yes")
+# Execução da análise de PII: "inline" (no próprio worker) ou "process" (pool de processos)
+PII_EXECUTION_MODE = os.getenv("PII_EXECUTION_MODE", "inline").strip().lower()
+PII_POOL_WORKERS = int(os.getenv("PII_POOL_WORKERS", str(os.cpu_count() or 1)))
+PII_POOL_MAX_PENDING = int(os.getenv("PII_POOL_MAX_PENDING", "64"))
+PII_POOL_TIMEOUT = float(os.getenv("PII_POOL_TIMEOUT", "5"))  # segundos
+# Análises que estouraram o timeout e seguem presas no worker; ao atingir o limite
+# o pool é recriado e os workers antigos encerrados (0 = número de workers)
+PII_POOL_MAX_STUCK = int(os.getenv("PII_POOL_MAX_STUCK", "0"))
+# Análise em lote (sanitize_many): textos por lote do spaCy e teto de caracteres por bloco
+PII_BATCH_SIZE = int(os.getenv("PII_BATCH_SIZE", "32"))
+PII_BATCH_MAX_CHARS = int(os.getenv("PII_BATCH_MAX_CHARS", "1000000"))
+# Streaming (/chat/stream): cauda retida para pegar PII/termos divididos entre chunks
+STREAM_HOLDBACK_CHARS = int(os.getenv("STREAM_HOLDBACK_CHARS", "64"))
+# Mínimo de caracteres novos antes de sanitizar e emitir um trecho
+STREAM_MIN_FLUSH_CHARS = int(os.getenv("STREAM_MIN_FLUSH_CHARS", "32"))
+
+# RBAC: janela do fator de frequência (s), requisições guardadas por usuário e teto de usuários em memória
+RBAC_HISTORY_WINDOW = float(os.getenv("RBAC_HISTORY_WINDOW", "300"))
+RBAC_HISTORY_MAX_PER_USER = int(os.getenv("RBAC_HISTORY_MAX_PER_USER", "100"))
+RBAC_HISTORY_MAX_USERS = int(os.getenv("RBAC_HISTORY_MAX_USERS", "100000"))
+# Backend do histórico do RBAC: "memory" (por processo) ou "sqlite" (compartilhado entre workers do host)
+RBAC_STATE_BACKEND = os.getenv("RBAC_STATE_BACKEND", "memory").strip().lower()
+RBAC_STATE_PATH = os.getenv("RBAC_STATE_PATH", "data/rbac_state.db")
+# Intervalo máximo (s) entre gravações em lote dos incrementos no backend sqlite
+RBAC_STATE_FLUSH_INTERVAL = float(os.getenv("RBAC_STATE_FLUSH_INTERVAL", "0.05"))
+# Política do RBAC adaptativo (JSON; vazio = rbac_adaptativo/policy.json)
+RBAC_POLICY_PATH = os.getenv("RBAC_POLICY_PATH", "")
+
+# Executor dedicado às etapas CPU-bound do /chat (firewall, Presidio) no modo assíncrono
+CPU_STAGE_WORKERS = int(os.getenv("CPU_STAGE_WORKERS", str(os.cpu_count() or 1)))
+# Ordem das etapas do /chat (etapas baratas que só rejeitam vêm antes das caras;
+# o RBAC completo pontua o prompt já sanitizado, como no fluxo original). O llm
+# exige firewall, input_sanitizer e rbac antes dele, e output_sanitizer é obrigatório.
+PIPELINE_STAGES = [
+    s.strip() for s in os.getenv(
+        "PIPELINE_STAGES",
+        "length_check,rbac_role_gate,firewall,input_sanitizer,rbac,response_cache,llm,output_sanitizer",
+    ).split(",") if s.strip()
+]
+
+# Métricas: diretório compartilhado entre workers do uvicorn (vazio = só o próprio processo)
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1"))
+
+# Corpo da resposta do /chat: "full" (controles e evidências) ou "compact" (veredito, resposta, request_id, risk_score)
+RESPONSE_VERBOSITY = os.getenv("RESPONSE_VERBOSITY", "full").strip().lower()
+# Trilha de auditoria (resposta completa por request_id): JSONL durável compartilhado
+# pelos workers do host, com cache local das entradas recentes
+AUDIT_LOG_PATH = os.getenv("AUDIT_LOG_PATH", "data/audit_log.jsonl")
+# Rotação do JSONL: tamanho máximo do arquivo ativo e quantos rotacionados manter
+AUDIT_LOG_MAX_BYTES = int(os.getenv("AUDIT_LOG_MAX_BYTES", str(100 * 1024 * 1024)))
+AUDIT_LOG_BACKUPS = int(os.getenv("AUDIT_LOG_BACKUPS", "5"))
+AUDIT_TRAIL_SIZE = int(os.getenv("AUDIT_TRAIL_SIZE", "10000"))
+AUDIT_TRAIL_TTL = float(os.getenv("AUDIT_TRAIL_TTL", "3600"))  # segundos (só do cache local)
+
+# /chat/batch: itens por requisição e chamadas simultâneas ao provedor dentro do lote
+CHAT_BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "100"))
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "4"))
+
+# Cache de respostas completas (LLM + saída sanitizada); só faz sentido com provedores determinísticos
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))  # segundos
+
+# Coalescência de gerações idênticas em andamento (mesmo provedor, modelo e prompt)
+LLM_SINGLEFLIGHT_ENABLED = os.getenv("LLM_SINGLEFLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Circuit breaker por provedor de LLM (janela das últimas chamadas, limiares e tempo aberto)
+LLM_BREAKER_ENABLED = os.getenv("LLM_BREAKER_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))
+LLM_BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+# Chamada lenta: geração acima deste tempo; em streams, o tempo até o primeiro token
+LLM_BREAKER_SLOW_CALL_SECONDS = float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", "30"))
+LLM_BREAKER_SLOW_CALL_RATE = float(os.getenv("LLM_BREAKER_SLOW_CALL_RATE", "0.8"))
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+LLM_BREAKER_HALF_OPEN_CALLS = int(os.getenv("LLM_BREAKER_HALF_OPEN_CALLS", "1"))
+# Provedor usado quando o circuito do principal está aberto ou a chamada falha (vazio = sem fallback)
+LLM_FALLBACK_PROVIDER = os.getenv("LLM_FALLBACK_PROVIDER", "").strip().lower()
+
+# Porta de prioridade das chamadas ao LLM (0 = sem limite de concorrência)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "0"))
+# Classes "nome:peso:limite_da_fila" (WFQ) e papel -> classe; papéis desconhecidos vão para a de menor peso
+LLM_PRIORITY_CLASSES = {
+    name.strip(): (float(weight), int(max_queue))
+    for name, weight, max_queue in (
+        c.split(":") for c in os.getenv("LLM_PRIORITY_CLASSES", "high:8:100,normal:4:200,low:1:50").split(",") if c.strip()
+    )
+}
+LLM_PRIORITY_ROLES = dict(
+    r.strip().split(":") for r in os.getenv("LLM_PRIORITY_ROLES", "admin:high,user:normal,guest:low").split(",") if r.strip()
+)
+# risk_score a partir do qual a requisição cai para a classe de menor peso. Fica acima do
+# que papel + horário somam sozinhos na política padrão (user fora do horário = 50), então só
+# fatores de comportamento (prompt longo, alta frequência) rebaixam; abaixo de 60 (step_up)
+LLM_PRIORITY_DEMOTE_RISK = int(os.getenv("LLM_PRIORITY_DEMOTE_RISK", "55"))
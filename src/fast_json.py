@@ -0,0 +1,28 @@
+"""Serialização JSON rápida para as respostas da API.
+
+Os endpoints de chat devolvem dicts já prontos; passar por um Response
+próprio evita que o FastAPI revalide e reconverta os dicts aninhados com o
+Pydantic. Usa orjson quando disponível e cai para o json da biblioteca padrão.
+"""
+import json
+from typing import Any
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,165 @@
+"""Pacotes (bundles) versionados de regras do firewall.
+
+As regras ficam em um arquivo JSON externo:
+
+    {"version": "1.0.0",
+     "rules": [{"id": "...", "kind": "strong", "pattern": "...", "weight": 85, "version": 1}]}
+
+Um bundle é compilado por completo (incluindo o RuleMatcher) antes de entrar em
+uso, e a troca no firewall é uma simples atribuição de referência: requisições
+em andamento terminam com o bundle que já tinham em mãos.
+"""
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import FIREWALL_MAX_RULE_SPAN
+from firewall_llm.matcher import RuleMatcher
+
+DEFAULT_RULES_PATH = Path(__file__).with_name("rules.json")
+
+RULE_KINDS = ("strong", "weak_injection", "weak_jailbreak")
+
+
+@dataclass(frozen=True)
+class FirewallRule:
+    id: str
+    kind: str
+    pattern: str
+    weight: int
+    version: int = 1
+
+
+@dataclass(frozen=True)
+class RuleBundle:
+    """Conjunto imutável de regras já compiladas."""
+
+    version: str
+    rules: Tuple[FirewallRule, ...]
+    matcher: RuleMatcher
+    source: str
+    compiled_at: str
+    compile_ms: float
+
+    def info(self) -> Dict[str, object]:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "rule_count": len(self.rules),
+            "compiled_at": self.compiled_at,
+            "compile_ms": round(self.compile_ms, 3),
+        }
+
+
+def parse_rules(data: Dict[str, object]) -> Tuple[str, List[FirewallRule]]:
+    """Valida o conteúdo de um bundle e devolve (versão, regras)."""
+    if not isinstance(data, dict) or not isinstance(data.get("rules"), list):
+        raise ValueError("Bundle de regras inválido: esperado objeto com a lista 'rules'")
+
+    version = str(data.get("version") or "").strip()
+    if not version:
+        raise ValueError("Bundle de regras sem 'version'")
+    if not data["rules"]:
+        # Um bundle vazio desligaria o firewall sem aviso
+        raise ValueError("Bundle de regras sem regras")
+
+    rules: List[FirewallRule] = []
+    seen_ids = set()
+    for i, raw in enumerate(data["rules"]):
+        try:
+            rule = FirewallRule(
+                id=str(raw["id"]),
+                kind=str(raw["kind"]),
+                pattern=str(raw["pattern"]),
+                weight=int(raw["weight"]),
+                version=int(raw.get("version", 1)),
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Regra #{i} inválida: {e}") from e
+
+        if rule.kind not in RULE_KINDS:
+            raise ValueError(f"Regra '{rule.id}': kind desconhecido '{rule.kind}'")
+        if rule.id in seen_ids:
+            raise ValueError(f"Regra '{rule.id}' duplicada")
+        seen_ids.add(rule.id)
+        rules.append(rule)
+
+    return version, rules
+
+
+def compile_bundle(version: str, rules: List[FirewallRule], source: str = "<memory>") -> RuleBundle:
+    """Compila as regras (regex + pré-filtro) fora do caminho da requisição."""
+    start = time.perf_counter()
+    try:
+        matcher = RuleMatcher([(r.kind, r.pattern, r.weight) for r in rules], span_cap=FIREWALL_MAX_RULE_SPAN)
+    except Exception as e:
+        raise ValueError(f"Falha ao compilar bundle {version}: {e}") from e
+    compile_ms = (time.perf_counter() - start) * 1000
+
+    return RuleBundle(
+        version=version,
+        rules=tuple(rules),
+        matcher=matcher,
+        source=source,
+        compiled_at=datetime.utcnow().isoformat(),
+        compile_ms=compile_ms,
+    )
+
+
+def load_bundle(path: Optional[str] = None) -> RuleBundle:
+    """Lê e compila um bundle de regras a partir de um arquivo JSON."""
+    path = Path(path) if path else DEFAULT_RULES_PATH
+    with path.open("r", encoding="utf-8") as f:
+        data = json.load(f)
+    version, rules = parse_rules(data)
+    return compile_bundle(version, rules, source=str(path))
+
+
+class BundleWatcher:
+    """Observa o arquivo do bundle e recarrega quando ele muda (thread daemon)."""
+
+    def __init__(self, path: str, reload: Callable[[str], object], interval: float = 5.0):
+        self.path = str(path)
+        self.reload = reload
+        self.interval = interval
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._mtime = self._current_mtime()
+
+    def _current_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="firewall-rules-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            mtime = self._current_mtime()
+            if mtime is None or mtime == self._mtime:
+                continue
+            try:
+                self.reload(self.path)
+                self._mtime = mtime
+                self.last_error = None
+            except Exception as e:
+                # Bundle inválido: mantém o atual e tenta de novo na próxima mudança
+                self._mtime = mtime
+                self.last_error = str(e)
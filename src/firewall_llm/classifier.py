@@ -0,0 +1,187 @@
+"""Classificador de n-gramas com hashing (segundo estágio do firewall).
+
+Só é consultado quando a etapa de regex encontra sinais fracos: prompts limpos
+continuam passando apenas pelas regex. O modelo é uma regressão logística sobre
+n-gramas de caracteres e de palavras projetados por hashing em um vetor de
+tamanho fixo, treinada offline e carregada de um arquivo ``.npz`` local.
+
+Treino (corpus JSONL com {"text": ..., "label": 0|1}):
+
+    python -m firewall_llm.classifier corpus.jsonl modelo.npz
+"""
+import argparse
+import json
+import re
+import zlib
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy é opcional: sem ele o segundo estágio fica desativado
+    np = None
+
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("Dependência numpy não disponível. Instale 'numpy' para usar o classificador do firewall.")
+
+
+class HashedNgramClassifier:
+    """Regressão logística sobre n-gramas com hashing, pontuada com NumPy."""
+
+    def __init__(
+        self,
+        dim: int = 2 ** 15,
+        char_ngrams: Tuple[int, int] = (3, 5),
+        word_ngrams: int = 2,
+        weights=None,
+        bias: float = 0.0,
+        version: str = "untrained",
+    ):
+        _require_numpy()
+        self.dim = int(dim)
+        self.char_ngrams = (int(char_ngrams[0]), int(char_ngrams[1]))
+        self.word_ngrams = int(word_ngrams)
+        self.weights = np.zeros(self.dim, dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.version = version
+
+    # --- Features ---
+
+    def _hashed_indices(self, text: str) -> List[int]:
+        text = _WHITESPACE.sub(" ", text.lower()).strip()
+        padded = f" {text} "
+        dim = self.dim
+
+        indices = []
+        lo, hi = self.char_ngrams
+        for n in range(lo, hi + 1):
+            for i in range(len(padded) - n + 1):
+                indices.append(zlib.crc32(padded[i:i + n].encode("utf-8")) % dim)
+
+        words = _WORD.findall(text)
+        for n in range(1, self.word_ngrams + 1):
+            for i in range(len(words) - n + 1):
+                indices.append(zlib.crc32(("w:" + " ".join(words[i:i + n])).encode("utf-8")) % dim)
+
+        return indices
+
+    def vectorize(self, texts: Sequence[str]):
+        """Matriz (n_textos x dim) com contagens log-escaladas e normalizadas (L2)."""
+        X = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            idx = self._hashed_indices(text)
+            if idx:
+                X[row] = np.bincount(idx, minlength=self.dim)
+        np.log1p(X, out=X)
+        norms = np.linalg.norm(X, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        X /= norms
+        return X
+
+    # --- Inferência ---
+
+    def predict_proba(self, texts: Sequence[str]):
+        X = self.vectorize(texts)
+        return 1.0 / (1.0 + np.exp(-(X @ self.weights + self.bias)))
+
+    def score(self, text: str) -> float:
+        """Probabilidade (0-1) de o texto ser malicioso."""
+        return float(self.predict_proba([text])[0])
+
+    # --- Treino offline ---
+
+    def fit(
+        self,
+        texts: Sequence[str],
+        labels: Sequence[int],
+        epochs: int = 20,
+        learning_rate: float = 0.5,
+        l2: float = 1e-4,
+        batch_size: int = 256,
+        seed: int = 0,
+    ) -> "HashedNgramClassifier":
+        y_all = np.asarray(labels, dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        order = np.arange(len(texts))
+
+        # Vetoriza uma vez por lote fixo para não refazer o hashing a cada época
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            batches.append((self.vectorize([texts[i] for i in idx]), y_all[idx]))
+
+        for _ in range(epochs):
+            for b in rng.permutation(len(batches)):
+                X, y = batches[b]
+                p = 1.0 / (1.0 + np.exp(-(X @ self.weights + self.bias)))
+                err = p - y
+                grad_w = X.T @ err / len(y) + l2 * self.weights
+                self.weights -= learning_rate * grad_w.astype(np.float32)
+                self.bias -= learning_rate * float(err.mean())
+        return self
+
+    # --- Persistência ---
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            path,
+            weights=self.weights,
+            bias=np.float32(self.bias),
+            dim=np.int64(self.dim),
+            char_ngrams=np.asarray(self.char_ngrams, dtype=np.int64),
+            word_ngrams=np.int64(self.word_ngrams),
+            version=np.asarray(self.version),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "HashedNgramClassifier":
+        _require_numpy()
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                dim=int(data["dim"]),
+                char_ngrams=tuple(int(n) for n in data["char_ngrams"]),
+                word_ngrams=int(data["word_ngrams"]),
+                weights=data["weights"],
+                bias=float(data["bias"]),
+                version=str(data["version"]),
+            )
+
+
+def load_corpus(path: str) -> Tuple[List[str], List[int]]:
+    """Lê um corpus JSONL rotulado ({"text": ..., "label": 0|1})."""
+    texts: List[str] = []
+    labels: List[int] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            texts.append(str(item["text"]))
+            labels.append(int(item["label"]))
+    return texts, labels
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Treina o classificador de n-gramas do firewall.")
+    parser.add_argument("corpus", help="Arquivo JSONL com {'text': ..., 'label': 0|1}")
+    parser.add_argument("output", help="Arquivo .npz de saída")
+    parser.add_argument("--dim", type=int, default=2 ** 15)
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--version", default="1")
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    texts, labels = load_corpus(args.corpus)
+    clf = HashedNgramClassifier(dim=args.dim, version=args.version).fit(texts, labels, epochs=args.epochs)
+    clf.save(args.output)
+
+    acc = float(((clf.predict_proba(texts) >= 0.5) == np.asarray(labels, dtype=bool)).mean())
+    print(json.dumps({"samples": len(texts), "train_accuracy": round(acc, 4), "output": args.output}))
+
+
+if __name__ == "__main__":
+    main()
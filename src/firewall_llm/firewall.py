@@ -4,76 +4,206 @@ Objetivo prático:
 - Bloquear ataques claros (prompt injection / jailbreak).
 - Evitar falso-positivo: quando não há problema, deve seguir normalmente.
 """
-import re
-from typing import Dict, List, Tuple
-
-from config import MAX_PROMPT_LENGTH
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from cache.ttl_cache import TTLCache, make_key
+from config import (
+    FIREWALL_CLASSIFIER_PATH,
+    FIREWALL_CLASSIFIER_THRESHOLD,
+    FIREWALL_CLASSIFIER_WEIGHT,
+    FIREWALL_RULES_PATH,
+    FIREWALL_SCAN_BUDGET_MS,
+    FIREWALL_STREAM_MAX_LENGTH,
+    FIREWALL_WINDOW_SIZE,
+    MAX_PROMPT_LENGTH,
+    VERDICT_CACHE_SIZE,
+    VERDICT_CACHE_TTL,
+)
+from firewall_llm.bundle import DEFAULT_RULES_PATH, RuleBundle, load_bundle
+from firewall_llm.classifier import HashedNgramClassifier
+from firewall_llm.matcher import collapse_whitespace
 
 
 class LLMFirewall:
     """Firewall para detectar e bloquear prompt injection e jailbreaks."""
 
-    def __init__(self):
-        strong_injection: List[str] = [
-            r"ignore\s+all\s+previous\s+instructions",
-            r"reveal\s+your\s+system\s+prompt",
-            r"system\s+prompt",
-            r"forget\s+(everything|all|previous)",
-            r"disregard\s+(all|previous)",
-        ]
-
-        weak_injection: List[str] = [
-            r"ignore\s+(previous|all|above)",
-            r"system\s*:",
-            r"assistant\s*:",
-            r"you\s+are\s+now",
-            r"act\s+as\s+if",
-            r"pretend\s+to\s+be",
-        ]
-
-        weak_jailbreak: List[str] = [
-            r"bypass",
-            r"override",
-            r"hack",
-            r"exploit",
-            r"vulnerability",
-        ]
-
-        self.rules: List[Tuple[str, str, int]] = []
-        self.rules += [("strong", p, 85) for p in strong_injection]
-        self.rules += [("weak_injection", p, 20) for p in weak_injection]
-        self.rules += [("weak_jailbreak", p, 15) for p in weak_jailbreak]
-
-        self._compiled = [(kind, re.compile(pat, re.IGNORECASE), weight, pat) for kind, pat, weight in self.rules]
-
-    def check(self, prompt: str) -> Dict[str, object]:
+    def __init__(self, rules_path: Optional[str] = None):
+        # Regras vêm de um bundle externo versionado (firewall_llm/rules.json por padrão)
+        self.rules_path = rules_path or FIREWALL_RULES_PATH or str(DEFAULT_RULES_PATH)
+        self._reload_lock = threading.Lock()
+
+        # Varredura em janelas para prompts acima de MAX_PROMPT_LENGTH
+        self.max_prompt_length = MAX_PROMPT_LENGTH
+        self.stream_max_length = FIREWALL_STREAM_MAX_LENGTH
+        self.window_size = FIREWALL_WINDOW_SIZE
+        self.scan_budget_ms = FIREWALL_SCAN_BUDGET_MS
+
+        self._bundle: RuleBundle = self._check_windowable(load_bundle(self.rules_path))
+        # Vereditos memoizados por digest do prompt + versão do bundle
+        self.cache = TTLCache(VERDICT_CACHE_SIZE, VERDICT_CACHE_TTL)
+
+        # Segundo estágio: só roda quando há sinais fracos (nunca em tráfego limpo)
+        self.classifier: Optional[HashedNgramClassifier] = None
+        self.classifier_weight = FIREWALL_CLASSIFIER_WEIGHT
+        self.classifier_threshold = FIREWALL_CLASSIFIER_THRESHOLD
+        if FIREWALL_CLASSIFIER_PATH:
+            self.load_classifier(FIREWALL_CLASSIFIER_PATH)
+
+    @property
+    def bundle(self) -> RuleBundle:
+        return self._bundle
+
+    @property
+    def rules(self) -> List[Tuple[str, str, int]]:
+        return [(r.kind, r.pattern, r.weight) for r in self._bundle.rules]
+
+    def reload(self, path: Optional[str] = None) -> RuleBundle:
+        """Compila um novo bundle e o troca atomicamente pelo atual.
+
+        Se o bundle for inválido, ValueError é levantado e o atual continua ativo.
+        """
+        with self._reload_lock:
+            bundle = self._check_windowable(load_bundle(path or self.rules_path))
+            if path:
+                self.rules_path = path
+            self._bundle = bundle
+            self.cache.clear()
+        return bundle
+
+    def _check_windowable(self, bundle: RuleBundle) -> RuleBundle:
+        """Recusa regras sem extensão limitada quando a varredura em janelas está ativa.
+
+        Uma regra dessas poderia casar um trecho maior que a sobreposição entre
+        janelas e escapar dividida ao meio.
+        """
+        if self.stream_max_length > self.max_prompt_length and bundle.matcher.unbounded:
+            patterns = ", ".join(bundle.rules[idx].pattern for idx in bundle.matcher.unbounded)
+            raise ValueError(f"Regras sem extensão máxima são incompatíveis com a varredura em janelas: {patterns}")
+        return bundle
+
+    def load_classifier(self, path: str) -> HashedNgramClassifier:
+        """Carrega (ou troca) o classificador de n-gramas a partir de um .npz."""
+        classifier = HashedNgramClassifier.load(path)
+        self.classifier = classifier
+        self.cache.clear()
+        return classifier
+
+    def precheck(self, prompt: str) -> Optional[Dict[str, object]]:
+        """Veredito de bloqueio que só depende do tamanho do prompt (None se passar)."""
         if not prompt:
             return {"allowed": False, "reason": "Prompt vazio", "detected_patterns": [], "risk_score": 0}
 
-        if len(prompt) > MAX_PROMPT_LENGTH:
+        limit = max(self.max_prompt_length, self.stream_max_length)
+        if len(prompt) > limit:
             return {
                 "allowed": False,
-                "reason": f"Prompt excede o tamanho máximo ({MAX_PROMPT_LENGTH} caracteres)",
+                "reason": f"Prompt excede o tamanho máximo ({limit} caracteres)",
                 "detected_patterns": [],
                 "risk_score": 100,
             }
+        return None
 
+    def check(self, prompt: str) -> Dict[str, object]:
+        rejected = self.precheck(prompt)
+        if rejected is not None:
+            return rejected
+
+        # Referências locais: bundle e classificador não mudam no meio da avaliação
+        # (e o veredito corresponde às versões usadas na chave do cache)
+        bundle = self._bundle
+        classifier = self.classifier
+
+        cache_key = make_key(bundle.version, bundle.compiled_at, classifier.version if classifier else "", prompt)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return dict(cached, detected_patterns=list(cached["detected_patterns"]))
+
+        if len(prompt) > self.max_prompt_length:
+            result = self._evaluate_windowed(bundle, classifier, prompt)
+        else:
+            result = self._evaluate(bundle, classifier, prompt)
+        # Estouro de orçamento depende da carga do momento, não do prompt: não memoiza
+        if not result.pop("budget_exceeded", False):
+            self.cache.set(cache_key, result)
+        return dict(result, detected_patterns=list(result["detected_patterns"]))
+
+    def _evaluate(
+        self, bundle: RuleBundle, classifier: Optional[HashedNgramClassifier], prompt: str
+    ) -> Dict[str, object]:
+        return self._verdict(bundle, classifier, bundle.matcher.scan(prompt), prompt)
+
+    def _evaluate_windowed(
+        self, bundle: RuleBundle, classifier: Optional[HashedNgramClassifier], prompt: str
+    ) -> Dict[str, object]:
+        """Varre prompts longos em janelas sobrepostas, com orçamento de CPU.
+
+        Sequências de espaços são colapsadas antes, e a sobreposição entre
+        janelas é a maior extensão que uma regra consegue casar nesse texto,
+        então nenhum casamento fica dividido entre duas janelas (espaços de
+        enchimento não o esticam). A varredura para no primeiro sinal forte;
+        se o orçamento de CPU da thread estourar, o prompt é bloqueado
+        (fail-closed).
+        """
+        text = collapse_whitespace(prompt)
+        overlap = bundle.matcher.max_span
+        window = max(self.window_size, 2 * overlap, 1)
+        step = window - overlap
+        deadline = time.thread_time() + self.scan_budget_ms / 1000
+
+        matched: List[int] = []
+        for start in range(0, len(text), step):
+            hits = bundle.matcher.scan(text[start:start + window], skip=matched)
+            matched.extend(hits)
+
+            if any(bundle.rules[idx].kind == "strong" for idx in hits):
+                break
+            if start + window >= len(text):
+                break
+            if time.thread_time() > deadline:
+                return {
+                    "allowed": False,
+                    "reason": f"Varredura excedeu o orçamento de {self.scan_budget_ms:g} ms de CPU",
+                    "detected_patterns": [bundle.rules[idx].pattern for idx in sorted(matched)],
+                    "risk_score": 100,
+                    "budget_exceeded": True,
+                }
+
+        return self._verdict(bundle, classifier, sorted(matched), prompt)
+
+    def _verdict(
+        self,
+        bundle: RuleBundle,
+        classifier: Optional[HashedNgramClassifier],
+        matched: List[int],
+        prompt: str,
+    ) -> Dict[str, object]:
         detected_patterns: List[str] = []
         risk_score = 0
         strong_hits = 0
         weak_hits = 0
 
-        for kind, rx, weight, pat_text in self._compiled:
-            if rx.search(prompt):
-                detected_patterns.append(pat_text)
-                risk_score += weight
-                if kind == "strong":
-                    strong_hits += 1
-                else:
-                    weak_hits += 1
+        for idx in matched:
+            rule = bundle.rules[idx]
+            detected_patterns.append(rule.pattern)
+            risk_score += rule.weight
+            if rule.kind == "strong":
+                strong_hits += 1
+            else:
+                weak_hits += 1
 
         risk_score = min(risk_score, 100)
 
+        classifier_score = None
+        if classifier is not None and weak_hits >= 1 and strong_hits == 0:
+            # Prompts muito longos: o classificador vê só o trecho inicial
+            classifier_score = classifier.score(prompt[:self.max_prompt_length])
+            w = self.classifier_weight
+            blended = min(100, round((1 - w) * risk_score + w * 100 * classifier_score))
+            # Segundo estágio só acrescenta risco: nunca desfaz um bloqueio das regex
+            risk_score = max(risk_score, blended)
+
         if strong_hits >= 1:
             return {
                 "allowed": False,
@@ -83,11 +213,22 @@ class LLMFirewall:
             }
 
         if weak_hits >= 3 and risk_score >= 50:
-            return {
+            result = {
                 "allowed": False,
                 "reason": "Combinação de sinais fracos sugere prompt malicioso",
                 "detected_patterns": detected_patterns,
                 "risk_score": risk_score,
             }
+        elif classifier_score is not None and classifier_score >= self.classifier_threshold:
+            result = {
+                "allowed": False,
+                "reason": "Classificador de n-gramas indica prompt malicioso",
+                "detected_patterns": detected_patterns,
+                "risk_score": risk_score,
+            }
+        else:
+            result = {"allowed": True, "reason": None, "detected_patterns": detected_patterns, "risk_score": risk_score}
 
-        return {"allowed": True, "reason": None, "detected_patterns": detected_patterns, "risk_score": risk_score}
+        if classifier_score is not None:
+            result["classifier_score"] = round(classifier_score, 4)
+        return result
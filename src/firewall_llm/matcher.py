@@ -0,0 +1,158 @@
+"""Motor de casamento das regras do firewall em uma única passada.
+
+Cada regra tem um literal obrigatório (ex.: ``ignore`` em ``ignore\\s+all``).
+Todos os literais são compilados em uma única alternância; uma varredura do
+texto revela quais literais aparecem, e apenas as regras cujo literal foi
+encontrado executam sua regex completa. Regras sem literal extraível rodam
+sempre, garantindo o mesmo resultado da varredura regra a regra.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse
+
+# Tamanho mínimo de literal para valer a pena usá-lo como pré-filtro
+MIN_LITERAL_LENGTH = 3
+
+# Limite para a extensão de regras sem tamanho máximo (ex.: "\s+")
+DEFAULT_SPAN_CAP = 256
+
+_LITERAL_CHAR = re.compile(r"[A-Za-z0-9_]")
+# Na varredura em janelas, sequências de espaços viram um único espaço; assim
+# "\s+" / "\s*" casam no máximo um caractere e a extensão da regra fica limitada
+_WHITESPACE_RUN = re.compile(r"\s+")
+_WHITESPACE_REPEAT = re.compile(r"\\s[+*]")
+_QUANTIFIERS = "?*{"
+
+# Caracteres não-ASCII que re.IGNORECASE iguala a letras ASCII; o pré-filtro
+# roda sobre o texto em minúsculas (sem IGNORECASE, bem mais rápido).
+_CASEFOLD = str.maketrans({"\u0130": "i", "\u0131": "i", "\u017f": "s", "\u212a": "k"})
+
+
+def extract_literal(pattern: str) -> Optional[str]:
+    """Extrai o prefixo literal obrigatório de uma regex (ou None)."""
+    # Alternância no nível do padrão: o prefixo não é obrigatório.
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "|" and depth == 0:
+            return None
+        i += 1
+
+    literal = []
+    for i, ch in enumerate(pattern):
+        if not _LITERAL_CHAR.match(ch):
+            # Caractere anterior opcional (ex.: "colou?r") não é obrigatório
+            if ch in _QUANTIFIERS and literal:
+                literal.pop()
+            break
+        literal.append(ch)
+
+    text = "".join(literal).lower()
+    if len(text) < MIN_LITERAL_LENGTH:
+        return None
+    return text
+
+
+def collapse_whitespace(text: str) -> str:
+    """Reduz cada sequência de espaços em branco a um único espaço."""
+    return _WHITESPACE_RUN.sub(" ", text)
+
+
+def max_match_width(pattern: str, flags: int = re.IGNORECASE, cap: int = DEFAULT_SPAN_CAP) -> int:
+    """Maior extensão possível de um casamento da regex, limitada a ``cap``."""
+    try:
+        _, hi = sre_parse.parse(pattern, flags).getwidth()
+    except Exception:
+        return cap
+    return min(hi, cap)
+
+
+def collapsed_match_width(pattern: str, flags: int = re.IGNORECASE) -> Optional[int]:
+    """Extensão máxima da regex sobre texto com espaços colapsados (None se ilimitada)."""
+    try:
+        _, hi = sre_parse.parse(_WHITESPACE_REPEAT.sub(r"\\s?", pattern), flags).getwidth()
+    except Exception:
+        return None
+    return hi if hi < sre_parse.MAXREPEAT else None
+
+
+class RuleMatcher:
+    """Avalia um conjunto de regras com um pré-filtro de literais em passada única."""
+
+    def __init__(
+        self,
+        rules: Sequence[Tuple[str, str, int]],
+        flags: int = re.IGNORECASE,
+        span_cap: int = DEFAULT_SPAN_CAP,
+    ):
+        self.rules: List[Tuple[str, str, int]] = list(rules)
+        self._compiled = [re.compile(pat, flags) for _, pat, _ in self.rules]
+
+        # Maior trecho que uma regra consegue casar em texto com espaços colapsados
+        # (sobreposição entre janelas na varredura de prompts longos). Regras sem
+        # limite mesmo assim (ex.: ".*") ou acima de span_cap ficam em ``unbounded``.
+        widths = [collapsed_match_width(pat, flags) for _, pat, _ in self.rules]
+        self.unbounded: List[int] = [i for i, w in enumerate(widths) if w is None or w > span_cap]
+        self.max_span = max((min(w, span_cap) for w in widths if w is not None), default=0)
+
+        self._always: List[int] = []
+        by_literal: Dict[str, List[int]] = {}
+        for idx, (_, pat, _) in enumerate(self.rules):
+            literal = extract_literal(pat)
+            if literal is None:
+                self._always.append(idx)
+            else:
+                by_literal.setdefault(literal, []).append(idx)
+
+        self._by_literal = by_literal
+
+        # Um literal que é prefixo de outro também está presente quando o
+        # maior casa na mesma posição (a alternância reporta só um deles).
+        self._implied: Dict[str, Tuple[str, ...]] = {
+            lit: tuple(other for other in by_literal if other != lit and lit.startswith(other))
+            for lit in by_literal
+        }
+
+        self._prefilter = None
+        if by_literal:
+            alternation = "|".join(re.escape(lit) for lit in sorted(by_literal, key=len, reverse=True))
+            # Lookahead de largura zero: testa todas as posições, inclusive sobrepostas.
+            self._prefilter = re.compile(f"(?=({alternation}))")
+
+    def candidates(self, text: str) -> List[int]:
+        """Índices (em ordem) das regras que podem casar com o texto."""
+        selected: Set[int] = set(self._always)
+        if self._prefilter is not None:
+            seen: Set[str] = set()
+            for m in self._prefilter.finditer(text.translate(_CASEFOLD).lower()):
+                lit = m.group(1)
+                if lit in seen:
+                    continue
+                seen.add(lit)
+                selected.update(self._by_literal[lit])
+                for implied in self._implied[lit]:
+                    seen.add(implied)
+                    selected.update(self._by_literal[implied])
+                if len(seen) == len(self._by_literal):
+                    break
+        return sorted(selected)
+
+    def scan(self, text: str, skip: Iterable[int] = ()) -> List[int]:
+        """Índices (em ordem) das regras que casam com o texto."""
+        skip = set(skip)
+        return [
+            idx for idx in self.candidates(text)
+            if idx not in skip and self._compiled[idx].search(text)
+        ]
@@ -0,0 +1,252 @@
+"""Circuit breaker por provedor de LLM.
+
+Estados:
+- closed: chamadas passam; as últimas ``window`` são observadas. Se a taxa de
+  falhas ou de chamadas lentas passa do limiar (com ao menos ``min_calls``),
+  o circuito abre.
+- open: chamadas falham na hora, sem tocar o provedor, por ``open_seconds``.
+- half_open: passado esse tempo, até ``half_open_calls`` chamadas de teste
+  passam; se todas dão certo o circuito fecha, se uma falha ele reabre.
+
+Com um cliente ``fallback`` (ex.: MockClient), chamadas recusadas ou que
+falham são atendidas por ele, marcadas com ``fallback_from``.
+
+Em streams, a latência registrada é o tempo até o primeiro token: a duração
+total cresce com o tamanho da resposta e não indica provedor lento.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Chamada recusada porque o circuito do provedor está aberto."""
+
+
+class CircuitBreaker:
+    """Máquina de estados closed/open/half_open com janela deslizante de chamadas."""
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 30.0,
+        slow_call_rate: float = 0.8,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = max(1, half_open_calls)
+
+        self._lock = threading.Lock()
+        self._calls: deque = deque(maxlen=window)  # (falhou?, lenta?)
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self) -> bool:
+        """Se a chamada pode ir ao provedor (no half_open, reserva uma vaga de teste)."""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self._probes = 0
+                self._probe_successes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    self.rejected += 1
+                    return False
+                self._probes += 1
+            return True
+
+    def rejecting(self) -> bool:
+        """Se ``allow()`` recusaria agora (consulta sem reservar vaga nem contar recusa)."""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self._opened_at < self.open_seconds
+            return self.state == HALF_OPEN and self._probes >= self.half_open_calls
+
+    def record(self, success: bool, elapsed: float) -> None:
+        slow = elapsed >= self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if not success or slow:
+                    self._open()
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self.state = CLOSED
+                        self._calls.clear()
+                return
+            if self.state == OPEN:
+                # Chamada iniciada antes da abertura; não altera o estado
+                return
+
+            self._calls.append((not success, slow))
+            total = len(self._calls)
+            if total < self.min_calls:
+                return
+            failures = sum(1 for failed, _ in self._calls if failed)
+            slow_calls = sum(1 for _, was_slow in self._calls if was_slow)
+            if failures / total >= self.failure_rate or slow_calls / total >= self.slow_call_rate:
+                self._open()
+
+    def release(self) -> None:
+        """Chamada abandonada por quem chamou (cancelamento): devolve a vaga de teste sem veredito."""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+        self.opened += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self._calls.clear()
+
+    def info(self) -> Dict[str, object]:
+        with self._lock:
+            total = len(self._calls)
+            failures = sum(1 for failed, _ in self._calls if failed)
+            retry_in = self.open_seconds - (time.monotonic() - self._opened_at) if self.state == OPEN else None
+            return {
+                "state": self.state,
+                "window_calls": total,
+                "failure_rate": round(failures / total, 4) if total else None,
+                "retry_in_seconds": round(max(0.0, retry_in), 3) if retry_in is not None else None,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+
+class BreakerClient:
+    """Envolve um LLMClient com o circuit breaker do provedor e o fallback opcional."""
+
+    def __init__(self, client: Any, breaker: CircuitBreaker, provider: str, fallback: Any = None):
+        self.client = client
+        self.breaker = breaker
+        self.provider = provider
+        self.fallback = fallback
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+    def circuit_open(self) -> bool:
+        """Se a próxima chamada falharia na hora (ou iria ao fallback) sem tocar o provedor."""
+        return self.breaker.rejecting()
+
+    def _rejected(self) -> Dict[str, object]:
+        return {
+            "response": None,
+            "error": f"Circuito do provedor '{self.provider}' aberto (falha rápida)",
+            "success": False,
+            "provider": self.provider,
+            "circuit": OPEN,
+        }
+
+    def _with_fallback(self, result: Dict[str, object], fallback_result: Dict[str, object]) -> Dict[str, object]:
+        return {**fallback_result, "fallback_from": self.provider, "fallback_reason": result.get("error")}
+
+    def generate_response(self, prompt: str, context: Optional[str] = None) -> Dict[str, object]:
+        if not self.breaker.allow():
+            result = self._rejected()
+        else:
+            start = time.perf_counter()
+            try:
+                result = self.client.generate_response(prompt, context)
+            except Exception:
+                self.breaker.record(False, time.perf_counter() - start)
+                raise
+            self.breaker.record(bool(result.get("success")), time.perf_counter() - start)
+            if result.get("success"):
+                return result
+        if self.fallback is None:
+            return result
+        return self._with_fallback(result, self.fallback.generate_response(prompt, context))
+
+    async def agenerate_response(self, prompt: str, context: Optional[str] = None) -> Dict[str, object]:
+        if not self.breaker.allow():
+            result = self._rejected()
+        else:
+            start = time.perf_counter()
+            try:
+                result = await self.client.agenerate_response(prompt, context)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception:
+                self.breaker.record(False, time.perf_counter() - start)
+                raise
+            self.breaker.record(bool(result.get("success")), time.perf_counter() - start)
+            if result.get("success"):
+                return result
+        if self.fallback is None:
+            return result
+        return self._with_fallback(result, await self.fallback.agenerate_response(prompt, context))
+
+    def stream_response(self, prompt: str, context: Optional[str] = None) -> Iterator[str]:
+        if not self.breaker.allow():
+            if self.fallback is None:
+                raise CircuitOpenError(self._rejected()["error"])
+            yield from self.fallback.stream_response(prompt, context)
+            return
+        start = time.perf_counter()
+        first_token = None
+        try:
+            for token in self.client.stream_response(prompt, context):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                yield token
+        except GeneratorExit:
+            # Consumidor desistiu do stream: não é falha do provedor
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record(False, time.perf_counter() - start)
+            raise
+        self.breaker.record(True, first_token if first_token is not None else time.perf_counter() - start)
+
+    async def astream_response(self, prompt: str, context: Optional[str] = None) -> AsyncIterator[str]:
+        if not self.breaker.allow():
+            if self.fallback is None:
+                raise CircuitOpenError(self._rejected()["error"])
+            async for token in self.fallback.astream_response(prompt, context):
+                yield token
+            return
+        start = time.perf_counter()
+        first_token = None
+        try:
+            async for token in self.client.astream_response(prompt, context):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                yield token
+        except (GeneratorExit, asyncio.CancelledError):
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record(False, time.perf_counter() - start)
+            raise
+        self.breaker.record(True, first_token if first_token is not None else time.perf_counter() - start)
@@ -4,7 +4,7 @@ Este módulo é "tolerante": se a dependência ou a API key não estiverem dispo
 ele não deve derrubar a aplicação na importação. O erro aparece apenas quando
 o provedor Gemini é realmente usado.
 """
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterator, AsyncIterator
 
 from config import GEMINI_API_KEY
 
@@ -59,3 +59,52 @@ class GeminiClient:
             }
         except Exception as e:
             return {"response": None, "error": str(e), "success": False, "provider": "gemini"}
+
+    def stream_response(self, prompt: str, context: Optional[str] = None) -> Iterator[str]:
+        self._ensure_ready()
+
+        full_prompt = prompt
+        if context:
+            full_prompt = f"Contexto:\n{context}\n\nPergunta:\n{prompt}"
+
+        for chunk in self._model.generate_content(full_prompt, stream=True):
+            text = getattr(chunk, "text", None)
+            if text:
+                yield text
+
+    async def agenerate_response(self, prompt: str, context: Optional[str] = None) -> Dict[str, object]:
+        try:
+            self._ensure_ready()
+
+            full_prompt = prompt
+            if context:
+                full_prompt = f"Contexto:\n{context}\n\nPergunta:\n{prompt}"
+
+            response = await self._model.generate_content_async(full_prompt)
+
+            text = getattr(response, "text", None)
+
+            return {
+                "response": text,
+                "usage": {
+                    "prompt_tokens": len(full_prompt.split()),
+                    "response_tokens": len(text.split()) if text else 0,
+                },
+                "success": True,
+                "provider": "gemini",
+            }
+        except Exception as e:
+            return {"response": None, "error": str(e), "success": False, "provider": "gemini"}
+
+    async def astream_response(self, prompt: str, context: Optional[str] = None) -> AsyncIterator[str]:
+        self._ensure_ready()
+
+        full_prompt = prompt
+        if context:
+            full_prompt = f"Contexto:\n{context}\n\nPergunta:\n{prompt}"
+
+        response = await self._model.generate_content_async(full_prompt, stream=True)
+        async for chunk in response:
+            text = getattr(chunk, "text", None)
+            if text:
+                yield text
@@ -2,11 +2,14 @@
 
 Agora suporta configuração em runtime (UI), sem depender do .env.
 """
-from typing import Optional, Protocol, Dict
+from typing import Optional, Protocol, Dict, Iterator, AsyncIterator
 
+from llm_service.circuit_breaker import BreakerClient, CircuitBreaker
 from llm_service.gemini_client import GeminiClient
 from llm_service.mock_client import MockClient
 from llm_service.ollama_client import OllamaClient
+from llm_service.ollama_pool import OllamaPoolClient
+from llm_service.singleflight import CoalescingClient, SingleFlight
 from settings import RuntimeLLMSettings
 
 
@@ -14,14 +17,41 @@ class LLMClient(Protocol):
     def generate_response(self, prompt: str, context: Optional[str] = None) -> Dict[str, object]:
         ...
 
+    def stream_response(self, prompt: str, context: Optional[str] = None) -> Iterator[str]:
+        ...
 
-def get_llm_client(settings: RuntimeLLMSettings) -> LLMClient:
-    settings = settings.normalize()
+    async def agenerate_response(self, prompt: str, context: Optional[str] = None) -> Dict[str, object]:
+        ...
 
-    if settings.provider == "gemini":
-        return GeminiClient()
+    def astream_response(self, prompt: str, context: Optional[str] = None) -> AsyncIterator[str]:
+        ...
 
-    if settings.provider == "ollama":
-        return OllamaClient(base_url=settings.ollama_url, model=settings.ollama_model)
 
-    return MockClient()
+def get_llm_client(
+    settings: RuntimeLLMSettings,
+    singleflight: Optional[SingleFlight] = None,
+    breaker: Optional[CircuitBreaker] = None,
+    fallback: Optional[LLMClient] = None,
+) -> LLMClient:
+    """Cria o cliente do provedor configurado.
+
+    Com ``breaker``, chamadas a um provedor fora do ar falham na hora (e vão
+    para ``fallback``, se houver). Com ``singleflight``, gerações idênticas
+    simultâneas (mesmo provedor, modelo e prompt) viram uma única chamada.
+    """
+    settings = settings.normalize()
+
+    if settings.provider == "gemini":
+        client = GeminiClient()
+    elif settings.provider == "ollama" and len(settings.ollama_urls) > 1:
+        client = OllamaPoolClient(settings.ollama_urls, model=settings.ollama_model, hedge=settings.hedge)
+    elif settings.provider == "ollama":
+        client = OllamaClient(base_url=settings.ollama_url, model=settings.ollama_model)
+    else:
+        client = MockClient()
+
+    if breaker is not None:
+        client = BreakerClient(client, breaker, settings.provider, fallback=fallback)
+    if singleflight is not None:
+        return CoalescingClient(client, singleflight, settings.provider)
+    return client
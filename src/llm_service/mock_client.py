@@ -1,5 +1,6 @@
 """Provedor de LLM determinístico (sem rede)."""
-from typing import Optional, Dict
+import re
+from typing import Optional, Dict, Iterator, AsyncIterator
 
 
 class MockClient:
@@ -15,3 +16,15 @@ class MockClient:
             "success": True,
             "provider": "mock",
         }
+
+    def stream_response(self, prompt: str, context: Optional[str] = None) -> Iterator[str]:
+        # Um "token" por palavra (com o espaço que a segue), como um LLM real faria
+        for token in re.findall(r"\S+\s*", self.fixed_response):
+            yield token
+
+    async def agenerate_response(self, prompt: str, context: Optional[str] = None) -> Dict[str, object]:
+        return self.generate_response(prompt, context)
+
+    async def astream_response(self, prompt: str, context: Optional[str] = None) -> AsyncIterator[str]:
+        for token in self.stream_response(prompt, context):
+            yield token
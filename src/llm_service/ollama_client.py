@@ -1,42 +1,250 @@
-"""Provedor de LLM via Ollama (local/offline)."""
-from typing import Optional, Dict
+"""Provedor de LLM via Ollama (local/offline).
+
+O cliente mantém conexões persistentes (keep-alive) em pools do httpx, um
+para as chamadas síncronas e um por event loop para as assíncronas (o pool
+assíncrono pertence ao loop em que foi criado), criados sob demanda.
+``close``/``aclose`` só fecham um pool quando não há requisições em andamento
+nele; caso contrário, a última requisição a terminar fecha.
+"""
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional, Dict, Iterator, AsyncIterator, List, Tuple
 import httpx
 
+from config import (
+    OLLAMA_CONNECT_TIMEOUT,
+    OLLAMA_KEEPALIVE_EXPIRY,
+    OLLAMA_MAX_CONNECTIONS,
+    OLLAMA_MAX_KEEPALIVE,
+    OLLAMA_POOL_TIMEOUT,
+    OLLAMA_READ_TIMEOUT,
+)
+
+
+class _AsyncPool:
+    """AsyncClient de um event loop e as requisições em andamento nele."""
+
+    __slots__ = ("client", "in_flight")
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.in_flight = 0
+
 
 class OllamaClient:
-    def __init__(self, base_url: str, model: str):
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        limits: Optional[httpx.Limits] = None,
+        timeout: Optional[httpx.Timeout] = None,
+        transport=None,
+    ):
         self.base_url = (base_url or "http://localhost:11434").rstrip("/")
         self.model = model or "llama3.1"
+        self.limits = limits or httpx.Limits(
+            max_connections=OLLAMA_MAX_CONNECTIONS,
+            max_keepalive_connections=OLLAMA_MAX_KEEPALIVE,
+            keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY,
+        )
+        # Conexão curta; leitura longa (geração do modelo / intervalo entre tokens)
+        self.timeout = timeout or httpx.Timeout(
+            OLLAMA_READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT, pool=OLLAMA_POOL_TIMEOUT
+        )
+
+        # Transporte alternativo do httpx (ex.: httpx.MockTransport nos testes)
+        self.transport = transport
+
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        self._aclients: Dict[asyncio.AbstractEventLoop, _AsyncPool] = {}
+        self._in_flight = 0
+        self._closing = False
+
+    @contextmanager
+    def _session(self) -> Iterator[httpx.Client]:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(limits=self.limits, timeout=self.timeout, transport=self.transport)
+            client = self._client
+            self._in_flight += 1
+        try:
+            yield client
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                idle = self._closing and self._in_flight == 0 and self._client is client
+                if idle:
+                    self._client = None
+            if idle:
+                client.close()
+
+    @asynccontextmanager
+    async def _asession(self) -> AsyncIterator[httpx.AsyncClient]:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # Loops já encerrados levaram junto as conexões; não há onde aguardar o aclose
+            for closed in [other for other in self._aclients if other.is_closed()]:
+                del self._aclients[closed]
+            pool = self._aclients.get(loop)
+            if pool is None:
+                pool = self._aclients[loop] = _AsyncPool(
+                    httpx.AsyncClient(limits=self.limits, timeout=self.timeout, transport=self.transport)
+                )
+            pool.in_flight += 1
+        try:
+            yield pool.client
+        finally:
+            with self._lock:
+                pool.in_flight -= 1
+                idle = self._closing and pool.in_flight == 0 and self._aclients.get(loop) is pool
+                if idle:
+                    del self._aclients[loop]
+            if idle:
+                await pool.client.aclose()
+
+
+    def close(self) -> None:
+        """Fecha os pools ociosos; os ocupados fecham ao fim da última requisição."""
+        with self._lock:
+            self._closing = True
+            client = self._client if self._in_flight == 0 else None
+            if client is not None:
+                self._client = None
+            idle: List[Tuple[asyncio.AbstractEventLoop, _AsyncPool]] = [
+                (loop, pool) for loop, pool in self._aclients.items() if pool.in_flight == 0
+            ]
+            for loop, _ in idle:
+                del self._aclients[loop]
+        if client is not None:
+            client.close()
+        if not idle:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        # Cada pool fecha no próprio loop (ex.: close chamado do threadpool do /api/provider)
+        for loop, pool in idle:
+            if loop.is_closed() or not loop.is_running():
+                continue
+            if running is loop:
+                loop.create_task(pool.client.aclose())
+            else:
+                asyncio.run_coroutine_threadsafe(pool.client.aclose(), loop)
+
+    async def aclose(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._closing = True
+            pool = self._aclients.get(loop)
+            if pool is not None and pool.in_flight == 0:
+                del self._aclients[loop]
+            else:
+                pool = None
+        self.close()
+        if pool is not None:
+            await pool.client.aclose()
+
+    @staticmethod
+    def _full_prompt(prompt: str, context: Optional[str]) -> str:
+        return prompt if not context else f"Contexto:\n{context}\n\nPergunta:\n{prompt}"
+
+    def _payload(self, full_prompt: str, stream: bool) -> Dict[str, object]:
+        return {"model": self.model, "prompt": full_prompt, "stream": stream}
+
+    def _success(self, full_prompt: str, text: Optional[str]) -> Dict[str, object]:
+        return {
+            "response": text,
+            "usage": {
+                "prompt_tokens": len(full_prompt.split()),
+                "response_tokens": len(text.split()) if text else 0,
+            },
+            "success": True,
+            "provider": "ollama",
+            "model": self.model,
+            "base_url": self.base_url,
+        }
+
+    def _failure(self, error: Exception) -> Dict[str, object]:
+        return {
+            "response": None,
+            "error": str(error),
+            "success": False,
+            "provider": "ollama",
+            "model": self.model,
+            "base_url": self.base_url,
+        }
+
+    @staticmethod
+    def _parse_stream_line(line: str):
+        """(token, terminou?) de uma linha NDJSON do /api/generate."""
+        data = json.loads(line)
+        if data.get("error"):
+            raise RuntimeError(data["error"])
+        return data.get("response"), bool(data.get("done"))
 
     def generate_response(self, prompt: str, context: Optional[str] = None) -> Dict[str, object]:
-        full_prompt = prompt if not context else f"Contexto:\n{context}\n\nPergunta:\n{prompt}"
+        full_prompt = self._full_prompt(prompt, context)
 
         try:
             url = f"{self.base_url}/api/generate"
-            payload = {"model": self.model, "prompt": full_prompt, "stream": False}
-            with httpx.Client(timeout=60.0) as client:
-                r = client.post(url, json=payload)
+            with self._session() as client:
+                r = client.post(url, json=self._payload(full_prompt, stream=False))
                 r.raise_for_status()
                 data = r.json()
+            return self._success(full_prompt, data.get("response"))
+        except Exception as e:
+            return self._failure(e)
 
-            text = data.get("response")
-            return {
-                "response": text,
-                "usage": {
-                    "prompt_tokens": len(full_prompt.split()),
-                    "response_tokens": len(text.split()) if text else 0,
-                },
-                "success": True,
-                "provider": "ollama",
-                "model": self.model,
-                "base_url": self.base_url,
-            }
+    async def agenerate_response(self, prompt: str, context: Optional[str] = None) -> Dict[str, object]:
+        """Versão assíncrona: não prende thread enquanto espera o modelo."""
+        full_prompt = self._full_prompt(prompt, context)
+
+        try:
+            url = f"{self.base_url}/api/generate"
+            async with self._asession() as client:
+                r = await client.post(url, json=self._payload(full_prompt, stream=False))
+                r.raise_for_status()
+                data = r.json()
+            return self._success(full_prompt, data.get("response"))
         except Exception as e:
-            return {
-                "response": None,
-                "error": str(e),
-                "success": False,
-                "provider": "ollama",
-                "model": self.model,
-                "base_url": self.base_url,
-            }
+            return self._failure(e)
+
+    def stream_response(self, prompt: str, context: Optional[str] = None) -> Iterator[str]:
+        """Gera os tokens conforme o Ollama os produz (NDJSON com "stream": true).
+
+        Erros de conexão/HTTP são propagados como exceção para quem consome o stream.
+        """
+        full_prompt = self._full_prompt(prompt, context)
+
+        url = f"{self.base_url}/api/generate"
+        with self._session() as client:
+            with client.stream("POST", url, json=self._payload(full_prompt, stream=True)) as r:
+                r.raise_for_status()
+                for line in r.iter_lines():
+                    if not line:
+                        continue
+                    token, done = self._parse_stream_line(line)
+                    if token:
+                        yield token
+                    if done:
+                        break
+
+    async def astream_response(self, prompt: str, context: Optional[str] = None) -> AsyncIterator[str]:
+        full_prompt = self._full_prompt(prompt, context)
+
+        url = f"{self.base_url}/api/generate"
+        async with self._asession() as client:
+            async with client.stream("POST", url, json=self._payload(full_prompt, stream=True)) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if not line:
+                        continue
+                    token, done = self._parse_stream_line(line)
+                    if token:
+                        yield token
+                    if done:
+                        break
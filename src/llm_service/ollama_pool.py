@@ -0,0 +1,238 @@
+"""Balanceamento entre vários backends Ollama.
+
+Cada chamada vai para o backend de menor custo estimado: latência média
+móvel (EWMA) multiplicada pelas requisições em andamento + 1. Backend ainda
+sem amostras usa como EWMA a menor já medida (ou 1 ms), então uma rajada no
+arranque se espalha pelas requisições em andamento. Backends com falhas
+consecutivas saem da rotação por um tempo (ejeção) e voltam depois.
+Cancelamentos (hedge perdido, cliente que desconectou) não contam como falha.
+
+Com ``hedge`` ligado, ``agenerate_response`` envia uma cópia da requisição a
+um segundo backend se a primeira não responder até o p95 das latências
+recentes; a que terminar primeiro com sucesso vence e a outra é cancelada.
+Chamadas síncronas e streams só são roteadas, sem cópia.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, Iterator, Optional, Sequence
+
+from config import (
+    OLLAMA_EJECT_AFTER,
+    OLLAMA_EJECT_SECONDS,
+    OLLAMA_EWMA_ALPHA,
+    OLLAMA_HEDGE_MIN_DELAY,
+    OLLAMA_HEDGE_MIN_SAMPLES,
+)
+from llm_service.ollama_client import OllamaClient
+
+# Amostras de latência mantidas para o p95
+_LATENCY_WINDOW = 200
+
+
+class OllamaBackend:
+    """Um host Ollama com as estatísticas usadas no roteamento."""
+
+    def __init__(self, client: OllamaClient):
+        self.client = client
+        self.url = client.base_url
+        self.ewma_ms: Optional[float] = None
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def available(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    def cost(self, prior_ms: float) -> float:
+        # Sem amostras, vale a estimativa a priori: ainda é preferido, mas pesa o que já está em andamento
+        ewma_ms = self.ewma_ms if self.ewma_ms is not None else prior_ms
+        return ewma_ms * (self.outstanding + 1)
+
+    def info(self, now: float) -> Dict[str, object]:
+        return {
+            "url": self.url,
+            "ewma_ms": round(self.ewma_ms, 3) if self.ewma_ms is not None else None,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejected": not self.available(now),
+        }
+
+
+class OllamaPoolClient:
+    """Cliente Ollama sobre vários backends com o mesmo modelo."""
+
+    def __init__(self, base_urls: Sequence[str], model: str, hedge: bool = False):
+        if not base_urls:
+            raise ValueError("Informe ao menos uma URL do Ollama")
+        self.backends = [OllamaBackend(OllamaClient(url, model)) for url in base_urls]
+        self.model = self.backends[0].client.model
+        # Identifica o conjunto de backends (chaves de cache/coalescência)
+        self.base_url = ",".join(backend.url for backend in self.backends)
+        self.hedge = hedge
+
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=_LATENCY_WINDOW)
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    # Roteamento e estatísticas
+
+    def _pick(self, exclude: Optional[OllamaBackend] = None) -> Optional[OllamaBackend]:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [b for b in self.backends if b is not exclude]
+            if not candidates:
+                return None
+            healthy = [b for b in candidates if b.available(now)]
+            if healthy:
+                measured = [b.ewma_ms for b in self.backends if b.ewma_ms is not None]
+                prior_ms = min(measured) if measured else 1.0
+                backend = min(healthy, key=lambda b: b.cost(prior_ms))
+            elif exclude is not None:
+                # Cópia (hedge) só para backends saudáveis
+                return None
+            else:
+                # Todos ejetados: tenta o que volta primeiro
+                backend = min(candidates, key=lambda b: b.ejected_until)
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def _done(self, backend: OllamaBackend, elapsed: float, success: bool) -> None:
+        with self._lock:
+            backend.outstanding -= 1
+            if success:
+                elapsed_ms = elapsed * 1000
+                backend.consecutive_failures = 0
+                backend.ejected_until = 0.0
+                backend.ewma_ms = elapsed_ms if backend.ewma_ms is None else (
+                    OLLAMA_EWMA_ALPHA * elapsed_ms + (1 - OLLAMA_EWMA_ALPHA) * backend.ewma_ms
+                )
+                self._latencies.append(elapsed)
+            else:
+                backend.failures += 1
+                backend.consecutive_failures += 1
+                if backend.consecutive_failures >= OLLAMA_EJECT_AFTER:
+                    backend.ejected_until = time.monotonic() + OLLAMA_EJECT_SECONDS
+
+    def _cancelled(self, backend: OllamaBackend) -> None:
+        # Perdedor do hedge ou quem chamou desistiu: não conta como falha nem como amostra de latência
+        with self._lock:
+            backend.outstanding -= 1
+
+    @contextmanager
+    def _route(self) -> Iterator[OllamaBackend]:
+        backend = self._pick()
+        start = time.perf_counter()
+        try:
+            yield backend
+        except (GeneratorExit, asyncio.CancelledError):
+            # Consumidor do stream desconectou: o backend não falhou
+            self._cancelled(backend)
+            raise
+        except Exception:
+            self._done(backend, time.perf_counter() - start, False)
+            raise
+        self._done(backend, time.perf_counter() - start, True)
+
+    def hedge_delay(self) -> Optional[float]:
+        """p95 das latências recentes (s), ou None sem amostras suficientes."""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < OLLAMA_HEDGE_MIN_SAMPLES:
+            return None
+        return max(OLLAMA_HEDGE_MIN_DELAY, samples[int(0.95 * (len(samples) - 1))])
+
+    # Interface LLMClient
+
+    def generate_response(self, prompt: str, context: Optional[str] = None) -> Dict[str, object]:
+        backend = self._pick()
+        start = time.perf_counter()
+        result = backend.client.generate_response(prompt, context)
+        self._done(backend, time.perf_counter() - start, bool(result.get("success")))
+        return result
+
+    async def _agenerate_on(self, backend: OllamaBackend, prompt: str, context: Optional[str]) -> Dict[str, object]:
+        start = time.perf_counter()
+        try:
+            result = await backend.client.agenerate_response(prompt, context)
+        except asyncio.CancelledError:
+            self._cancelled(backend)
+            raise
+        except Exception:
+            self._done(backend, time.perf_counter() - start, False)
+            raise
+        self._done(backend, time.perf_counter() - start, bool(result.get("success")))
+        return result
+
+    async def agenerate_response(self, prompt: str, context: Optional[str] = None) -> Dict[str, object]:
+        first = self._pick()
+        primary = asyncio.ensure_future(self._agenerate_on(first, prompt, context))
+        delay = self.hedge_delay() if self.hedge and len(self.backends) > 1 else None
+        if delay is None:
+            return await primary
+
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            second = None if done else self._pick(exclude=first)
+            if second is None:
+                return await primary
+
+            with self._lock:
+                self.hedged += 1
+            hedge = asyncio.ensure_future(self._agenerate_on(second, prompt, context))
+            tasks.append(hedge)
+
+            pending = set(tasks)
+            result = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result.get("success"):
+                        if task is hedge:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return result
+            # As duas falharam: devolve a última falha
+            return result
+        finally:
+            # Cancela o perdedor (ou as duas, se quem chamou desistiu)
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stream_response(self, prompt: str, context: Optional[str] = None) -> Iterator[str]:
+        with self._route() as backend:
+            yield from backend.client.stream_response(prompt, context)
+
+    async def astream_response(self, prompt: str, context: Optional[str] = None) -> AsyncIterator[str]:
+        with self._route() as backend:
+            async for token in backend.client.astream_response(prompt, context):
+                yield token
+
+    def close(self) -> None:
+        for backend in self.backends:
+            backend.client.close()
+
+    async def aclose(self) -> None:
+        for backend in self.backends:
+            await backend.client.aclose()
+
+    def info(self) -> Dict[str, object]:
+        now = time.monotonic()
+        delay = self.hedge_delay()
+        return {
+            "hedge": self.hedge,
+            "hedge_delay_ms": round(delay * 1000, 3) if delay is not None else None,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "backends": [backend.info(now) for backend in self.backends],
+        }
@@ -0,0 +1,165 @@
+"""Porta de concorrência com prioridade para as chamadas ao LLM.
+
+No máximo ``max_concurrency`` gerações rodam ao mesmo tempo; as demais
+esperam em filas por classe de prioridade. A vaga liberada vai para a classe
+escolhida por enfileiramento justo ponderado (WFQ): cada pedido recebe uma
+etiqueta de término virtual ``max(tempo_virtual, última_etiqueta_da_classe) + 1/peso``
+e sai primeiro quem tem a menor. Assim, com peso 8 contra 1, admins passam
+~8 vezes mais que guests sob disputa, mas guests nunca ficam parados.
+
+Cada classe tem limite de fila; acima dele o pedido é recusado na hora
+(``QueueFullError``). A classe vem do papel do usuário e do risk_score do RBAC.
+Pensado para um único event loop (o do servidor).
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+
+
+class QueueFullError(RuntimeError):
+    """Fila da classe de prioridade cheia."""
+
+    def __init__(self, priority_class: str):
+        super().__init__(f"Fila de prioridade '{priority_class}' cheia")
+        self.priority_class = priority_class
+
+
+class _PriorityClass:
+    def __init__(self, name: str, weight: float, max_queue: int):
+        self.name = name
+        self.weight = max(weight, 1e-6)
+        self.max_queue = max_queue
+        self.queue: deque = deque()  # (etiqueta, future, enfileirado_em)
+        self.last_finish = 0.0
+
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+
+    def info(self) -> Dict[str, object]:
+        return {
+            "weight": self.weight,
+            "max_queue": self.max_queue,
+            "queued": len(self.queue),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.wait_total / self.admitted * 1000, 3) if self.admitted else None,
+        }
+
+
+class PriorityGate:
+    """Limite de concorrência com filas por classe e WFQ entre elas."""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        classes: Dict[str, Tuple[float, int]],
+        role_classes: Optional[Dict[str, str]] = None,
+        default_class: Optional[str] = None,
+        demote_risk: Optional[int] = None,
+        on_wait: Optional[Callable[[str, float], None]] = None,
+        on_reject: Optional[Callable[[str], None]] = None,
+    ):
+        if not classes:
+            raise ValueError("Informe ao menos uma classe de prioridade")
+        self.max_concurrency = max(1, max_concurrency)
+        self.classes = {name: _PriorityClass(name, w, q) for name, (w, q) in classes.items()}
+        # Classe de menor peso: destino de papéis desconhecidos e de requisições de risco alto
+        lowest = min(self.classes.values(), key=lambda c: c.weight).name
+        self.role_classes = {role.lower(): cls for role, cls in (role_classes or {}).items()}
+        self.default_class = default_class or lowest
+        self.demote_risk = demote_risk
+        self.demoted_class = lowest
+        # Recebem (classe, espera em s) na admissão e (classe) na recusa (ex.: métricas)
+        self.on_wait = on_wait
+        self.on_reject = on_reject
+
+        self.active = 0
+        self._virtual_time = 0.0
+
+    def classify(self, role: Optional[str], risk_score: Optional[float] = None) -> str:
+        """Classe de prioridade pelo papel; risco alto rebaixa para a classe de menor peso."""
+        if self.demote_risk is not None and risk_score is not None and risk_score >= self.demote_risk:
+            return self.demoted_class
+        return self.role_classes.get((role or "").lower(), self.default_class)
+
+    async def acquire(self, priority_class: str) -> float:
+        """Espera uma vaga; devolve o tempo de espera em segundos."""
+        cls = self.classes.get(priority_class) or self.classes[self.default_class]
+        if self.active < self.max_concurrency and not self._has_waiters():
+            self.active += 1
+            self._admitted(cls, 0.0)
+            return 0.0
+
+        if len(cls.queue) >= cls.max_queue:
+            cls.rejected += 1
+            if self.on_reject is not None:
+                self.on_reject(cls.name)
+            raise QueueFullError(cls.name)
+
+        tag = max(self._virtual_time, cls.last_finish) + 1.0 / cls.weight
+        cls.last_finish = tag
+        future = asyncio.get_running_loop().create_future()
+        entry = (tag, future, time.perf_counter())
+        cls.queue.append(entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Vaga concedida enquanto quem esperava desistia: devolve
+                self.release()
+            else:
+                try:
+                    cls.queue.remove(entry)
+                except ValueError:
+                    pass
+            raise
+
+        waited = time.perf_counter() - entry[2]
+        self._admitted(cls, waited)
+        return waited
+
+    def release(self) -> None:
+        self.active -= 1
+        while self.active < self.max_concurrency:
+            head = self._next_head()
+            if head is None:
+                return
+            tag, future, _ = head.queue.popleft()
+            if future.done():
+                continue
+            self._virtual_time = tag
+            self.active += 1
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority_class: str) -> AsyncIterator[float]:
+        waited = await self.acquire(priority_class)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    def _has_waiters(self) -> bool:
+        return any(cls.queue for cls in self.classes.values())
+
+    def _next_head(self) -> Optional[_PriorityClass]:
+        heads = [cls for cls in self.classes.values() if cls.queue]
+        return min(heads, key=lambda cls: cls.queue[0][0]) if heads else None
+
+    def _admitted(self, cls: _PriorityClass, waited: float) -> None:
+        cls.admitted += 1
+        cls.wait_total += waited
+        if self.on_wait is not None:
+            self.on_wait(cls.name, waited)
+
+    def info(self) -> Dict[str, object]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "demote_risk": self.demote_risk,
+            "roles": dict(self.role_classes),
+            "classes": {name: cls.info() for name, cls in self.classes.items()},
+        }
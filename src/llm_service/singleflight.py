@@ -0,0 +1,125 @@
+"""Coalescência de chamadas idênticas ao LLM em andamento (singleflight).
+
+Chamadas simultâneas com o mesmo provedor, modelo e prompt compartilham uma
+única geração: a primeira (líder) chama o provedor e as demais aguardam o
+mesmo resultado. Exceções do provedor chegam a todos os que aguardam; uma
+espera cancelada (timeout do cliente) não cancela a geração dos outros.
+Streams não são coalescidos.
+"""
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from cache.ttl_cache import make_key
+
+
+class _Call:
+    """Geração síncrona em andamento."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Grupo de chamadas em andamento por chave, com contadores de coalescência."""
+
+    def __init__(self, on_call: Optional[Callable[[str, bool], None]] = None):
+        # Recebe (provedor, coalescida?) a cada chamada (ex.: contador de métricas)
+        self.on_call = on_call
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._futures: Dict[Tuple[int, str], "asyncio.Future"] = {}
+
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _count(self, provider: str, coalesced: bool) -> None:
+        with self._lock:
+            if coalesced:
+                self.coalesced += 1
+            else:
+                self.leaders += 1
+        if self.on_call is not None:
+            self.on_call(provider, coalesced)
+
+    def do(self, key: str, fn: Callable[[], Any], provider: str = "") -> Any:
+        """Executa ``fn`` uma vez por chave entre as threads que chegam juntas."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        self._count(provider, not leader)
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    async def ado(self, key: str, fn: Callable[[], Any], provider: str = "") -> Any:
+        """Versão assíncrona: ``fn`` devolve uma corrotina, executada como tarefa compartilhada."""
+        loop = asyncio.get_running_loop()
+        # Futures pertencem a um event loop; a chave inclui o loop
+        slot = (id(loop), key)
+        future = self._futures.get(slot)
+        leader = future is None
+        if leader:
+            future = self._futures[slot] = loop.create_task(fn())
+            future.add_done_callback(lambda _: self._futures.pop(slot, None))
+        self._count(provider, not leader)
+
+        # shield: cancelar uma espera não cancela a geração compartilhada
+        return await asyncio.shield(future)
+
+    def stats(self) -> Dict[str, object]:
+        total = self.leaders + self.coalesced
+        return {
+            "in_flight": len(self._calls) + len(self._futures),
+            "upstream_calls": self.leaders,
+            "coalesced_calls": self.coalesced,
+            "coalescing_ratio": round(self.coalesced / total, 4) if total else None,
+        }
+
+
+class CoalescingClient:
+    """Envolve um LLMClient coalescendo generate_response/agenerate_response idênticos."""
+
+    def __init__(self, client: Any, group: SingleFlight, provider: str):
+        self.client = client
+        self.group = group
+        self.provider = provider
+
+    def __getattr__(self, name: str) -> Any:
+        # model, base_url, stream_response, ... seguem direto para o cliente
+        return getattr(self.client, name)
+
+    def _key(self, prompt: str, context: Optional[str]) -> str:
+        client = self.client
+        return make_key(self.provider, getattr(client, "base_url", ""), getattr(client, "model", ""), prompt, context or "")
+
+    def generate_response(self, prompt: str, context: Optional[str] = None) -> Dict[str, object]:
+        return self.group.do(
+            self._key(prompt, context),
+            lambda: self.client.generate_response(prompt, context),
+            provider=self.provider,
+        )
+
+    async def agenerate_response(self, prompt: str, context: Optional[str] = None) -> Dict[str, object]:
+        return await self.group.ado(
+            self._key(prompt, context),
+            lambda: self.client.agenerate_response(prompt, context),
+            provider=self.provider,
+        )
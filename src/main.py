@@ -1,19 +1,77 @@
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
-import uuid
-from datetime import datetime
+from typing import Optional, Dict, Any, List, Literal, Union
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack
+import asyncio
 import os
+import time
 
 from sanitization.input_sanitizer import InputSanitizer
 from sanitization.output_sanitizer import OutputSanitizer
+from sanitization.engines import get_engines
+from sanitization.streaming import StreamingOutputSanitizer
 from firewall_llm.firewall import LLMFirewall
+from firewall_llm.bundle import BundleWatcher
 from rbac_adaptativo.rbac import AdaptiveRBAC
+from llm_service.circuit_breaker import CircuitBreaker
 from llm_service.llm_provider import get_llm_client
+from llm_service.priority_gate import PriorityGate, QueueFullError
+from llm_service.singleflight import SingleFlight
 from compliance.mapper import ComplianceMapper
+from cache.response_cache import ResponseCache
+from fast_json import FastJSONResponse, dumps
+from metrics import METRICS, server_timing
+from metrics.audit_store import AuditTrail
+from pipeline.pipeline import ChatPipeline
+from pipeline.stages import (
+    ChatContext,
+    FirewallStage,
+    InputSanitizerStage,
+    LengthCheckStage,
+    LLMStage,
+    OutputSanitizerStage,
+    ProviderError,
+    RBACStage,
+    ResponseCacheStage,
+    RoleGateStage,
+)
+from rate_limit.middleware import RateLimitMiddleware
+from rate_limit.token_bucket import RateLimiter
 from settings import RuntimeLLMSettings
+from config import (
+    CPU_STAGE_WORKERS,
+    FIREWALL_RULES_WATCH_INTERVAL,
+    METRICS_FLUSH_INTERVAL,
+    METRICS_MULTIPROC_DIR,
+    PII_EXECUTION_MODE,
+    PII_WARMUP,
+    PIPELINE_STAGES,
+    RATE_LIMIT_ENABLED,
+    RESPONSE_VERBOSITY,
+    CHAT_BATCH_MAX_ITEMS,
+    CHAT_BATCH_CONCURRENCY,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL,
+    LLM_SINGLEFLIGHT_ENABLED,
+    LLM_BREAKER_ENABLED,
+    LLM_BREAKER_WINDOW,
+    LLM_BREAKER_MIN_CALLS,
+    LLM_BREAKER_FAILURE_RATE,
+    LLM_BREAKER_SLOW_CALL_SECONDS,
+    LLM_BREAKER_SLOW_CALL_RATE,
+    LLM_BREAKER_OPEN_SECONDS,
+    LLM_BREAKER_HALF_OPEN_CALLS,
+    LLM_FALLBACK_PROVIDER,
+    LLM_MAX_CONCURRENCY,
+    LLM_PRIORITY_CLASSES,
+    LLM_PRIORITY_ROLES,
+    LLM_PRIORITY_DEMOTE_RISK,
+)
 
 app = FastAPI(
     title="Pipeline de Segurança para LLMs",
@@ -29,27 +87,150 @@ output_sanitizer = OutputSanitizer()
 firewall = LLMFirewall()
 rbac = AdaptiveRBAC()
 compliance_mapper = ComplianceMapper()
+rate_limiter = RateLimiter()
+# Corpo completo de cada resposta por request_id (também no modo compacto), em JSONL durável
+audit_trail = AuditTrail()
+
+# Rejeita excesso de requisições antes do corpo chegar ao pipeline
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter, paths=("/chat",), enabled=RATE_LIMIT_ENABLED)
+
+rules_watcher: Optional[BundleWatcher] = None
 
 runtime_llm_settings = RuntimeLLMSettings()
 _llm_client = None
 
+# Etapas CPU-bound (firewall, Presidio) saem do event loop; a espera pelo LLM não ocupa thread
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_STAGE_WORKERS, thread_name_prefix="cpu-stage")
+
+
+async def run_cpu(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor, fn, *args)
+
+
+# Gerações idênticas em andamento compartilham uma única chamada ao provedor
+llm_singleflight = SingleFlight(
+    on_call=lambda provider, coalesced: METRICS.inc(
+        "llm_singleflight_calls_total", provider=provider, outcome="coalesced" if coalesced else "upstream"
+    )
+)
+
+
+def _response_cache_version():
+    """Partes da chave do cache de respostas além do prompt: provedor, modelo e regras."""
+    s = runtime_llm_settings
+    bundle = firewall.bundle
+    return (
+        s.provider,
+        ",".join(s.ollama_urls) if s.provider == "ollama" else "",
+        getattr(get_client(), "model", ""),
+        bundle.version,
+        bundle.compiled_at,
+        input_sanitizer._config_version,
+        output_sanitizer._config_version,
+    )
+
+
+response_cache = ResponseCache(
+    _response_cache_version,
+    max_size=RESPONSE_CACHE_SIZE,
+    ttl=RESPONSE_CACHE_TTL,
+    enabled=RESPONSE_CACHE_ENABLED,
+)
+
 
 def _reset_llm_client() -> None:
     global _llm_client
-    _llm_client = None
+    old_client, _llm_client = _llm_client, None
+    # Pool de conexões do cliente anterior (fecha quando as requisições em andamento terminarem)
+    close = getattr(old_client, "close", None)
+    if close is not None:
+        close()
+    # Respostas do provedor/modelo anterior não valem para o novo
+    response_cache.clear()
+
+
+# Um circuit breaker por provedor, mantido entre trocas de configuração
+provider_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def _breaker_for(provider: str) -> CircuitBreaker:
+    breaker = provider_breakers.get(provider)
+    if breaker is None:
+        breaker = provider_breakers[provider] = CircuitBreaker(
+            provider,
+            window=LLM_BREAKER_WINDOW,
+            min_calls=LLM_BREAKER_MIN_CALLS,
+            failure_rate=LLM_BREAKER_FAILURE_RATE,
+            slow_call_seconds=LLM_BREAKER_SLOW_CALL_SECONDS,
+            slow_call_rate=LLM_BREAKER_SLOW_CALL_RATE,
+            open_seconds=LLM_BREAKER_OPEN_SECONDS,
+            half_open_calls=LLM_BREAKER_HALF_OPEN_CALLS,
+        )
+    return breaker
+
+
+def _breaker_info() -> Dict[str, Any]:
+    return {name: breaker.info() for name, breaker in provider_breakers.items()}
 
 
 def get_client():
     global _llm_client
     if _llm_client is None:
-        _llm_client = get_llm_client(runtime_llm_settings)
+        s = runtime_llm_settings.normalize()
+        breaker = fallback = None
+        if LLM_BREAKER_ENABLED:
+            breaker = _breaker_for(s.provider)
+            if LLM_FALLBACK_PROVIDER and LLM_FALLBACK_PROVIDER != s.provider:
+                fallback = get_llm_client(RuntimeLLMSettings(provider=LLM_FALLBACK_PROVIDER))
+        _llm_client = get_llm_client(
+            s,
+            singleflight=llm_singleflight if LLM_SINGLEFLIGHT_ENABLED else None,
+            breaker=breaker,
+            fallback=fallback,
+        )
     return _llm_client
 
 
+response_cache_stage = ResponseCacheStage(response_cache)
+
+# Concorrência limitada no LLM com filas por classe de prioridade (papel/risk_score)
+priority_gate = PriorityGate(
+    LLM_MAX_CONCURRENCY,
+    LLM_PRIORITY_CLASSES,
+    role_classes=LLM_PRIORITY_ROLES,
+    demote_risk=LLM_PRIORITY_DEMOTE_RISK,
+    on_wait=lambda cls, waited: METRICS.observe("llm_priority_queue_wait_seconds", waited, priority_class=cls),
+    on_reject=lambda cls: METRICS.inc("llm_priority_rejected_total", priority_class=cls),
+) if LLM_MAX_CONCURRENCY > 0 else None
+llm_stage = LLMStage(get_client, gate=priority_gate)
+
+chat_pipeline = ChatPipeline.from_names(
+    PIPELINE_STAGES,
+    {
+        stage.name: stage
+        for stage in (
+            LengthCheckStage(firewall),
+            RoleGateStage(rbac),
+            FirewallStage(firewall),
+            RBACStage(rbac),
+            InputSanitizerStage(input_sanitizer),
+            response_cache_stage,
+            llm_stage,
+            OutputSanitizerStage(output_sanitizer),
+        )
+    },
+    run_cpu,
+    on_stage=lambda name, elapsed_ns: _observe_stage(name, elapsed_ns),
+    # A resposta só sai sanitizada (ver _chat_body)
+    outputs=("output",),
+)
+
+
 class ChatRequest(BaseModel):
     message: str
     user_id: Optional[str] = None
     user_role: str = "user"
+    verbosity: Optional[Literal["compact", "full"]] = None  # padrão: RESPONSE_VERBOSITY
 
 
 class ChatResponse(BaseModel):
@@ -58,12 +239,94 @@ class ChatResponse(BaseModel):
     controls_applied: list
     risk_score: Optional[float] = None
     compliance_evidence: Optional[dict] = None
+    verdict: Optional[str] = None  # allowed | blocked | denied
+    stage_timings: Optional[Dict[str, float]] = None
+
+
+class CompactChatResponse(BaseModel):
+    verdict: Optional[str] = None
+    response: str
+    request_id: str
+    risk_score: Optional[float] = None
+
+
+class ChatBatchRequest(BaseModel):
+    items: List[ChatRequest]
+    verbosity: Optional[Literal["compact", "full"]] = None  # padrão para os itens sem verbosity
+
+
+# Campos devolvidos no modo compacto
+COMPACT_FIELDS = ("verdict", "response", "request_id", "risk_score")
 
 
 class ProviderSettingsRequest(BaseModel):
     provider: str = "mock"  # mock | ollama | gemini
     ollama_url: str = "http://localhost:11434"
     ollama_model: str = "llama3.1"
+    ollama_urls: Optional[List[str]] = None  # vários backends (balanceamento); vazio = só ollama_url
+    hedge: bool = False
+
+
+@app.on_event("startup")
+def start_rules_watcher() -> None:
+    global rules_watcher
+    if FIREWALL_RULES_WATCH_INTERVAL > 0:
+        rules_watcher = BundleWatcher(firewall.rules_path, firewall.reload, FIREWALL_RULES_WATCH_INTERVAL)
+        rules_watcher.start()
+
+
+@app.on_event("startup")
+def warmup_pii_engines() -> None:
+    if PII_EXECUTION_MODE == "process":
+        get_engines().start_pool()
+    elif PII_WARMUP:
+        get_engines().warmup()
+
+
+@app.on_event("shutdown")
+def stop_pii_pool() -> None:
+    get_engines().stop_pool()
+
+
+@app.on_event("shutdown")
+def stop_rules_watcher() -> None:
+    if rules_watcher is not None:
+        rules_watcher.stop()
+
+
+@app.on_event("startup")
+def start_metrics_writer() -> None:
+    if METRICS_MULTIPROC_DIR:
+        METRICS.enable_multiprocess(METRICS_MULTIPROC_DIR, METRICS_FLUSH_INTERVAL)
+
+
+@app.on_event("shutdown")
+def stop_metrics_writer() -> None:
+    if METRICS_MULTIPROC_DIR:
+        METRICS.disable_multiprocess()
+
+
+@app.on_event("shutdown")
+def close_audit_trail() -> None:
+    audit_trail.close()
+
+
+@app.on_event("shutdown")
+def stop_cpu_executor() -> None:
+    cpu_executor.shutdown(wait=False, cancel_futures=True)
+
+
+@app.on_event("shutdown")
+async def close_llm_client() -> None:
+    aclose = getattr(_llm_client, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+@app.on_event("shutdown")
+def close_rbac_history() -> None:
+    # Grava incrementos pendentes do backend compartilhado
+    rbac.request_history.close()
 
 
 @app.get("/")
@@ -86,26 +349,119 @@ def get_provider_settings() -> Dict[str, Any]:
         "provider": s.provider,
         "ollama_url": s.ollama_url,
         "ollama_model": s.ollama_model,
+        "ollama_urls": s.ollama_urls,
+        "hedge": s.hedge,
+        "singleflight": llm_singleflight.stats(),
+        "balancer": _balancer_info(),
+        "circuit_breakers": _breaker_info(),
+        "priority_gate": priority_gate.info() if priority_gate is not None else None,
     }
 
 
+def _balancer_info() -> Optional[Dict[str, Any]]:
+    # Estado dos backends só existe com vários Ollama e o cliente já criado
+    info = getattr(_llm_client, "info", None)
+    return info() if info is not None else None
+
+
 @app.post("/api/provider")
 def set_provider_settings(req: ProviderSettingsRequest) -> Dict[str, Any]:
     runtime_llm_settings.provider = req.provider
     runtime_llm_settings.ollama_url = req.ollama_url
     runtime_llm_settings.ollama_model = req.ollama_model
+    runtime_llm_settings.ollama_urls = req.ollama_urls or []
+    runtime_llm_settings.hedge = req.hedge
     runtime_llm_settings.normalize()
 
     _reset_llm_client()
+    # Nova configuração do provedor: o histórico de falhas anterior não vale mais
+    _breaker_for(runtime_llm_settings.provider).reset()
 
     return {
         "ok": True,
         "provider": runtime_llm_settings.provider,
         "ollama_url": runtime_llm_settings.ollama_url,
         "ollama_model": runtime_llm_settings.ollama_model,
+        "ollama_urls": runtime_llm_settings.ollama_urls,
+        "hedge": runtime_llm_settings.hedge,
+        "circuit_breakers": _breaker_info(),
+    }
+
+
+@app.get("/api/firewall")
+def get_firewall_rules() -> Dict[str, Any]:
+    info = firewall.bundle.info()
+    info["classifier"] = firewall.classifier.version if firewall.classifier else None
+    if rules_watcher is not None:
+        info["watcher"] = {"interval": rules_watcher.interval, "last_error": rules_watcher.last_error}
+    return info
+
+
+@app.post("/api/firewall/reload")
+def reload_firewall_rules() -> Dict[str, Any]:
+    # Recompila o bundle configurado (FIREWALL_RULES_PATH) nesta requisição, fora do
+    # /chat, e troca atomicamente; o caminho não vem do cliente nem o erro volta a ele
+    try:
+        bundle = firewall.reload()
+    except (OSError, ValueError):
+        raise HTTPException(status_code=400, detail={"error": "Bundle de regras inválido"})
+    return {"ok": True, **bundle.info()}
+
+
+@app.get("/api/cache")
+def get_cache_stats() -> Dict[str, Any]:
+    return {
+        "firewall": firewall.cache.stats(),
+        "input_sanitizer": input_sanitizer.cache.stats(),
+        "output_sanitizer": output_sanitizer.cache.stats(),
+        "response": response_cache.stats(),
     }
 
 
+@app.post("/api/cache/invalidate")
+def invalidate_caches() -> Dict[str, Any]:
+    firewall.cache.clear()
+    input_sanitizer.invalidate_cache()
+    output_sanitizer.invalidate_cache()
+    response_cache.clear()
+    return {"ok": True}
+
+
+@app.get("/api/sanitization")
+def get_sanitization_stats() -> Dict[str, Any]:
+    return get_engines().info()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics() -> PlainTextResponse:
+    return PlainTextResponse(METRICS.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/pipeline")
+def get_pipeline_info() -> Dict[str, Any]:
+    return chat_pipeline.info()
+
+
+@app.get("/api/rate-limit")
+def get_rate_limit_stats() -> Dict[str, Any]:
+    return rate_limiter.stats()
+
+
+@app.get("/api/rbac/policy")
+def get_rbac_policy() -> Dict[str, Any]:
+    return {**rbac.policy.info(), "history": rbac.request_history.stats()}
+
+
+@app.post("/api/rbac/policy/reload")
+def reload_rbac_policy() -> Dict[str, Any]:
+    # Só recarrega a política configurada (RBAC_POLICY_PATH)
+    try:
+        policy = rbac.reload_policy()
+    except (OSError, ValueError):
+        raise HTTPException(status_code=400, detail={"error": "Política de RBAC inválida"})
+    return {"ok": True, **policy.info()}
+
+
 # --- Botão de teste (valida conexão/modelo do Ollama) ---
 @app.post("/api/provider/test")
 def test_provider_settings() -> Dict[str, Any]:
@@ -118,13 +474,14 @@ def test_provider_settings() -> Dict[str, Any]:
             "message": "Selecione 'ollama' como provedor para executar o teste de conexão/modelo.",
         }
 
-    # cria cliente no estado atual (sem mexer no client global)
-    client = get_llm_client(s)
+    # o client global já reflete as configurações atuais (e reaproveita o pool de conexões)
+    client = get_client()
 
     # prompt curtíssimo só para validar pipeline
     resp = client.generate_response("Responda apenas: OK")
 
-    if resp.get("success"):
+    # Resposta do fallback não prova que o Ollama está no ar
+    if resp.get("success") and not resp.get("fallback_from"):
         return {
             "ok": True,
             "provider": "ollama",
@@ -140,98 +497,305 @@ def test_provider_settings() -> Dict[str, Any]:
         "ollama_url": s.ollama_url,
         "ollama_model": s.ollama_model,
         "message": "Falha ao conectar/gerar via Ollama.",
-        "error": resp.get("error"),
+        "error": resp.get("fallback_reason") or resp.get("error"),
+        "circuit_breaker": provider_breakers["ollama"].info() if "ollama" in provider_breakers else None,
     }
 
 
-@app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
-    request_id = str(uuid.uuid4())
-    timestamp = datetime.utcnow().isoformat()
+def _observe_stage(name: str, elapsed_ns: int) -> None:
+    METRICS.observe("llm_pipeline_stage_duration_seconds", elapsed_ns / 1e9, stage=name)
 
-    controls_applied = []
 
-    try:
-        fw_result = firewall.check(req.message)
-        controls_applied.append({"control": "firewall", "result": fw_result})
-
-        if not fw_result["allowed"]:
-            return ChatResponse(
-                response="Bloqueado pelo Firewall: Prompt malicioso detectado.",
-                request_id=request_id,
-                controls_applied=controls_applied,
-                risk_score=fw_result.get("risk_score", 0),
-                compliance_evidence={
-                    "timestamp": timestamp,
-                    "control": "firewall",
-                    "status": "blocked",
-                    "detected_patterns": fw_result.get("detected_patterns", []),
-                    "risk_score": fw_result.get("risk_score", 0),
-                },
-            )
+def _record_request(endpoint: str, outcome: str, start_ns: int) -> float:
+    elapsed_ns = time.perf_counter_ns() - start_ns
+    METRICS.observe("llm_request_duration_seconds", elapsed_ns / 1e9, endpoint=endpoint)
+    METRICS.inc("llm_requests_total", endpoint=endpoint, outcome=outcome)
+    return round(elapsed_ns / 1e6, 4)
+
+
+def _map_compliance(ctx: ChatContext) -> Dict[str, Any]:
+    start = time.perf_counter_ns()
+    evidence = compliance_mapper.map_controls(ctx.controls_applied)
+    elapsed_ns = time.perf_counter_ns() - start
+    ctx.timings["compliance"] = round(elapsed_ns / 1e6, 4)
+    _observe_stage("compliance", elapsed_ns)
+    return evidence
+
+
+def _verdict(ctx: ChatContext) -> str:
+    if ctx.response is None:
+        return "allowed"
+    return "denied" if ctx.stopped_at in ("rbac", "rbac_role_gate") else "blocked"
+
 
-        sanitized_input = input_sanitizer.sanitize(req.message)
-        controls_applied.append({"control": "input_sanitizer", "result": sanitized_input})
+def _present(body: Dict[str, Any], verbosity: Optional[str]) -> Dict[str, Any]:
+    """Corpo completo ou só veredito/resposta/request_id/risk_score (o completo fica na auditoria)."""
+    if (verbosity or RESPONSE_VERBOSITY) == "compact":
+        return {key: body.get(key) for key in COMPACT_FIELDS}
+    return body
 
-        normalized_input = sanitized_input.get("sanitized_text", req.message)
 
-        rbac_result = rbac.evaluate_access(
-            user_id=req.user_id or "anon",
-            role=req.user_role,
-            prompt=normalized_input
+async def _run_chat(ctx: ChatContext) -> Dict[str, Any]:
+    """Executa o pipeline e monta o corpo completo da resposta (campos de ChatResponse)."""
+    await chat_pipeline.run(ctx)
+    return _chat_body(ctx)
+
+
+def _chat_body(ctx: ChatContext) -> Dict[str, Any]:
+    if ctx.response is not None:
+        return {**ctx.response, "verdict": _verdict(ctx), "stage_timings": ctx.timings}
+    response_cache_stage.store(ctx)
+
+    # Nunca devolve a resposta bruta do LLM: só o texto que passou pelo sanitizador
+    final_output = ctx.output.get("sanitized_text") or ""
+
+    return {
+        "response": final_output,
+        "request_id": ctx.request_id,
+        "controls_applied": ctx.controls_applied,
+        "risk_score": (ctx.rbac_result or {}).get("risk_score"),
+        "compliance_evidence": _map_compliance(ctx),
+        "verdict": "allowed",
+        "stage_timings": ctx.timings,
+    }
+
+
+@app.post("/chat", response_model=Union[ChatResponse, CompactChatResponse])
+async def chat(req: ChatRequest):
+    start = time.perf_counter_ns()
+    ctx = ChatContext(req.message, user_id=req.user_id, role=req.user_role)
+
+    try:
+        body = await _run_chat(ctx)
+    except QueueFullError as e:
+        _record_request("/chat", "queue_full", start)
+        raise HTTPException(
+            status_code=503,
+            detail={"error": "Provedor de LLM ocupado", "priority_class": e.priority_class},
+            headers={"Retry-After": "1"},
+        )
+    except ProviderError as e:
+        _record_request("/chat", "provider_error", start)
+        raise HTTPException(
+            status_code=502,
+            detail={
+                "error": "Erro no provedor de LLM",
+                "details": e.details,
+                "provider": e.provider,
+            },
+        )
+    except Exception as e:
+        _record_request("/chat", "error", start)
+        raise HTTPException(
+            status_code=500,
+            detail={"error": "Erro interno do servidor", "details": str(e)}
         )
-        controls_applied.append({"control": "rbac", "result": rbac_result})
-
-        if not rbac_result["allowed"]:
-            return ChatResponse(
-                response="Acesso negado pelo RBAC Adaptativo.",
-                request_id=request_id,
-                controls_applied=controls_applied,
-                risk_score=rbac_result.get("risk_score", 0),
-                compliance_evidence={
-                    "timestamp": timestamp,
-                    "control": "rbac",
-                    "status": "denied",
-                    "role": req.user_role,
-                    "risk_score": rbac_result.get("risk_score", 0),
-                },
-            )
 
-        llm_response = get_client().generate_response(normalized_input)
-        controls_applied.append({
-            "control": "llm_provider",
-            "result": {"success": llm_response.get("success"), "provider": llm_response.get("provider")}
-        })
+    ctx.timings["total"] = _record_request("/chat", "ok" if body["verdict"] == "allowed" else "blocked", start)
+    audit_trail.record(ctx.request_id, body)
+
+    # Response próprio: o corpo já está pronto, sem revalidação pelo response_model
+    return FastJSONResponse(
+        _present(body, req.verbosity),
+        headers={"Server-Timing": server_timing(ctx.timings)},
+    )
 
-        if not llm_response.get("success"):
-            raise HTTPException(
-                status_code=502,
-                detail={
-                    "error": "Erro no provedor de LLM",
-                    "details": llm_response.get("error"),
-                    "provider": llm_response.get("provider"),
-                },
-            )
 
-        sanitized_output = output_sanitizer.sanitize(llm_response.get("response") or "")
-        controls_applied.append({"control": "output_sanitizer", "result": sanitized_output})
+@app.post("/chat/batch")
+async def chat_batch(req: ChatBatchRequest):
+    """Vários prompts em uma requisição, com cada etapa rodando sobre o lote inteiro.
+
+    Os resultados saem na ordem da entrada; falhas de um item (ex.: provedor)
+    aparecem no próprio item com status "error" sem afetar os demais. O rate
+    limit cobra cada item como uma requisição (IP e user_id do item).
+    """
+    if not req.items:
+        raise HTTPException(status_code=400, detail={"error": "Lote vazio"})
+    if len(req.items) > CHAT_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail={"error": "Lote acima do limite", "max_items": CHAT_BATCH_MAX_ITEMS},
+        )
 
-        final_output = sanitized_output.get("sanitized_text", llm_response.get("response") or "")
+    start = time.perf_counter_ns()
+    ctxs = [ChatContext(item.message, user_id=item.user_id, role=item.user_role) for item in req.items]
 
-        compliance_evidence = compliance_mapper.map_controls(controls_applied)
+    try:
+        await chat_pipeline.run_batch(ctxs, concurrency=CHAT_BATCH_CONCURRENCY)
+    except Exception as e:
+        _record_request("/chat/batch", "error", start)
+        raise HTTPException(
+            status_code=500,
+            detail={"error": "Erro interno do servidor", "details": str(e)}
+        )
 
-        return ChatResponse(
-            response=final_output,
-            request_id=request_id,
-            controls_applied=controls_applied,
-            risk_score=rbac_result.get("risk_score"),
-            compliance_evidence=compliance_evidence
+    results = []
+    counts = {"allowed": 0, "blocked": 0, "denied": 0, "error": 0}
+    for index, (item, ctx) in enumerate(zip(req.items, ctxs)):
+        if ctx.error is not None:
+            counts["error"] += 1
+            error = ctx.error
+            if isinstance(error, QueueFullError):
+                detail = {"error": "Provedor de LLM ocupado", "priority_class": error.priority_class}
+            elif isinstance(error, ProviderError):
+                detail = {"error": "Erro no provedor de LLM", "details": error.details, "provider": error.provider}
+            else:
+                detail = {"error": "Erro interno do servidor", "details": str(error)}
+            results.append({"index": index, "status": "error", "request_id": ctx.request_id, **detail})
+            continue
+
+        body = _chat_body(ctx)
+        counts[body["verdict"]] += 1
+        audit_trail.record(ctx.request_id, body)
+        results.append({"index": index, "status": "ok", **_present(body, item.verbosity or req.verbosity)})
+
+    _record_request("/chat/batch", "partial" if counts["error"] else "ok", start)
+    return FastJSONResponse({"results": results, "summary": {"total": len(ctxs), **counts}})
+
+
+@app.get("/api/audit/{request_id}")
+def get_audit_entry(request_id: str):
+    body = audit_trail.get(request_id)
+    if body is None:
+        raise HTTPException(
+            status_code=404,
+            detail={"error": "Requisição não encontrada na trilha de auditoria", "request_id": request_id},
         )
+    return FastJSONResponse(body)
 
-    except HTTPException:
-        raise
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """Mesmo pipeline do /chat, mas a resposta do LLM chega como Server-Sent Events.
+
+    Eventos: "start", vários "chunk" ({"text": ...}, já sanitizados), e por fim
+    "done" (controles e evidências) ou "error" (provedor ou sanitização da
+    saída). Prompts bloqueados geram um único evento "blocked" com o corpo que
+    o /chat devolveria. Fila de prioridade cheia responde 503 antes de abrir o stream.
+    """
+    start = time.perf_counter_ns()
+    ctx = ChatContext(req.message, user_id=req.user_id, role=req.user_role)
+    request_id = ctx.request_id
+    controls_applied = ctx.controls_applied
+
+    try:
+        # Etapas de entrada; a saída é sanitizada incrementalmente abaixo
+        await chat_pipeline.run(ctx, stop_before="llm")
     except Exception as e:
+        _record_request("/chat/stream", "error", start)
         raise HTTPException(
             status_code=500,
             detail={"error": "Erro interno do servidor", "details": str(e)}
         )
+
+    # Só as etapas de entrada cabem no header; o restante segue no evento "done"
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Server-Timing": server_timing(ctx.timings)}
+    if ctx.response is not None:
+        _record_request("/chat/stream", "blocked", start)
+        body = {**ctx.response, "verdict": _verdict(ctx), "stage_timings": ctx.timings}
+        audit_trail.record(request_id, body)
+        return StreamingResponse(
+            iter([_sse("blocked", _present(body, req.verbosity))]), media_type="text/event-stream", headers=headers
+        )
+
+    normalized_input = ctx.prompt
+    rbac_result = ctx.rbac_result or {}
+
+    client = get_client()
+
+    # A vaga na porta de prioridade é obtida antes de abrir o stream: fila cheia vira 503
+    llm_slot = AsyncExitStack()
+    if not ctx.cache_hit:
+        try:
+            await llm_slot.enter_async_context(llm_stage.slot(ctx))
+        except QueueFullError as e:
+            _record_request("/chat/stream", "queue_full", start)
+            raise HTTPException(
+                status_code=503,
+                detail={"error": "Provedor de LLM ocupado", "priority_class": e.priority_class},
+                headers={"Retry-After": "1"},
+            )
+        headers["Server-Timing"] = server_timing(ctx.timings)
+
+    async def events():
+        try:
+            async for event in stream_events():
+                yield event
+        finally:
+            await llm_slot.aclose()
+
+    async def stream_events():
+        yield _sse("start", {"request_id": request_id})
+
+        if ctx.cache_hit:
+            # Resposta já sanitizada vinda do cache de respostas: um único chunk
+            text = ctx.output.get("sanitized_text", "")
+            yield _sse("chunk", {"text": text})
+            yield done_event([text])
+            return
+
+        streamer = StreamingOutputSanitizer(output_sanitizer)
+        emitted = []
+        # Etapa em andamento, para atribuir a falha ao provedor ou à sanitização
+        stage = "llm_provider"
+        try:
+            async for token in client.astream_response(normalized_input):
+                streamer.push(token)
+                if streamer.ready():
+                    stage = "output_sanitizer"
+                    text = await run_cpu(streamer.flush)
+                    stage = "llm_provider"
+                    if text:
+                        emitted.append(text)
+                        yield _sse("chunk", {"text": text})
+            await llm_slot.aclose()
+            stage = "output_sanitizer"
+            text = await run_cpu(streamer.finish)
+            if text:
+                emitted.append(text)
+                yield _sse("chunk", {"text": text})
+        except Exception as e:
+            # O que estava retido no buffer não é emitido sem sanitização
+            if stage == "output_sanitizer":
+                controls_applied.append({"control": "output_sanitizer", "result": {"success": False, "error": str(e)}})
+                _record_request("/chat/stream", "error", start)
+                yield _sse("error", {"error": "Erro na sanitização da saída", "details": str(e), "request_id": request_id})
+            else:
+                controls_applied.append({"control": "llm_provider", "result": {"success": False, "error": str(e)}})
+                _record_request("/chat/stream", "provider_error", start)
+                yield _sse("error", {"error": "Erro no provedor de LLM", "details": str(e), "request_id": request_id})
+            return
+
+        controls_applied.append({"control": "llm_provider", "result": {"success": True, "streamed": True}})
+        controls_applied.append({"control": "output_sanitizer", "result": streamer.summary()})
+        yield done_event(emitted)
+
+    def done_event(emitted) -> str:
+        streamed_text = "".join(emitted)
+
+        compliance_evidence = _map_compliance(ctx)
+        ctx.timings["total"] = _record_request("/chat/stream", "ok", start)
+
+        body = {
+            "response": streamed_text,
+            "request_id": request_id,
+            "controls_applied": controls_applied,
+            "risk_score": rbac_result.get("risk_score"),
+            "compliance_evidence": compliance_evidence,
+            "verdict": "allowed",
+            "stage_timings": ctx.timings,
+        }
+        audit_trail.record(request_id, body)
+
+        # O texto já foi entregue nos chunks; o "done" leva o restante do corpo
+        done = _present(body, req.verbosity)
+        return _sse("done", {key: value for key, value in done.items() if key != "response"})
+
+    # Se o stream nem chegar a ser iterado (cliente desconectou antes), a vaga é devolvida ao fim da resposta
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers=headers, background=BackgroundTask(llm_slot.aclose)
+    )
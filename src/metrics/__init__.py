@@ -0,0 +1,252 @@
+import bisect
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+def calcular_taxa_detecao(eventos):
+    """
+    eventos = lista de dicionários, ex:
+    {"detectado": True/False, "era_ataque": True/False}
+    """
+    total_ataques = sum(1 for e in eventos if e["era_ataque"])
+    if total_ataques == 0:
+        return 0
+    
+    verdadeiros_positivos = sum(1 for e in eventos if e["detectado"] and e["era_ataque"])
+    return verdadeiros_positivos / total_ataques
+
+
+def calcular_falsos_positivos(eventos):
+    total_normais = sum(1 for e in eventos if not e["era_ataque"])
+    if total_normais == 0:
+        return 0
+
+    falsos_positivos = sum(1 for e in eventos if e["detectado"] and not e["era_ataque"])
+    return falsos_positivos / total_normais
+
+
+def medir_latencia(funcao, *args, **kwargs):
+    """
+    Mede o tempo (latência) de execução de uma função.
+    """
+    inicio = time.perf_counter_ns()
+    funcao(*args, **kwargs)
+    fim = time.perf_counter_ns()
+    return (fim - inicio) / 1e9
+
+
+def calcular_throughput(total_eventos, tempo_total):
+    if tempo_total == 0:
+        return 0
+    return total_eventos / tempo_total
+
+
+# --- Métricas em tempo de execução (exportadas em /metrics, formato Prometheus) ---
+
+# Limites dos buckets em segundos (de 50 µs, etapas baratas, a 60 s, o timeout do provedor)
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Histograma de buckets fixos; observe() é um bisect e um incremento sob lock curto."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # último = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return {"counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+
+class MetricsRegistry:
+    """Histogramas e contadores por (nome, labels), com exportação Prometheus.
+
+    Cada worker do uvicorn tem o próprio registro. Com um diretório
+    multiprocesso configurado, cada worker grava periodicamente um snapshot
+    (metrics_<pid>.json) e o /metrics de qualquer worker soma todos eles.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, str, Sequence[float]]] = {}
+        self._histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+
+        self.multiprocess_dir: Optional[str] = None
+        self._writer: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def describe(self, name: str, kind: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self._meta[name] = (kind, help_text, tuple(buckets))
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        hist = self._histograms.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.get(key)
+                if hist is None:
+                    meta = self._meta.get(name)
+                    hist = self._histograms[key] = Histogram(meta[2] if meta else DEFAULT_BUCKETS)
+        hist.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    # --- Snapshots (multiprocesso) ---
+
+    def snapshot(self) -> Dict[str, List[Dict[str, object]]]:
+        with self._lock:
+            histograms = list(self._histograms.items())
+            counters = list(self._counters.items())
+        return {
+            "histograms": [
+                {"name": name, "labels": dict(labels), "buckets": list(h.buckets), **h.snapshot()}
+                for (name, labels), h in histograms
+            ],
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in counters
+            ],
+        }
+
+    def enable_multiprocess(self, directory: str, interval: float = 1.0) -> None:
+        """Passa a gravar snapshots deste worker em ``directory`` a cada ``interval`` s."""
+        os.makedirs(directory, exist_ok=True)
+        self.multiprocess_dir = directory
+        if self._writer is None:
+            self._stop.clear()
+            self._writer = threading.Thread(target=self._write_loop, args=(interval,), name="metrics-writer", daemon=True)
+            self._writer.start()
+
+    def disable_multiprocess(self) -> None:
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join(timeout=5)
+            self._writer = None
+        if self.multiprocess_dir:
+            self.write_snapshot()
+
+    def _write_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.write_snapshot()
+            except OSError:
+                pass
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.multiprocess_dir, f"metrics_{pid}.json")
+
+    def write_snapshot(self) -> None:
+        path = self._snapshot_path(os.getpid())
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+    def _collect(self) -> Dict[str, List[Dict[str, object]]]:
+        snapshots = [self.snapshot()]
+        if self.multiprocess_dir:
+            own = os.path.basename(self._snapshot_path(os.getpid()))
+            for entry in sorted(os.listdir(self.multiprocess_dir)):
+                if entry == own or not (entry.startswith("metrics_") and entry.endswith(".json")):
+                    continue
+                try:
+                    with open(os.path.join(self.multiprocess_dir, entry), "r", encoding="utf-8") as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+
+        histograms: Dict[Tuple[str, LabelKey], Dict[str, object]] = {}
+        counters: Dict[Tuple[str, LabelKey], float] = {}
+        for snap in snapshots:
+            for h in snap["histograms"]:
+                key = (h["name"], tuple(sorted(h["labels"].items())))
+                merged = histograms.get(key)
+                if merged is None:
+                    histograms[key] = {"buckets": h["buckets"], "counts": list(h["counts"]), "sum": h["sum"], "count": h["count"]}
+                elif merged["buckets"] == h["buckets"]:
+                    merged["counts"] = [a + b for a, b in zip(merged["counts"], h["counts"])]
+                    merged["sum"] += h["sum"]
+                    merged["count"] += h["count"]
+            for c in snap["counters"]:
+                key = (c["name"], tuple(sorted(c["labels"].items())))
+                counters[key] = counters.get(key, 0) + c["value"]
+        return {"histograms": histograms, "counters": counters}
+
+    # --- Exportação ---
+
+    def render_prometheus(self) -> str:
+        data = self._collect()
+        lines: List[str] = []
+        described = set()
+
+        def header(name: str, default_kind: str) -> None:
+            if name in described:
+                return
+            described.add(name)
+            kind, help_text, _ = self._meta.get(name, (default_kind, name, DEFAULT_BUCKETS))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), h in sorted(data["histograms"].items()):
+            header(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(list(h["buckets"]) + ["+Inf"], h["counts"]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _format_value(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(h['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {h['count']}")
+
+        for (name, labels), value in sorted(data["counters"].items()):
+            header(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: LabelKey) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def server_timing(timings_ms: Dict[str, float]) -> str:
+    """Valor do header Server-Timing a partir de {etapa: ms}."""
+    return ", ".join(f"{name};dur={ms:.3f}" for name, ms in timings_ms.items())
+
+
+METRICS = MetricsRegistry()
+METRICS.describe("llm_pipeline_stage_duration_seconds", "histogram", "Duração de cada etapa do pipeline do /chat")
+METRICS.describe("llm_request_duration_seconds", "histogram", "Duração total das requisições de chat")
+METRICS.describe("llm_requests_total", "counter", "Requisições de chat por desfecho")
+METRICS.describe("llm_singleflight_calls_total", "counter", "Gerações no provedor (upstream) e chamadas coalescidas")
+METRICS.describe("llm_priority_queue_wait_seconds", "histogram", "Espera na porta de prioridade do LLM por classe")
+METRICS.describe("llm_priority_rejected_total", "counter", "Requisições recusadas por fila de prioridade cheia")
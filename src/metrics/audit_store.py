@@ -1,12 +1,228 @@
 # metrics/audit_store.py
+"""Trilha de auditoria durável em JSONL, compartilhada pelos workers do host.
+
+Cada resposta completa do /chat vira uma linha ``{"request_id", "saved_at",
+"body"}`` anexada ao arquivo com O_APPEND (uma escrita por lote de linhas). A
+gravação sai do caminho da requisição: uma thread esvazia a fila em lote.
+
+Ao lado do JSONL fica um índice SQLite ``request_id -> (segmento, offset)``,
+atualizado na mesma transação (BEGIN IMMEDIATE) que anexa o lote; a transação
+serializa os workers do host, inclusive na rotação do arquivo (acima de
+``max_bytes`` o ativo vira ``<path>.<n>`` e só os ``backups`` mais recentes
+ficam). A consulta olha o cache local do worker e, na falta, o índice: um seek
+e uma linha lida, nunca uma varredura do arquivo, mesmo para ids inexistentes.
+"""
 import json
+import os
+import queue
+import sqlite3
+import threading
 from datetime import datetime
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache.ttl_cache import TTLCache
+from config import AUDIT_LOG_BACKUPS, AUDIT_LOG_MAX_BYTES, AUDIT_LOG_PATH, AUDIT_TRAIL_SIZE, AUDIT_TRAIL_TTL
+
+LOG_FILE = Path(AUDIT_LOG_PATH)
+LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+
+_STOP = object()
+
+
+def _line(entry: dict) -> bytes:
+    return (json.dumps(entry, ensure_ascii=False, default=str) + "\n").encode("utf-8")
 
-LOG_FILE = Path("data/audit_log.jsonl")
-LOG_FILE.parent.mkdir(exist_ok=True)
 
-def save_audit_log(entry: dict):
+def _append(data: bytes, path: Path = LOG_FILE) -> int:
+    """Anexa ``data`` ao arquivo e devolve o offset em que a escrita começou."""
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        return os.lseek(fd, 0, os.SEEK_CUR) - len(data)
+    finally:
+        os.close(fd)
+
+
+def _prefix(request_id: str) -> bytes:
+    # request_id é a primeira chave de cada linha (ver AuditTrail.record)
+    return ('{"request_id": ' + json.dumps(request_id, ensure_ascii=False) + ",").encode("utf-8")
+
+
+def save_audit_log(entry: dict, path: Path = LOG_FILE):
     entry["saved_at"] = datetime.now().isoformat()
-    with LOG_FILE.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    _append(_line(entry), path)
+
+
+class AuditTrail:
+    """Resposta completa por request_id: cache local + JSONL durável e indexado."""
+
+    def __init__(
+        self,
+        path: Path = LOG_FILE,
+        max_size: int = AUDIT_TRAIL_SIZE,
+        ttl: float = AUDIT_TRAIL_TTL,
+        max_bytes: int = AUDIT_LOG_MAX_BYTES,
+        backups: int = AUDIT_LOG_BACKUPS,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.backups = max(1, backups)
+        self.cache = TTLCache(max_size, ttl)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        # Segmento 0 é o arquivo ativo; n >= 1 são os rotacionados (<path>.<n>)
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path) + ".index.db", timeout=5.0, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS audit_index ("
+            " request_id TEXT PRIMARY KEY, segment INTEGER NOT NULL, offset INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS audit_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+        self.written = 0
+        self.write_errors = 0
+        self.rotations = 0
+
+    def record(self, request_id: str, body: Dict[str, Any]) -> None:
+        self.cache.set(request_id, body)
+        # request_id primeiro: a leitura pelo índice confere o prefixo da linha
+        self._queue.put({"request_id": request_id, "saved_at": datetime.now().isoformat(), "body": body})
+        self._ensure_writer()
+
+    def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        body = self.cache.get(request_id)
+        if body is not None:
+            return body
+        body = self._lookup(request_id)
+        if body is not None:
+            self.cache.set(request_id, body)
+        return body
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.path if segment == 0 else self.path.with_name(f"{self.path.name}.{segment}")
+
+    def _locate(self, request_id: str) -> Optional[Tuple[int, int]]:
+        with self._db_lock:
+            return self._conn.execute(
+                "SELECT segment, offset FROM audit_index WHERE request_id = ?", (request_id,)
+            ).fetchone()
+
+    def _lookup(self, request_id: str) -> Optional[Dict[str, Any]]:
+        prefix = _prefix(request_id)
+        # Uma segunda tentativa cobre a rotação entre a consulta ao índice e a leitura
+        for _ in range(2):
+            try:
+                location = self._locate(request_id)
+            except sqlite3.Error:
+                return None
+            if location is None:
+                return None
+            segment, offset = location
+            try:
+                with self._segment_path(segment).open("rb") as f:
+                    f.seek(offset)
+                    line = f.readline()
+            except FileNotFoundError:
+                continue
+            if line.startswith(prefix):
+                try:
+                    return json.loads(line).get("body")
+                except ValueError:
+                    return None
+        return None
+
+    def _ensure_writer(self) -> None:
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name="audit-writer", daemon=True)
+                    self._writer.start()
+
+    def _write_loop(self) -> None:
+        stop = False
+        while not stop:
+            batch: List[dict] = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                stop = True
+                batch = [entry for entry in batch if entry is not _STOP]
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch: List[dict]) -> None:
+        lines = [_line(entry) for entry in batch]
+        data = b"".join(lines)
+        with self._db_lock:
+            conn = self._conn
+            try:
+                # Trava de escrita do índice: serializa append, índice e rotação entre workers
+                conn.execute("BEGIN IMMEDIATE")
+                self._rotate_if_full(conn)
+                offset = _append(data, self.path)
+                rows = []
+                for entry, line in zip(batch, lines):
+                    rows.append((entry["request_id"], offset))
+                    offset += len(line)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO audit_index (request_id, segment, offset) VALUES (?, 0, ?)", rows
+                )
+                conn.execute("COMMIT")
+                self.written += len(batch)
+            except (OSError, sqlite3.Error):
+                try:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+                self.write_errors += len(batch)
+
+    def _rotate_if_full(self, conn: sqlite3.Connection) -> None:
+        """Com o arquivo ativo cheio, ele vira o segmento seguinte e o mais antigo sai."""
+        try:
+            if self.path.stat().st_size < self.max_bytes:
+                return
+        except FileNotFoundError:
+            return
+        row = conn.execute("SELECT value FROM audit_meta WHERE key = 'segment'").fetchone()
+        segment = (row[0] if row else 0) + 1
+        os.replace(self.path, self._segment_path(segment))
+        conn.execute("INSERT OR REPLACE INTO audit_meta (key, value) VALUES ('segment', ?)", (segment,))
+        conn.execute("UPDATE audit_index SET segment = ? WHERE segment = 0", (segment,))
+
+        expired = segment - self.backups
+        if expired >= 1:
+            conn.execute("DELETE FROM audit_index WHERE segment BETWEEN 1 AND ?", (expired,))
+            self._segment_path(expired).unlink(missing_ok=True)
+        self.rotations += 1
+
+    def close(self) -> None:
+        """Grava o que estiver na fila e encerra a thread de escrita."""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(_STOP)
+            writer.join()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "path": str(self.path),
+            "pending": self._queue.qsize(),
+            "written": self.written,
+            "write_errors": self.write_errors,
+            "rotations": self.rotations,
+            "cache": self.cache.stats(),
+        }
@@ -0,0 +1 @@
+"""Pipeline do /chat expresso como uma lista configurável de etapas."""
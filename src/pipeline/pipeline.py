@@ -0,0 +1,176 @@
+"""Execução das etapas do /chat na ordem configurada (PIPELINE_STAGES).
+
+A ordem é validada na montagem: cada etapa só pode vir depois de quem produz o
+que ela requer, e o pipeline completo precisa produzir ``outputs`` (no /chat, a
+saída sanitizada). Etapas ``offload`` consecutivas rodam em um único salto para o
+executor de CPU; as baratas rodam direto no event loop. Cada etapa tem o tempo
+medido com perf_counter_ns e registrado em ``ctx.timings`` (ms).
+
+``run_batch`` percorre as mesmas etapas com um lote de contextos: cada etapa
+síncrona roda uma vez sobre os itens ainda ativos e a etapa assíncrona (LLM)
+roda com concorrência limitada por semáforo.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Sequence
+
+from pipeline.stages import ChatContext, Stage
+
+# O que já existe no contexto antes da primeira etapa
+INITIAL_INPUTS = frozenset({"message", "prompt", "role", "user_id"})
+
+
+class ChatPipeline:
+    """Lista ordenada de etapas com interrupção antecipada."""
+
+    def __init__(
+        self,
+        stages: Sequence[Stage],
+        run_cpu: Callable[..., Awaitable],
+        on_stage: Optional[Callable[[str, int], None]] = None,
+        outputs: Iterable[str] = (),
+    ):
+        self.stages = list(stages)
+        self.run_cpu = run_cpu
+        # Recebe (etapa, duração em ns) após cada etapa (ex.: histogramas de métricas)
+        self.on_stage = on_stage
+        self.outputs = tuple(outputs)
+        self._validate()
+
+    @classmethod
+    def from_names(
+        cls,
+        names: Iterable[str],
+        registry: Dict[str, Stage],
+        run_cpu: Callable[..., Awaitable],
+        on_stage: Optional[Callable[[str, int], None]] = None,
+        outputs: Iterable[str] = (),
+    ) -> "ChatPipeline":
+        stages = []
+        for name in names:
+            if name not in registry:
+                raise ValueError(f"Etapa desconhecida: '{name}' (disponíveis: {', '.join(registry)})")
+            stages.append(registry[name])
+        return cls(stages, run_cpu, on_stage, outputs)
+
+    def _validate(self) -> None:
+        available = set(INITIAL_INPUTS)
+        seen = set()
+        for stage in self.stages:
+            if stage.name in seen:
+                raise ValueError(f"Etapa '{stage.name}' repetida no pipeline")
+            seen.add(stage.name)
+            missing = set(stage.requires) - available
+            if missing:
+                raise ValueError(
+                    f"Etapa '{stage.name}' requer {sorted(missing)}, que nenhuma etapa anterior produz"
+                )
+            available.update(stage.provides)
+        missing = set(self.outputs) - available
+        if missing:
+            raise ValueError(f"Pipeline não produz {sorted(missing)}")
+
+    @property
+    def names(self) -> List[str]:
+        return [stage.name for stage in self.stages]
+
+    async def run(self, ctx: ChatContext, stop_before: Optional[str] = None) -> ChatContext:
+        """Executa as etapas (até ``stop_before``, exclusive) ou até uma interromper."""
+        stages = self.stages
+        if stop_before is not None:
+            stages = stages[:self.names.index(stop_before)] if stop_before in self.names else stages
+
+        i = 0
+        while i < len(stages) and ctx.response is None:
+            stage = stages[i]
+            if stage.is_async:
+                start = time.perf_counter_ns()
+                try:
+                    await stage.arun(ctx)
+                finally:
+                    self._finish(stage, ctx, time.perf_counter_ns() - start)
+                i += 1
+            elif stage.offload:
+                # Agrupa etapas offload consecutivas em um único salto para o executor
+                j = i
+                while j < len(stages) and stages[j].offload and not stages[j].is_async:
+                    j += 1
+                await self.run_cpu(self._run_sync, stages[i:j], ctx)
+                i = j
+            else:
+                self._run_sync([stage], ctx)
+                i += 1
+        return ctx
+
+    async def run_batch(self, ctxs: Sequence[ChatContext], concurrency: int = 4) -> Sequence[ChatContext]:
+        """Executa as etapas sobre o lote; itens interrompidos ou com falha saem do fluxo."""
+        stages = self.stages
+        i = 0
+        while i < len(stages) and self._active(ctxs):
+            stage = stages[i]
+            if stage.is_async:
+                await self._run_async_batch(stage, self._active(ctxs), concurrency)
+                i += 1
+            elif stage.offload:
+                j = i
+                while j < len(stages) and stages[j].offload and not stages[j].is_async:
+                    j += 1
+                await self.run_cpu(self._run_sync_batch, stages[i:j], ctxs)
+                i = j
+            else:
+                self._run_sync_batch([stage], ctxs)
+                i += 1
+        return ctxs
+
+    @staticmethod
+    def _active(ctxs: Sequence[ChatContext]) -> List[ChatContext]:
+        return [ctx for ctx in ctxs if ctx.response is None and ctx.error is None]
+
+    def _run_sync_batch(self, stages: Sequence[Stage], ctxs: Sequence[ChatContext]) -> None:
+        for stage in stages:
+            active = self._active(ctxs)
+            if not active:
+                return
+            start = time.perf_counter_ns()
+            stage.run_batch(active)
+            # Cada item é contabilizado com a sua parte do tempo do lote
+            share_ns = (time.perf_counter_ns() - start) // len(active)
+            for ctx in active:
+                self._finish(stage, ctx, share_ns)
+
+    async def _run_async_batch(self, stage: Stage, ctxs: Sequence[ChatContext], concurrency: int) -> None:
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run_one(ctx: ChatContext) -> None:
+            async with semaphore:
+                start = time.perf_counter_ns()
+                try:
+                    await stage.arun(ctx)
+                except Exception as e:
+                    ctx.error = e
+                finally:
+                    self._finish(stage, ctx, time.perf_counter_ns() - start)
+
+        await asyncio.gather(*(run_one(ctx) for ctx in ctxs))
+
+    def _run_sync(self, stages: Sequence[Stage], ctx: ChatContext) -> None:
+        for stage in stages:
+            start = time.perf_counter_ns()
+            try:
+                stage.run(ctx)
+            finally:
+                self._finish(stage, ctx, time.perf_counter_ns() - start)
+            if ctx.response is not None:
+                return
+
+    def _finish(self, stage: Stage, ctx: ChatContext, elapsed_ns: int) -> None:
+        stopped = ctx.response is not None and ctx.stopped_at is None
+        if stopped:
+            ctx.stopped_at = stage.name
+        ctx.timings[stage.name] = round(elapsed_ns / 1e6, 4)
+        stage.record(elapsed_ns, stopped)
+        if self.on_stage is not None:
+            self.on_stage(stage.name, elapsed_ns)
+
+    def info(self) -> Dict[str, object]:
+        return {"order": self.names, "stages": [stage.info() for stage in self.stages]}
@@ -0,0 +1,361 @@
+"""Etapas do pipeline do /chat.
+
+Cada etapa declara o custo relativo, o que requer e o que produz no contexto,
+e se roda no executor de CPU (``offload``) ou é assíncrona (``is_async``). Uma
+etapa interrompe o pipeline preenchendo ``ctx.response`` (bloqueio/negação).
+Etapas baratas que só rejeitam (tamanho, papel, firewall) vêm antes das caras
+que transformam o texto (Presidio) e da chamada ao LLM.
+
+No /chat/batch cada etapa recebe o lote inteiro (``run_batch``); as de
+sanitização sobrescrevem o padrão para passar todos os textos de uma vez pelo
+NLP. Falhas de um item ficam em ``ctx.error`` e não interrompem os demais.
+"""
+import threading
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+
+class ChatContext:
+    """Estado de uma requisição ao longo das etapas."""
+
+    def __init__(self, message: str, user_id: Optional[str] = None, role: str = "user"):
+        self.request_id = str(uuid.uuid4())
+        self.timestamp = datetime.utcnow().isoformat()
+        self.now = datetime.now()
+
+        self.message = message
+        self.user_id = user_id
+        self.role = role
+        # Texto que segue pelo pipeline (substituído pela versão sanitizada)
+        self.prompt = message
+
+        self.controls_applied: List[Dict[str, Any]] = []
+        self.rbac_result: Optional[Dict[str, Any]] = None
+        self.llm_response: Optional[Dict[str, Any]] = None
+        self.output: Optional[Dict[str, Any]] = None
+
+        # Preenchido por uma etapa que interrompe o pipeline (campos de ChatResponse)
+        self.response: Optional[Dict[str, Any]] = None
+        self.stopped_at: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        # Falha do item no processamento em lote
+        self.error: Optional[Exception] = None
+        # Cache de respostas: chave consultada e se a resposta veio dele
+        self.cache_key: Optional[str] = None
+        self.cache_hit = False
+
+
+class ProviderError(Exception):
+    """Falha do provedor de LLM (mapeada para 502 na API)."""
+
+    def __init__(self, details: Optional[str], provider: Optional[str]):
+        super().__init__(details)
+        self.details = details
+        self.provider = provider
+
+
+class Stage:
+    """Etapa base."""
+
+    name = ""
+    cost = 0  # custo relativo estimado (ordem de grandeza em µs)
+    requires: Tuple[str, ...] = ()
+    provides: Tuple[str, ...] = ()
+    offload = False
+    is_async = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.short_circuits = 0
+        self.total_ns = 0
+
+    def run(self, ctx: ChatContext) -> None:
+        raise NotImplementedError
+
+    async def arun(self, ctx: ChatContext) -> None:
+        raise NotImplementedError
+
+    def run_batch(self, ctxs: List[ChatContext]) -> None:
+        """Executa a etapa para cada item do lote, isolando as falhas por item."""
+        for ctx in ctxs:
+            try:
+                self.run(ctx)
+            except Exception as e:
+                ctx.error = e
+
+    def record(self, elapsed_ns: int, stopped: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            self.total_ns += elapsed_ns
+            if stopped:
+                self.short_circuits += 1
+
+    def info(self) -> Dict[str, object]:
+        return {
+            "name": self.name,
+            "cost": self.cost,
+            "requires": list(self.requires),
+            "provides": list(self.provides),
+            "execution": "async" if self.is_async else ("executor" if self.offload else "inline"),
+            "calls": self.calls,
+            "short_circuits": self.short_circuits,
+            "avg_ms": round(self.total_ns / self.calls / 1e6, 4) if self.calls else None,
+        }
+
+
+def firewall_block(ctx: ChatContext, fw_result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "response": "Bloqueado pelo Firewall: Prompt malicioso detectado.",
+        "request_id": ctx.request_id,
+        "controls_applied": ctx.controls_applied,
+        "risk_score": fw_result.get("risk_score", 0),
+        "compliance_evidence": {
+            "timestamp": ctx.timestamp,
+            "control": "firewall",
+            "status": "blocked",
+            "detected_patterns": fw_result.get("detected_patterns", []),
+            "risk_score": fw_result.get("risk_score", 0),
+        },
+    }
+
+
+def rbac_denial(ctx: ChatContext, rbac_result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "response": "Acesso negado pelo RBAC Adaptativo.",
+        "request_id": ctx.request_id,
+        "controls_applied": ctx.controls_applied,
+        "risk_score": rbac_result.get("risk_score", 0),
+        "compliance_evidence": {
+            "timestamp": ctx.timestamp,
+            "control": "rbac",
+            "status": "denied",
+            "role": ctx.role,
+            "risk_score": rbac_result.get("risk_score", 0),
+        },
+    }
+
+
+class LengthCheckStage(Stage):
+    """Prompt vazio ou acima do tamanho máximo: bloqueio sem varrer regras."""
+
+    name = "length_check"
+    cost = 1
+    requires = ("message",)
+
+    def __init__(self, firewall):
+        super().__init__()
+        self.firewall = firewall
+
+    def run(self, ctx: ChatContext) -> None:
+        fw_result = self.firewall.precheck(ctx.message)
+        if fw_result is not None:
+            ctx.controls_applied.append({"control": "firewall", "result": fw_result})
+            ctx.response = firewall_block(ctx, fw_result)
+
+
+class RoleGateStage(Stage):
+    """RBAC só com papel e horário: nega cedo quem a política negaria de qualquer forma."""
+
+    name = "rbac_role_gate"
+    cost = 2
+    requires = ("role",)
+
+    def __init__(self, rbac):
+        super().__init__()
+        self.rbac = rbac
+
+    def run(self, ctx: ChatContext) -> None:
+        denial = self.rbac.role_gate(ctx.role, timestamp=ctx.now)
+        if denial is not None:
+            ctx.rbac_result = denial
+            ctx.controls_applied.append({"control": "rbac", "result": denial})
+            ctx.response = rbac_denial(ctx, denial)
+
+
+class FirewallStage(Stage):
+    name = "firewall"
+    cost = 100
+    requires = ("message",)
+    provides = ("firewall_verdict",)
+    offload = True
+
+    def __init__(self, firewall):
+        super().__init__()
+        self.firewall = firewall
+
+    def run(self, ctx: ChatContext) -> None:
+        fw_result = self.firewall.check(ctx.message)
+        ctx.controls_applied.append({"control": "firewall", "result": fw_result})
+        if not fw_result["allowed"]:
+            ctx.response = firewall_block(ctx, fw_result)
+
+
+class RBACStage(Stage):
+    name = "rbac"
+    cost = 20
+    # Pontua o prompt sanitizado; o histórico (SQLite) faz I/O bloqueante, então sai do event loop
+    requires = ("sanitized_prompt",)
+    provides = ("rbac",)
+    offload = True
+
+    def __init__(self, rbac):
+        super().__init__()
+        self.rbac = rbac
+
+    def run(self, ctx: ChatContext) -> None:
+        rbac_result = self.rbac.evaluate_access(
+            user_id=ctx.user_id or "anon",
+            role=ctx.role,
+            prompt=ctx.prompt,
+            timestamp=ctx.now,
+        )
+        ctx.rbac_result = rbac_result
+        ctx.controls_applied.append({"control": "rbac", "result": rbac_result})
+        if not rbac_result["allowed"]:
+            ctx.response = rbac_denial(ctx, rbac_result)
+
+
+class InputSanitizerStage(Stage):
+    name = "input_sanitizer"
+    cost = 5000
+    requires = ("message",)
+    provides = ("prompt", "sanitized_prompt")
+    offload = True
+
+    def __init__(self, sanitizer):
+        super().__init__()
+        self.sanitizer = sanitizer
+
+    def run(self, ctx: ChatContext) -> None:
+        self._apply(ctx, self.sanitizer.sanitize(ctx.message))
+
+    def run_batch(self, ctxs: List[ChatContext]) -> None:
+        try:
+            results = self.sanitizer.sanitize_many([ctx.message for ctx in ctxs])
+        except Exception:
+            # Refaz item a item para localizar a falha
+            return super().run_batch(ctxs)
+        for ctx, sanitized_input in zip(ctxs, results):
+            self._apply(ctx, sanitized_input)
+
+    @staticmethod
+    def _apply(ctx: ChatContext, sanitized_input: Dict[str, Any]) -> None:
+        ctx.controls_applied.append({"control": "input_sanitizer", "result": sanitized_input})
+        ctx.prompt = sanitized_input.get("sanitized_text", ctx.message)
+
+
+class ResponseCacheStage(Stage):
+    """Reaproveita resposta e saída sanitizada de um prompt já respondido.
+
+    Em caso de acerto, as etapas do LLM e da sanitização de saída não fazem nada.
+    A gravação fica com quem monta a resposta final (ver ``store``).
+    """
+
+    name = "response_cache"
+    cost = 10
+    requires = ("sanitized_prompt",)
+
+    def __init__(self, response_cache):
+        super().__init__()
+        self.response_cache = response_cache
+
+    def run(self, ctx: ChatContext) -> None:
+        if not self.response_cache.enabled:
+            return
+        ctx.cache_key = self.response_cache.key(ctx.prompt)
+        cached = self.response_cache.get(ctx.cache_key)
+        if cached is None:
+            return
+        ctx.cache_hit = True
+        ctx.llm_response = cached["llm_response"]
+        ctx.output = cached["output"]
+        ctx.controls_applied.append({
+            "control": "llm_provider",
+            "result": {"success": True, "provider": ctx.llm_response.get("provider"), "cached": True}
+        })
+        ctx.controls_applied.append({"control": "output_sanitizer", "result": ctx.output})
+
+    def store(self, ctx: ChatContext) -> None:
+        if ctx.cache_key and not ctx.cache_hit and ctx.llm_response and ctx.output is not None:
+            self.response_cache.set(ctx.cache_key, ctx.llm_response, ctx.output)
+
+
+class LLMStage(Stage):
+    name = "llm"
+    cost = 1000000
+    # O prompt só chega ao provedor depois de firewall, sanitização e RBAC
+    requires = ("sanitized_prompt", "firewall_verdict", "rbac")
+    provides = ("llm_response",)
+    is_async = True
+
+    def __init__(self, get_client: Callable[[], Any], gate=None):
+        super().__init__()
+        self.get_client = get_client
+        # Porta de prioridade (llm_service.priority_gate.PriorityGate) opcional
+        self.gate = gate
+
+    @asynccontextmanager
+    async def slot(self, ctx: ChatContext) -> AsyncIterator[None]:
+        """Vaga na porta de prioridade pela classe da requisição (papel e risk_score).
+
+        Com o circuito do provedor aberto a chamada falha na hora (ou vai ao
+        fallback) sem tocar o provedor, então não ocupa nem espera vaga.
+        """
+        circuit_open = getattr(self.get_client(), "circuit_open", None)
+        if self.gate is None or (circuit_open is not None and circuit_open()):
+            yield
+            return
+        priority_class = self.gate.classify(ctx.role, (ctx.rbac_result or {}).get("risk_score"))
+        async with self.gate.slot(priority_class) as waited:
+            ctx.timings["llm_queue"] = round(waited * 1000, 4)
+            yield
+
+    async def arun(self, ctx: ChatContext) -> None:
+        if ctx.cache_hit:
+            return
+        async with self.slot(ctx):
+            llm_response = await self.get_client().agenerate_response(ctx.prompt)
+        ctx.llm_response = llm_response
+        result = {"success": llm_response.get("success"), "provider": llm_response.get("provider")}
+        if llm_response.get("fallback_from"):
+            # Atendida pelo provedor reserva (circuito aberto ou falha do principal)
+            result["fallback_from"] = llm_response["fallback_from"]
+        ctx.controls_applied.append({"control": "llm_provider", "result": result})
+        if not llm_response.get("success"):
+            raise ProviderError(llm_response.get("error"), llm_response.get("provider"))
+
+
+class OutputSanitizerStage(Stage):
+    name = "output_sanitizer"
+    cost = 5000
+    requires = ("llm_response",)
+    provides = ("output",)
+    offload = True
+
+    def __init__(self, sanitizer):
+        super().__init__()
+        self.sanitizer = sanitizer
+
+    def run(self, ctx: ChatContext) -> None:
+        if ctx.cache_hit:
+            return
+        self._apply(ctx, self.sanitizer.sanitize(ctx.llm_response.get("response") or ""))
+
+    def run_batch(self, ctxs: List[ChatContext]) -> None:
+        ctxs = [ctx for ctx in ctxs if not ctx.cache_hit]
+        if not ctxs:
+            return
+        try:
+            results = self.sanitizer.sanitize_many([ctx.llm_response.get("response") or "" for ctx in ctxs])
+        except Exception:
+            return super().run_batch(ctxs)
+        for ctx, sanitized_output in zip(ctxs, results):
+            self._apply(ctx, sanitized_output)
+
+    @staticmethod
+    def _apply(ctx: ChatContext, sanitized_output: Dict[str, Any]) -> None:
+        ctx.controls_applied.append({"control": "output_sanitizer", "result": sanitized_output})
+        ctx.output = sanitized_output
@@ -0,0 +1 @@
+"""Módulo de limitação de taxa (token bucket) aplicada na borda, antes do pipeline."""
@@ -0,0 +1,135 @@
+"""Middleware ASGI de rate limiting (antes do corpo chegar ao /chat).
+
+O bucket do IP é verificado primeiro, só com os headers, e vale para toda
+requisição. O do usuário usa o ``user_id`` do corpo JSON, a mesma identidade
+que o endpoint repassa ao RBAC; headers como ``X-User-Id`` não são verificados
+e por isso não escolhem bucket (trocá-los a cada requisição não dá cota nova).
+O corpo é lido uma vez e reentregue intacto à aplicação. Excedido o limite, a
+resposta é 429 com ``Retry-After``, sem passar por firewall, Presidio ou LLM.
+
+Lotes (corpo com ``items``, ex.: /chat/batch) custam um token do IP por item,
+e cada item é cobrado do bucket do próprio ``user_id``.
+"""
+import json
+import math
+from typing import Dict, Iterable, Optional, Tuple
+
+from rate_limit.token_bucket import RateLimiter
+
+
+class RateLimitMiddleware:
+    """Aplica os token buckets do RateLimiter às rotas de chat (POST)."""
+
+    def __init__(self, app, limiter: RateLimiter, paths: Iterable[str] = ("/chat",), enabled: bool = True):
+        self.app = app
+        self.limiter = limiter
+        self.paths = tuple(paths)
+        self.enabled = enabled
+
+    def _applies(self, scope) -> bool:
+        if not self.enabled or scope["type"] != "http" or scope.get("method") != "POST":
+            return False
+        path = scope.get("path", "")
+        return any(path == p or path.startswith(p + "/") for p in self.paths)
+
+    async def __call__(self, scope, receive, send):
+        if not self._applies(scope):
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        ip = client[0] if client else "unknown"
+        allowed, retry_after = self.limiter.check_ip(ip)
+        if not allowed:
+            await self._reject(send, "ip", retry_after)
+            return
+
+        body = await _read_body(receive)
+        items, users = _charges(body)
+        receive = _replay(body, receive)
+
+        if items > 1:
+            # O primeiro token do lote já foi cobrado acima
+            allowed, retry_after = self.limiter.check_ip(ip, tokens=items - 1)
+            if not allowed:
+                await self._reject(send, "ip", retry_after)
+                return
+
+        for user_id, count in users.items():
+            allowed, retry_after = self.limiter.check_user(user_id, tokens=count)
+            if not allowed:
+                await self._reject(send, "user", retry_after)
+                return
+
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _reject(send, limit_scope: str, retry_after: float) -> None:
+        seconds = max(1, math.ceil(retry_after)) if math.isfinite(retry_after) else 3600
+        body = json.dumps({
+            "detail": {
+                "error": "Limite de requisições excedido",
+                "scope": limit_scope,
+                "retry_after": seconds,
+            }
+        }, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(seconds).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+def _user_id(data) -> Optional[str]:
+    user_id = data.get("user_id") if isinstance(data, dict) else None
+    return str(user_id) if user_id else None
+
+
+def _charges(body: bytes) -> Tuple[int, Dict[str, int]]:
+    """Itens da requisição (tokens do IP) e tokens por user_id."""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return 1, {}
+    items = data.get("items") if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        user_id = _user_id(data)
+        return 1, {user_id: 1} if user_id else {}
+
+    users: Dict[str, int] = {}
+    for item in items:
+        user_id = _user_id(item)
+        if user_id:
+            users[user_id] = users.get(user_id, 0) + 1
+    return max(1, len(items)), users
+
+
+def _replay(body: bytes, receive):
+    """receive() que entrega o corpo já lido e depois volta ao original (ex.: disconnect)."""
+    sent = False
+
+    async def replay_receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay_receive
@@ -0,0 +1,94 @@
+"""Token buckets por chave (usuário, IP) com memória limitada.
+
+Cada chave guarda só (tokens, último refill). As chaves ficam em ordem de uso
+e as menos recentes são descartadas acima de ``max_keys``; uma chave
+descartada volta com o bucket cheio, o que só acontece com clientes ociosos.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from config import RATE_LIMIT_MAX_KEYS, RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW
+
+
+class TokenBucketStore:
+    """Buckets de capacidade ``capacity`` reabastecidos a ``refill_rate`` tokens/s."""
+
+    def __init__(self, capacity: float, refill_rate: float, max_keys: int = 100000):
+        self.capacity = float(capacity)
+        self.refill_rate = float(refill_rate)
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.allowed = 0
+        self.rejected = 0
+        self.evictions = 0
+
+    def acquire(self, key: Hashable, now: Optional[float] = None, tokens: float = 1.0) -> Tuple[bool, float]:
+        """Consome ``tokens`` tokens; devolve (permitido, segundos até haver tokens suficientes)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.capacity, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_rate)
+                bucket[1] = now
+
+            if bucket[0] >= tokens:
+                bucket[0] -= tokens
+                self.allowed += 1
+                return True, 0.0
+
+            self.rejected += 1
+            if self.refill_rate <= 0 or tokens > self.capacity:
+                return False, float("inf")
+            return False, (tokens - bucket[0]) / self.refill_rate
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "keys": len(self._buckets),
+            "max_keys": self.max_keys,
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "evictions": self.evictions,
+        }
+
+
+class RateLimiter:
+    """Buckets por IP e por usuário: RATE_LIMIT_REQUESTS a cada RATE_LIMIT_WINDOW segundos."""
+
+    def __init__(
+        self,
+        requests: int = RATE_LIMIT_REQUESTS,
+        window: float = RATE_LIMIT_WINDOW,
+        max_keys: int = RATE_LIMIT_MAX_KEYS,
+    ):
+        self.requests = requests
+        self.window = window
+        rate = requests / window if window > 0 else float(requests)
+        self.by_ip = TokenBucketStore(requests, rate, max_keys)
+        self.by_user = TokenBucketStore(requests, rate, max_keys)
+
+    def check_ip(self, ip: str, tokens: float = 1.0) -> Tuple[bool, float]:
+        return self.by_ip.acquire(ip, tokens=tokens)
+
+    def check_user(self, user_id: str, tokens: float = 1.0) -> Tuple[bool, float]:
+        return self.by_user.acquire(user_id, tokens=tokens)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "requests": self.requests,
+            "window": self.window,
+            "ip": self.by_ip.stats(),
+            "user": self.by_user.stats(),
+        }
@@ -0,0 +1,286 @@
+"""Histórico de requisições por usuário para o fator de frequência do RBAC.
+
+Backends:
+
+- ``memory`` (padrão): cada usuário tem uma deque limitada de timestamps; a
+  contagem na janela deslizante descarta só os timestamps vencidos do início
+  (expiração amortizada, O(1) por requisição). Os usuários ficam em ordem de
+  uso: quem ficou ocioso além da janela é removido e o total é limitado (LRU).
+- ``sqlite``: contadores por segundo em um arquivo SQLite (WAL) compartilhado
+  por todos os workers do host. Os incrementos são acumulados e gravados em
+  lote (no registro, na leitura ou por uma thread a cada ``flush_interval``,
+  mesmo sem tráfego); a contagem soma o que já está no banco com o que ainda
+  está pendente neste processo (read-your-writes). Se a gravação falha (ex.:
+  banco travado), os incrementos voltam para a fila e a requisição segue.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict
+
+from config import (
+    RBAC_HISTORY_MAX_PER_USER,
+    RBAC_HISTORY_MAX_USERS,
+    RBAC_HISTORY_WINDOW,
+    RBAC_STATE_BACKEND,
+    RBAC_STATE_FLUSH_INTERVAL,
+    RBAC_STATE_PATH,
+)
+
+
+class RequestHistory:
+    """Interface dos backends de histórico."""
+
+    window: float
+
+    def count(self, user_id: str, timestamp: float) -> int:
+        """Requisições do usuário nos últimos ``window`` segundos."""
+        raise NotImplementedError
+
+    def record(self, user_id: str, timestamp: float) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Libera recursos (grava o que estiver pendente)."""
+
+    def stats(self) -> Dict[str, object]:
+        raise NotImplementedError
+
+
+class InMemoryRequestHistory(RequestHistory):
+    """Contador de janela deslizante por usuário, com memória limitada."""
+
+    def __init__(
+        self,
+        window: float = RBAC_HISTORY_WINDOW,
+        max_per_user: int = RBAC_HISTORY_MAX_PER_USER,
+        max_users: int = RBAC_HISTORY_MAX_USERS,
+    ):
+        self.window = window
+        self.max_per_user = max_per_user
+        self.max_users = max_users
+        self._users: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.idle_evictions = 0
+        self.lru_evictions = 0
+
+    def count(self, user_id: str, timestamp: float) -> int:
+        """Requisições do usuário nos últimos ``window`` segundos."""
+        cutoff = timestamp - self.window
+        with self._lock:
+            times = self._users.get(user_id)
+            if times is None:
+                return 0
+            while times and times[0] <= cutoff:
+                times.popleft()
+            return len(times)
+
+    def record(self, user_id: str, timestamp: float) -> None:
+        with self._lock:
+            times = self._users.get(user_id)
+            if times is None:
+                times = self._users[user_id] = deque(maxlen=self.max_per_user)
+            else:
+                self._users.move_to_end(user_id)
+            times.append(timestamp)
+            self._evict(timestamp)
+
+    def _evict(self, now: float) -> None:
+        # O mais antigo em uso está no início: remove enquanto estiver ocioso
+        cutoff = now - self.window
+        users = self._users
+        while users:
+            user_id, times = next(iter(users.items()))
+            if times and times[-1] > cutoff:
+                break
+            del users[user_id]
+            self.idle_evictions += 1
+        while len(users) > self.max_users:
+            users.popitem(last=False)
+            self.lru_evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._users
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "backend": "memory",
+            "users": len(self._users),
+            "window": self.window,
+            "max_users": self.max_users,
+            "max_per_user": self.max_per_user,
+            "idle_evictions": self.idle_evictions,
+            "lru_evictions": self.lru_evictions,
+        }
+
+
+class SQLiteRequestHistory(RequestHistory):
+    """Contadores por (usuário, segundo) em SQLite WAL, compartilhados entre processos."""
+
+    def __init__(
+        self,
+        path: str = RBAC_STATE_PATH,
+        window: float = RBAC_HISTORY_WINDOW,
+        max_per_user: int = RBAC_HISTORY_MAX_PER_USER,
+        flush_interval: float = RBAC_STATE_FLUSH_INTERVAL,
+        flush_size: int = 256,
+    ):
+        self.path = path
+        self.window = window
+        self.max_per_user = max_per_user
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rbac_requests ("
+            " user_id TEXT NOT NULL, bucket INTEGER NOT NULL, hits INTEGER NOT NULL,"
+            " PRIMARY KEY (user_id, bucket)) WITHOUT ROWID"
+        )
+
+        # user_id -> {segundo: incrementos} ainda não gravados por este processo
+        self._pending: Dict[str, Dict[int, int]] = {}
+        self._pending_total = 0
+        self._last_flush = time.monotonic()
+        self._last_prune = 0.0
+        self._latest = 0.0  # timestamp mais recente registrado (referência da limpeza)
+
+        self.flushes = 0
+        self.flush_errors = 0
+
+        # Grava os pendentes mesmo quando este processo para de receber requisições
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="rbac-history-flush", daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            with self._lock:
+                if self._pending_total and not self._stop.is_set():
+                    self._flush()
+
+    def _flush_due(self) -> None:
+        if self._pending_total >= self.flush_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self._flush()
+
+    def count(self, user_id: str, timestamp: float) -> int:
+        since = int(timestamp - self.window)
+        with self._lock:
+            if self._pending_total:
+                self._flush_due()
+            row = self._conn.execute(
+                "SELECT COALESCE(SUM(hits), 0) FROM rbac_requests WHERE user_id = ? AND bucket > ?",
+                (user_id, since),
+            ).fetchone()
+            total = row[0]
+            pending = self._pending.get(user_id)
+            if pending:
+                total += sum(n for bucket, n in pending.items() if bucket > since)
+        # Mesmo teto do backend em memória (últimas max_per_user requisições)
+        return min(total, self.max_per_user)
+
+    def record(self, user_id: str, timestamp: float) -> None:
+        bucket = int(timestamp)
+        with self._lock:
+            buckets = self._pending.setdefault(user_id, {})
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+            self._latest = max(self._latest, timestamp)
+            self._pending_total += 1
+            self._flush_due()
+
+    def _flush(self) -> bool:
+        """Grava os incrementos pendentes; em caso de falha eles voltam para a fila."""
+        pending, self._pending, self._pending_total = self._pending, {}, 0
+        self._last_flush = time.monotonic()
+        if not pending:
+            return True
+        conn = self._conn
+        now = self._latest
+        prune = now - self._last_prune >= self.window
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO rbac_requests (user_id, bucket, hits) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id, bucket) DO UPDATE SET hits = hits + excluded.hits",
+                [(uid, bucket, n) for uid, buckets in pending.items() for bucket, n in buckets.items()],
+            )
+            # Remove contadores fora da janela de vez em quando
+            if prune:
+                conn.execute("DELETE FROM rbac_requests WHERE bucket <= ?", (int(now - self.window),))
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            try:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            self._restore(pending)
+            self.flush_errors += 1
+            return False
+        if prune:
+            self._last_prune = now
+        self.flushes += 1
+        return True
+
+    def _restore(self, pending: Dict[str, Dict[int, int]]) -> None:
+        # Soma de volta ao que chegou enquanto a gravação falhava
+        for uid, buckets in pending.items():
+            current = self._pending.setdefault(uid, {})
+            for bucket, n in buckets.items():
+                current[bucket] = current.get(bucket, 0) + n
+                self._pending_total += n
+
+    def flush(self) -> bool:
+        with self._lock:
+            return self._flush()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending, self._pending_total = {}, 0
+            self._conn.execute("DELETE FROM rbac_requests")
+
+    def close(self) -> None:
+        self._stop.set()
+        self._flusher.join()
+        with self._lock:
+            self._flush()
+            self._conn.close()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "window": self.window,
+            "pending": self._pending_total,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+        }
+
+
+def create_request_history(backend: str = RBAC_STATE_BACKEND, path: str = RBAC_STATE_PATH) -> RequestHistory:
+    """Cria o backend configurado (RBAC_STATE_BACKEND: memory | sqlite)."""
+    if backend == "sqlite":
+        return SQLiteRequestHistory(path)
+    if backend != "memory":
+        raise ValueError(f"Backend de estado do RBAC desconhecido: {backend}")
+    return InMemoryRequestHistory()
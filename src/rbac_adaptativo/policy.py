@@ -0,0 +1,206 @@
+"""Política declarativa do RBAC adaptativo.
+
+Pesos por papel, janelas de horário, faixas de tamanho de prompt, fator de
+frequência e limiares (nível/ação) ficam em um arquivo JSON externo
+(``rbac_adaptativo/policy.json`` por padrão). Na carga, a política é compilada
+em tabelas de consulta: uma entrada por hora do dia e uma por risk_score
+(0-100). Assim cada avaliação é um punhado de consultas, e a parte que depende
+só de (papel, hora) ainda fica memoizada. Trocar a política não exige deploy:
+basta recarregar o arquivo.
+"""
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+DEFAULT_POLICY_PATH = Path(__file__).with_name("policy.json")
+
+# Limite de combinações (papel, hora) memoizadas
+_PARTIAL_CACHE_SIZE = 1024
+
+
+@dataclass(frozen=True)
+class LengthBand:
+    name: str
+    min_length: int
+    chars_per_point: int
+    max_weight: int
+
+
+@dataclass(frozen=True)
+class FrequencyRule:
+    name: str
+    threshold: int
+    weight_per_request: int
+    max_weight: int
+
+
+class CompiledPolicy:
+    """Política já compilada em tabelas; imutável exceto pelo cache de decisões parciais."""
+
+    def __init__(
+        self,
+        version: str,
+        role_weights: Dict[str, int],
+        unknown_role_weight: int,
+        hour_table: Tuple[Tuple[Tuple[str, int], ...], ...],
+        length_bands: Tuple[LengthBand, ...],
+        frequency: Optional[FrequencyRule],
+        score_table: Tuple[Tuple[str, str], ...],
+        allow_actions: FrozenSet[str],
+        source: str = "<memory>",
+        compile_ms: float = 0.0,
+    ):
+        self.version = version
+        self.role_weights = role_weights
+        self.unknown_role_weight = unknown_role_weight
+        self.hour_table = hour_table
+        self.length_bands = length_bands
+        self.frequency = frequency
+        self.score_table = score_table
+        self.allow_actions = allow_actions
+        self.source = source
+        self.compiled_at = datetime.utcnow().isoformat()
+        self.compile_ms = compile_ms
+
+        self._partial: Dict[Tuple[str, int], Tuple[int, Tuple[str, ...]]] = {}
+        # denied_from[s]: nenhum score >= s leva a uma ação permitida. Só vale se
+        # tamanho e frequência nunca reduzem o score (pesos não negativos)
+        additive = all(band.max_weight >= 0 for band in length_bands) and (
+            frequency is None or (frequency.weight_per_request >= 0 and frequency.max_weight >= 0)
+        )
+        denied_from = [additive] * 102
+        for score in range(100, -1, -1):
+            denied_from[score] = denied_from[score + 1] and score_table[score][1] not in allow_actions
+        self._denied_from = tuple(denied_from)
+
+    def role_and_time(self, role: str, hour: int) -> Tuple[int, Tuple[str, ...]]:
+        """Score e fatores que dependem só de (papel, hora), memoizados."""
+        key = (role, hour)
+        cached = self._partial.get(key)
+        if cached is not None:
+            return cached
+
+        role_score = self.role_weights.get(role.lower(), self.unknown_role_weight)
+        score = role_score
+        factors = [f"role_{role}: {role_score}"]
+        for name, weight in self.hour_table[hour]:
+            score += weight
+            factors.append(f"{name}: {weight}")
+
+        partial = (score, tuple(factors))
+        if len(self._partial) < _PARTIAL_CACHE_SIZE:
+            self._partial[key] = partial
+        return partial
+
+    def length_factors(self, length: int) -> List[Tuple[str, int]]:
+        return [
+            (band.name, min(band.max_weight, (length - band.min_length) // band.chars_per_point))
+            for band in self.length_bands
+            if length > band.min_length
+        ]
+
+    def frequency_factor(self, recent_requests: int) -> Optional[Tuple[str, int]]:
+        rule = self.frequency
+        if rule is None or recent_requests <= rule.threshold:
+            return None
+        return rule.name, min(rule.max_weight, (recent_requests - rule.threshold) * rule.weight_per_request)
+
+    def decide(self, risk_score: int) -> Tuple[str, str]:
+        """(nível, ação) para um risk_score já limitado a 0-100."""
+        return self.score_table[max(0, min(100, risk_score))]
+
+    def certainly_denied(self, partial_score: int) -> bool:
+        """Se a decisão já é negativa só com o score parcial (os demais fatores só somam)."""
+        return self._denied_from[max(0, min(100, partial_score))]
+
+    def info(self) -> Dict[str, object]:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "roles": dict(self.role_weights),
+            "allow_actions": sorted(self.allow_actions),
+            "compiled_at": self.compiled_at,
+            "compile_ms": round(self.compile_ms, 3),
+            "cached_partials": len(self._partial),
+        }
+
+
+def compile_policy(data: Dict[str, object], source: str = "<memory>") -> CompiledPolicy:
+    """Valida a política e monta as tabelas de consulta."""
+    start = time.perf_counter()
+    if not isinstance(data, dict):
+        raise ValueError("Política inválida: esperado um objeto JSON")
+
+    version = str(data.get("version") or "").strip()
+    if not version:
+        raise ValueError("Política sem 'version'")
+
+    try:
+        role_weights = {str(role).lower(): int(weight) for role, weight in (data.get("roles") or {}).items()}
+        unknown_role_weight = int(data.get("unknown_role_weight", 50))
+
+        hours: List[List[Tuple[str, int]]] = [[] for _ in range(24)]
+        for window in data.get("time_windows") or []:
+            name, weight = str(window["name"]), int(window["weight"])
+            for begin, end in window["hours"]:
+                if not 0 <= int(begin) <= int(end) <= 24:
+                    raise ValueError(f"janela de horário inválida em '{name}': {begin}-{end}")
+                for hour in range(int(begin), int(end)):
+                    hours[hour].append((name, weight))
+
+        length_bands = tuple(
+            LengthBand(
+                name=str(band["name"]),
+                min_length=int(band["min_length"]),
+                chars_per_point=max(1, int(band.get("chars_per_point", 1))),
+                max_weight=int(band["max_weight"]),
+            )
+            for band in data.get("length_bands") or []
+        )
+
+        raw_frequency = data.get("frequency")
+        frequency = FrequencyRule(
+            name=str(raw_frequency.get("name", "high_frequency")),
+            threshold=int(raw_frequency["threshold"]),
+            weight_per_request=int(raw_frequency["weight_per_request"]),
+            max_weight=int(raw_frequency["max_weight"]),
+        ) if raw_frequency else None
+
+        thresholds = sorted(data.get("thresholds") or [], key=lambda t: int(t["below"]))
+        score_table: List[Tuple[str, str]] = []
+        for score in range(101):
+            entry = next((t for t in thresholds if score < int(t["below"])), None)
+            if entry is None:
+                raise ValueError(f"nenhum limiar cobre o risk_score {score}")
+            score_table.append((str(entry["level"]), str(entry["action"])))
+
+        allow_actions = frozenset(str(a) for a in data.get("allow_actions", ["allow"]))
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Política {version} inválida: {e}") from e
+    if score_table[100][1] in allow_actions:
+        # Se nem o risk_score máximo é negado, a política libera tudo
+        raise ValueError(f"Política {version} inválida: allow_actions libera até o risk_score 100")
+
+    return CompiledPolicy(
+        version=version,
+        role_weights=role_weights,
+        unknown_role_weight=unknown_role_weight,
+        hour_table=tuple(tuple(h) for h in hours),
+        length_bands=length_bands,
+        frequency=frequency,
+        score_table=tuple(score_table),
+        allow_actions=allow_actions,
+        source=source,
+        compile_ms=(time.perf_counter() - start) * 1000,
+    )
+
+
+def load_policy(path: Optional[str] = None) -> CompiledPolicy:
+    """Lê e compila a política a partir de um arquivo JSON."""
+    path = Path(path) if path else DEFAULT_POLICY_PATH
+    with path.open("r", encoding="utf-8") as f:
+        data = json.load(f)
+    return compile_policy(data, source=str(path))
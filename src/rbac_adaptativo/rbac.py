@@ -2,19 +2,34 @@
 from typing import Dict, Optional
 from datetime import datetime
 
+from config import RBAC_POLICY_PATH
+from rbac_adaptativo.history import RequestHistory, create_request_history
+from rbac_adaptativo.policy import DEFAULT_POLICY_PATH, CompiledPolicy, load_policy
+
 
 class AdaptiveRBAC:
     """RBAC adaptativo com cálculo de risk score."""
-    
-    def __init__(self):
-        # Limiares de risco
-        self.LOW_RISK_THRESHOLD = 30
-        self.MEDIUM_RISK_THRESHOLD = 60
-        self.HIGH_RISK_THRESHOLD = 80
-        
-        # Histórico de requisições (simulado - em produção seria um banco)
-        self.request_history = {}
-    
+
+    def __init__(self, request_history: Optional[RequestHistory] = None, policy_path: Optional[str] = None):
+        # Política declarativa (pesos, horários, limiares), compilada na carga
+        self.policy_path = str(policy_path or RBAC_POLICY_PATH or DEFAULT_POLICY_PATH)
+        self._policy = load_policy(self.policy_path)
+
+        # Histórico de requisições (backend configurável, ver rbac_adaptativo.history)
+        self.request_history = request_history or create_request_history()
+
+    @property
+    def policy(self) -> CompiledPolicy:
+        return self._policy
+
+    def reload_policy(self, path: Optional[str] = None) -> CompiledPolicy:
+        """Compila a política do arquivo e troca a referência (o cache parcial vai junto)."""
+        policy = load_policy(path or self.policy_path)
+        if path:
+            self.policy_path = str(path)
+        self._policy = policy
+        return policy
+
     def calculate_risk_score(
         self,
         user_role: str,
@@ -24,13 +39,13 @@ class AdaptiveRBAC:
     ) -> Dict[str, any]:
         """
         Calcula o risk score da requisição.
-        
+
         Args:
             user_role: Papel do usuário (admin, user, guest)
             prompt: Texto do prompt
             user_id: ID do usuário (opcional)
             timestamp: Timestamp da requisição (opcional)
-        
+
         Returns:
             Dict com:
                 - risk_score: score de risco (0-100)
@@ -38,94 +53,101 @@ class AdaptiveRBAC:
                 - action: ação recomendada (allow, step_up, block)
                 - factors: fatores que contribuíram para o score
         """
+        return self._evaluate(self._policy, user_role, prompt, user_id, timestamp)
+
+    def evaluate_access(
+        self,
+        user_id: str,
+        role: str,
+        prompt: str,
+        timestamp: Optional[datetime] = None
+    ) -> Dict[str, any]:
+        """
+        Decide se a requisição é permitida segundo a política vigente.
+
+        Returns:
+            Dict de calculate_risk_score acrescido de:
+                - allowed: se a ação está entre as permitidas pela política
+                - policy_version: versão da política usada na decisão
+        """
+        policy = self._policy
+        result = self._evaluate(policy, role, prompt, user_id, timestamp)
+        result["allowed"] = result["action"] in policy.allow_actions
+        result["policy_version"] = policy.version
+        return result
+
+    def role_gate(self, role: str, timestamp: Optional[datetime] = None) -> Optional[Dict[str, any]]:
+        """Decisão antecipada só com papel e horário, sem olhar o prompt nem o histórico.
+
+        Como tamanho e frequência só aumentam o score, se o score parcial já
+        leva a uma ação não permitida a requisição pode ser negada aqui.
+        Devolve o resultado da negação, ou None se a avaliação completa for necessária.
+        """
+        policy = self._policy
+        hour = (timestamp or datetime.now()).hour
+        partial_score, factors = policy.role_and_time(role, hour)
+        if not policy.certainly_denied(partial_score):
+            return None
+        risk_score = min(partial_score, 100)
+        risk_level, action = policy.decide(risk_score)
+        return {
+            "risk_score": risk_score,
+            "risk_level": risk_level,
+            "action": action,
+            "factors": list(factors),
+            "allowed": False,
+            "policy_version": policy.version,
+        }
+
+    def _evaluate(
+        self,
+        policy: CompiledPolicy,
+        user_role: str,
+        prompt: str,
+        user_id: Optional[str],
+        timestamp: Optional[datetime],
+    ) -> Dict[str, any]:
         if timestamp is None:
             timestamp = datetime.now()
-        
-        risk_score = 0
-        factors = []
-        
-        # Fator 1: Papel do usuário
-        role_scores = {
-            "admin": 10,
-            "user": 30,
-            "guest": 50
-        }
-        role_score = role_scores.get(user_role.lower(), 50)
-        risk_score += role_score
-        factors.append(f"role_{user_role}: {role_score}")
-        
-        # Fator 2: Horário (requisições fora do horário comercial = maior risco)
-        hour = timestamp.hour
-        if hour < 8 or hour > 18:
-            time_risk = 20
-            risk_score += time_risk
-            factors.append(f"off_hours: {time_risk}")
-        
+
+        # Fatores 1 e 2: papel do usuário e horário (memoizados por papel/hora)
+        risk_score, base_factors = policy.role_and_time(user_role, timestamp.hour)
+        factors = list(base_factors)
+
         # Fator 3: Tamanho do prompt (prompts muito longos = maior risco)
-        prompt_length = len(prompt)
-        if prompt_length > 1000:
-            length_risk = min(20, (prompt_length - 1000) // 100)
-            risk_score += length_risk
-            factors.append(f"long_prompt: {length_risk}")
-        
+        for name, weight in policy.length_factors(len(prompt)):
+            risk_score += weight
+            factors.append(f"{name}: {weight}")
+
         # Fator 4: Histórico de requisições (muitas requisições recentes = maior risco)
-        if user_id:
+        if user_id and policy.frequency is not None:
             recent_requests = self._count_recent_requests(user_id, timestamp)
-            if recent_requests > 10:
-                history_risk = min(20, (recent_requests - 10) * 2)
-                risk_score += history_risk
-                factors.append(f"high_frequency: {history_risk}")
-        
+            frequency = policy.frequency_factor(recent_requests)
+            if frequency is not None:
+                risk_score += frequency[1]
+                factors.append(f"{frequency[0]}: {frequency[1]}")
+
         # Limita risk_score a 100
         risk_score = min(risk_score, 100)
-        
-        # Determina nível de risco
-        if risk_score < self.LOW_RISK_THRESHOLD:
-            risk_level = "low"
-            action = "allow"
-        elif risk_score < self.MEDIUM_RISK_THRESHOLD:
-            risk_level = "medium"
-            action = "allow"
-        elif risk_score < self.HIGH_RISK_THRESHOLD:
-            risk_level = "high"
-            action = "step_up"
-        else:
-            risk_level = "critical"
-            action = "block"
-        
+
+        # Determina nível de risco e ação pela tabela da política
+        risk_level, action = policy.decide(risk_score)
+
         # Registra requisição no histórico
         if user_id:
             self._record_request(user_id, timestamp)
-        
+
         return {
             "risk_score": risk_score,
             "risk_level": risk_level,
             "action": action,
             "factors": factors
         }
-    
+
     def _count_recent_requests(self, user_id: str, timestamp: datetime) -> int:
         """Conta requisições recentes do usuário (últimos 5 minutos)."""
-        if user_id not in self.request_history:
-            return 0
-        
-        recent_count = 0
-        cutoff_time = timestamp.timestamp() - 300  # 5 minutos
-        
-        for req_time in self.request_history[user_id]:
-            if req_time > cutoff_time:
-                recent_count += 1
-        
-        return recent_count
-    
+        return self.request_history.count(user_id, timestamp.timestamp())
+
     def _record_request(self, user_id: str, timestamp: datetime):
         """Registra uma requisição no histórico."""
-        if user_id not in self.request_history:
-            self.request_history[user_id] = []
-        
-        self.request_history[user_id].append(timestamp.timestamp())
-        
-        # Mantém apenas últimas 100 requisições
-        if len(self.request_history[user_id]) > 100:
-            self.request_history[user_id] = self.request_history[user_id][-100:]
-
+        self.request_history.record(user_id, timestamp.timestamp())
@@ -0,0 +1,138 @@
+"""Base comum dos sanitizadores de entrada e saída.
+
+Análise no Presidio (com cache por digest do texto e API em lote) e
+anonimização ficam aqui; cada sanitizador só acrescenta o que lhe é próprio
+(ex.: conteúdo proibido na saída).
+"""
+from presidio_analyzer import AnalyzerEngine, RecognizerResult
+from presidio_anonymizer import AnonymizerEngine
+from typing import Dict, List, Optional
+
+from cache.ttl_cache import TTLCache, make_key
+from config import PII_BATCH_MAX_CHARS, PII_BATCH_SIZE, VERDICT_CACHE_SIZE, VERDICT_CACHE_TTL
+from sanitization.engines import PresidioEngines, get_engines
+
+
+class PresidioSanitizer:
+    """Detecta e anonimiza PII com os engines compartilhados do Presidio."""
+
+    def __init__(self, engines: Optional[PresidioEngines] = None):
+        # Engines compartilhados e criados no primeiro uso (ver sanitization.engines)
+        self.engines = engines or get_engines()
+        # Resultados do analyzer memoizados por digest do texto
+        self.cache = TTLCache(VERDICT_CACHE_SIZE, VERDICT_CACHE_TTL)
+        self._config_version = 0
+
+    @property
+    def analyzer(self) -> AnalyzerEngine:
+        return self.engines.analyzer
+
+    @property
+    def anonymizer(self) -> AnonymizerEngine:
+        return self.engines.anonymizer
+
+    def sanitize(self, text: str) -> Dict[str, any]:
+        """
+        Sanitiza o texto.
+
+        Returns:
+            Dict com:
+                - sanitized_text: texto sanitizado
+                - detected_entities: lista de entidades detectadas
+                - has_pii: boolean indicando se PII foi encontrado
+                (mais os campos próprios de cada sanitizador)
+        """
+        if not text:
+            return self._empty_result()
+
+        results = self._analyze(text)
+        return self._build_result(text, results)
+
+    def sanitize_many(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        max_chars: Optional[int] = None,
+    ) -> List[Dict[str, any]]:
+        """
+        Sanitiza vários textos de uma vez, passando os lotes inteiros pelo NLP.
+
+        Returns:
+            Lista de dicts (mesmo formato de sanitize), na ordem da entrada.
+        """
+        spans: List[Optional[List[RecognizerResult]]] = [None] * len(texts)
+        keys = [make_key(self._config_version, text) for text in texts]
+        pending: List[int] = []
+
+        for i, text in enumerate(texts):
+            if not text:
+                continue
+            cached = self.cache.get(keys[i])
+            if cached is not None:
+                spans[i] = [RecognizerResult(*span) for span in cached]
+            else:
+                pending.append(i)
+
+        if pending:
+            batch = self.engines.analyze_many(
+                [texts[i] for i in pending],
+                batch_size=batch_size or PII_BATCH_SIZE,
+                max_chars=max_chars or PII_BATCH_MAX_CHARS,
+            )
+            for i, results in zip(pending, batch):
+                spans[i] = results
+                self.cache.set(keys[i], tuple((r.entity_type, r.start, r.end, r.score) for r in results))
+
+        return [
+            self._build_result(text, spans[i]) if text else self._empty_result()
+            for i, text in enumerate(texts)
+        ]
+
+    def _empty_result(self) -> Dict[str, any]:
+        return {
+            "sanitized_text": "",
+            "detected_entities": [],
+            "has_pii": False
+        }
+
+    def _build_result(self, text: str, results: List[RecognizerResult]) -> Dict[str, any]:
+        """Anonimiza o texto a partir dos resultados do analyzer e monta a resposta."""
+        # Anonimiza PII encontrado
+        anonymized_result = self.anonymizer.anonymize(
+            text=text,
+            analyzer_results=results
+        )
+
+        detected_entities = [
+            {
+                "entity_type": r.entity_type,
+                "start": r.start,
+                "end": r.end,
+                "score": r.score
+            }
+            for r in results
+        ]
+
+        return {
+            "sanitized_text": anonymized_result.text,
+            "detected_entities": detected_entities,
+            "has_pii": len(detected_entities) > 0
+        }
+
+    def _analyze(self, text: str) -> List[RecognizerResult]:
+        """Executa o analyzer do Presidio, reaproveitando resultados em cache."""
+        key = make_key(self._config_version, text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return [RecognizerResult(*span) for span in cached]
+
+        # Detecta PII no idioma resolvido pelo registro (pt, se disponível; senão en)
+        results = self.engines.analyze(text)
+
+        self.cache.set(key, tuple((r.entity_type, r.start, r.end, r.score) for r in results))
+        return results
+
+    def invalidate_cache(self) -> None:
+        """Descarta resultados memoizados (ex.: após alterar os recognizers)."""
+        self._config_version += 1
+        self.cache.clear()
@@ -0,0 +1,206 @@
+"""Registro compartilhado (por processo) dos engines do Presidio.
+
+InputSanitizer e OutputSanitizer usam o mesmo AnalyzerEngine/AnonymizerEngine,
+então o pipeline NLP do spaCy é carregado uma única vez por processo, e só no
+primeiro uso. O idioma de análise é resolvido uma vez, na criação do analyzer,
+em vez de tentar "pt" e cair para "en" a cada chamada. Os recognizers de
+padrão (regex/checksum: CPF, telefone, IP, URL, cripto...) rodam em todo texto;
+a pré-triagem (ver sanitization.prescreen) só decide se o NER do spaCy roda.
+"""
+import threading
+from typing import List, Optional, Sequence
+
+from presidio_analyzer import AnalyzerEngine, BatchAnalyzerEngine, RecognizerResult
+from presidio_analyzer.nlp_engine import NlpArtifacts
+from presidio_anonymizer import AnonymizerEngine
+
+from config import (
+    PII_BATCH_MAX_CHARS,
+    PII_BATCH_SIZE,
+    PII_FORCE_NER,
+    PII_LANGUAGES,
+    PII_POOL_MAX_PENDING,
+    PII_POOL_MAX_STUCK,
+    PII_POOL_TIMEOUT,
+    PII_POOL_WORKERS,
+    PII_PRESCREEN,
+)
+from sanitization.prescreen import PIIPrescreen
+
+
+class PresidioEngines:
+    """Cria os engines do Presidio sob demanda e os compartilha entre os sanitizadores."""
+
+    def __init__(self, languages: Sequence[str] = PII_LANGUAGES, prescreen: Optional[PIIPrescreen] = None):
+        self.preferred_languages = [lang for lang in languages if lang] or ["en"]
+        self.prescreen = prescreen or PIIPrescreen(enabled=PII_PRESCREEN, force_ner=PII_FORCE_NER)
+        self._lock = threading.Lock()
+        self._analyzer: Optional[AnalyzerEngine] = None
+        self._anonymizer: Optional[AnonymizerEngine] = None
+        self._language: Optional[str] = None
+        # Modo "process": a análise roda em workers pré-aquecidos (ver process_pool)
+        self.pool = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._analyzer is not None
+
+    @property
+    def analyzer(self) -> AnalyzerEngine:
+        if self._analyzer is None:
+            with self._lock:
+                if self._analyzer is None:
+                    analyzer = AnalyzerEngine()
+                    self._language = self._resolve_language(analyzer)
+                    self._analyzer = analyzer
+        return self._analyzer
+
+    @property
+    def anonymizer(self) -> AnonymizerEngine:
+        if self._anonymizer is None:
+            with self._lock:
+                if self._anonymizer is None:
+                    self._anonymizer = AnonymizerEngine()
+        return self._anonymizer
+
+    @property
+    def language(self) -> str:
+        self.analyzer
+        return self._language
+
+    def _resolve_language(self, analyzer: AnalyzerEngine) -> str:
+        """Primeiro idioma preferido que o analyzer realmente atende."""
+        for lang in self.preferred_languages:
+            if lang not in analyzer.supported_languages:
+                continue
+            try:
+                if analyzer.get_recognizers(language=lang):
+                    return lang
+            except ValueError:
+                continue
+        return "en"
+
+    def warmup(self) -> None:
+        """Força a criação dos engines (ex.: no startup, antes do primeiro request)."""
+        self.analyzer
+        self.anonymizer
+
+    def start_pool(
+        self,
+        workers: int = PII_POOL_WORKERS,
+        max_pending: int = PII_POOL_MAX_PENDING,
+        timeout: float = PII_POOL_TIMEOUT,
+        max_stuck: int = PII_POOL_MAX_STUCK,
+    ) -> None:
+        """Passa a analisar em um pool de processos (o analyzer local não é carregado)."""
+        from sanitization.process_pool import PIIProcessPool
+
+        if self.pool is None:
+            pool = PIIProcessPool(workers, max_pending, timeout, self.preferred_languages, max_stuck)
+            pool.start()
+            self.pool = pool
+
+    def stop_pool(self) -> None:
+        pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def _analyze_patterns(self, text: str) -> List[RecognizerResult]:
+        """Só os recognizers de padrão: artefatos NLP vazios dispensam o spaCy."""
+        analyzer = self.analyzer
+        artifacts = NlpArtifacts(
+            entities=[], tokens=[], tokens_indices=[], lemmas=[],
+            nlp_engine=analyzer.nlp_engine, language=self.language,
+        )
+        return analyzer.analyze(text=text, language=self.language, nlp_artifacts=artifacts)
+
+    def analyze(self, text: str, ner: Optional[bool] = None) -> List[RecognizerResult]:
+        # Sem sinal de nome/PII, o NER é dispensado; os recognizers de padrão rodam sempre
+        if ner is None:
+            ner = self.prescreen.needs_analysis(text)
+        pool = self.pool
+        if pool is not None:
+            return pool.analyze(text, ner)
+        if not ner:
+            return self._analyze_patterns(text)
+        return self.analyzer.analyze(text=text, language=self.language)
+
+    def analyze_many(
+        self,
+        texts: Sequence[str],
+        batch_size: int = PII_BATCH_SIZE,
+        max_chars: int = PII_BATCH_MAX_CHARS,
+        ner: Optional[bool] = None,
+    ) -> List[List[RecognizerResult]]:
+        """Analisa vários textos passando lotes inteiros pelo pipeline NLP (nlp.pipe).
+
+        A ordem e os offsets de cada item são preservados. Os textos são agrupados
+        em blocos de no máximo ``max_chars`` caracteres para limitar a memória.
+        Itens dispensados do NER pela pré-triagem passam só pelos recognizers de padrão.
+        """
+        results: List[List[RecognizerResult]] = [[] for _ in texts]
+        present = [i for i, text in enumerate(texts) if text]
+        if ner is None:
+            with_ner = [i for i in present if self.prescreen.needs_analysis(texts[i])]
+        else:
+            with_ner = present if ner else []
+        selected = set(with_ner)
+        without_ner = [i for i in present if i not in selected]
+
+        for group, use_ner in ((with_ner, True), (without_ner, False)):
+            for chunk in _chunk_by_chars(group, texts, max_chars):
+                chunk_texts = [texts[i] for i in chunk]
+                pool = self.pool
+                if pool is not None:
+                    batch = pool.analyze_many(chunk_texts, batch_size, use_ner)
+                elif use_ner:
+                    batch = BatchAnalyzerEngine(analyzer_engine=self.analyzer).analyze_iterator(
+                        chunk_texts, language=self.language, batch_size=batch_size
+                    )
+                else:
+                    batch = [self._analyze_patterns(text) for text in chunk_texts]
+                for i, item_results in zip(chunk, batch):
+                    results[i] = list(item_results)
+
+        return results
+
+    def info(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "language": self._language,
+            "preferred_languages": self.preferred_languages,
+            "prescreen": self.prescreen.stats(),
+            "execution_mode": "process" if self.pool is not None else "inline",
+            "pool": self.pool.stats() if self.pool is not None else None,
+        }
+
+
+def _chunk_by_chars(indices: List[int], texts: Sequence[str], max_chars: int) -> List[List[int]]:
+    """Agrupa índices em blocos cuja soma de caracteres não passa de max_chars."""
+    chunks: List[List[int]] = []
+    current: List[int] = []
+    size = 0
+    for i in indices:
+        length = len(texts[i])
+        if current and size + length > max_chars:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(i)
+        size += length
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+_engines: Optional[PresidioEngines] = None
+_engines_lock = threading.Lock()
+
+
+def get_engines() -> PresidioEngines:
+    """Registro único do processo."""
+    global _engines
+    if _engines is None:
+        with _engines_lock:
+            if _engines is None:
+                _engines = PresidioEngines()
+    return _engines
@@ -0,0 +1,92 @@
+"""Pré-triagem barata de PII antes do NLP do Presidio.
+
+Uma passada de regex compiladas procura sinais de PII (CPF, telefone, e-mail,
+cartão, IP, URL, datas e palavras iniciadas em maiúscula). Se nenhum sinal
+aparece, só o NER do spaCy é dispensado: os recognizers de padrão do Presidio
+rodam sempre (ver PresidioEngines.analyze). Palavras comuns no início de frase
+("Qual", "Como", "What"...) não contam como candidatas a nome.
+
+Nomes escritos só em minúsculas não deixam sinal e dependem do NER; para
+analisá-los em todo texto, use PII_FORCE_NER=true.
+"""
+import re
+import threading
+from typing import Dict
+
+_SIGNALS = re.compile(
+    "|".join([
+        r"\d{3}\.?\d{3}\.?\d{3}-?\d{2}",                      # CPF
+        r"\(?\d{2,3}\)?[\s.-]?\d{3,5}[\s.-]?\d{4}",           # telefone
+        r"\d{3}-\d{2}-\d{4}",                                 # SSN
+        r"\d{5,}",                                            # documentos/contas numéricos
+        r"[\w.+-]+@[\w-]+\.[\w.-]+",                          # e-mail
+        r"(?:\d[ -]?){13,19}",                                # cartão
+        r"\d{1,3}(?:\.\d{1,3}){3}",                           # IPv4
+        r"https?://|www\.",                                   # URL
+        r"\d{1,4}[/-]\d{1,2}[/-]\d{1,4}",                     # data
+    ])
+)
+
+# Token iniciado por letra maiúscula (inclui acentuadas)
+_CAPITALISED = re.compile(r"(?<![\w])[A-ZÀ-ÖØ-Þ][\w'-]*")
+_SENTENCE_END = ".!?:;"
+
+COMMON_SENTENCE_STARTERS = frozenset("""
+    a o as os um uma e é eu me meu minha você vocês nós isso isto esse essa este esta
+    qual quais como quando onde quem que por porque para pode poderia posso preciso
+    existe explique escreva crie liste descreva defina mostre diga faça gere resuma traduza
+    olá oi bom boa obrigado obrigada sim não
+    the a an i my we you it this that these those is are was were be
+    what which who whom whose how why when where can could would should will do does did
+    please explain write create list describe define show tell give make generate summarize
+    translate hi hello hey thanks thank yes no
+""".split())
+
+
+class PIIPrescreen:
+    """Decide se um texto precisa do NER (os recognizers de padrão rodam de qualquer forma)."""
+
+    def __init__(self, enabled: bool = True, force_ner: bool = False):
+        self.enabled = enabled
+        self.force_ner = force_ner
+        self._lock = threading.Lock()
+        self.screened = 0
+        self.skipped = 0
+
+    def needs_analysis(self, text: str) -> bool:
+        if not self.enabled or self.force_ner:
+            return True
+
+        candidate = self._has_candidates(text)
+        with self._lock:
+            self.screened += 1
+            if not candidate:
+                self.skipped += 1
+        return candidate
+
+    @staticmethod
+    def _has_candidates(text: str) -> bool:
+        if _SIGNALS.search(text):
+            return True
+
+        for m in _CAPITALISED.finditer(text):
+            if m.group(0) == "I":
+                continue
+            if m.group(0).lower() not in COMMON_SENTENCE_STARTERS:
+                return True
+            # Palavra comum: só é ignorada no início de frase
+            j = m.start() - 1
+            while j >= 0 and text[j].isspace():
+                j -= 1
+            if j >= 0 and text[j] not in _SENTENCE_END:
+                return True
+        return False
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "enabled": self.enabled,
+            "force_ner": self.force_ner,
+            "screened": self.screened,
+            "skipped": self.skipped,
+            "skip_ratio": round(self.skipped / self.screened, 4) if self.screened else None,
+        }
@@ -0,0 +1,213 @@
+"""Execução da análise de PII em um pool de processos pré-aquecidos.
+
+A análise do Presidio é CPU-bound e segura o GIL; com várias requisições
+simultâneas no threadpool do uvicorn, as chamadas acabam serializadas. Neste
+modo, cada worker do pool carrega o seu próprio AnalyzerEngine (NLP já
+carregado no initializer) e só trafegam entre processos o texto e os spans
+compactos (entity_type, start, end, score).
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from presidio_analyzer import RecognizerResult
+
+Span = Tuple[str, int, int, float]
+
+_worker_engines = None
+
+
+def _init_worker(languages: Sequence[str]) -> None:
+    """Initializer do worker: cria e aquece os engines uma única vez."""
+    global _worker_engines
+    from sanitization.engines import PresidioEngines
+    from sanitization.prescreen import PIIPrescreen
+
+    # A pré-triagem já acontece no processo principal (chega como o argumento ``ner``)
+    _worker_engines = PresidioEngines(languages, prescreen=PIIPrescreen(enabled=False))
+    _worker_engines.warmup()
+
+
+def _ping() -> bool:
+    return _worker_engines is not None
+
+
+def _analyze_spans(text: str, ner: bool = True) -> List[Span]:
+    results = _worker_engines.analyze(text, ner=ner)
+    return [(r.entity_type, r.start, r.end, r.score) for r in results]
+
+
+def _analyze_spans_many(texts: Sequence[str], batch_size: int, ner: bool = True) -> List[List[Span]]:
+    batches = _worker_engines.analyze_many(texts, batch_size=batch_size, max_chars=sum(map(len, texts)), ner=ner)
+    return [[(r.entity_type, r.start, r.end, r.score) for r in results] for results in batches]
+
+
+class PoolSaturatedError(RuntimeError):
+    """Fila do pool cheia: a requisição é recusada em vez de esperar indefinidamente."""
+
+
+class PIIProcessPool:
+    """Pool de processos com fila limitada, timeout por chamada e métricas de saúde.
+
+    Uma análise que estoura o timeout continua ocupando o worker. Quando
+    ``max_stuck`` delas estão presas no executor atual, ele é trocado por um
+    novo e os processos antigos são encerrados (o que também devolve as vagas).
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_pending: int = 64,
+        timeout: float = 5.0,
+        languages: Sequence[str] = ("pt", "en"),
+        max_stuck: int = 0,
+    ):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.timeout = timeout
+        self.languages = list(languages)
+        self.max_stuck = max_stuck if max_stuck > 0 else self.workers
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        # Chamadas que estouraram o timeout e ainda rodam -> executor em que rodam
+        self._stuck: Dict[Future, ProcessPoolExecutor] = {}
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.restarts = 0
+        self.in_flight = 0
+        self._total_latency = 0.0
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # "spawn": fork com threads ativas (uvicorn) pode travar o filho
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.languages,),
+        )
+
+    def start(self, warm: bool = True) -> None:
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._new_executor()
+        if warm:
+            # Dispara um ping por worker para que todos carreguem o NLP já no startup
+            futures = [self._executor.submit(_ping) for _ in range(self.workers)]
+            for f in futures:
+                f.result()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _restart(self, broken: ProcessPoolExecutor, terminate: bool = False) -> None:
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = self._new_executor()
+            self.restarts += 1
+        if terminate:
+            # Workers presos numa análise não saem com shutdown(); as chamadas
+            # pendentes neles falham com BrokenProcessPool e liberam as vagas
+            for process in list((getattr(broken, "_processes", None) or {}).values()):
+                process.terminate()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _call(self, fn, *args, timeout: Optional[float] = None):
+        timeout = timeout or self.timeout
+        if self._executor is None:
+            self.start(warm=False)
+
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PoolSaturatedError(f"Pool de análise de PII saturado ({self.max_pending} chamadas pendentes)")
+
+        executor = self._executor
+        start = time.perf_counter()
+        with self._lock:
+            self.submitted += 1
+            self.in_flight += 1
+        release_when_done = False
+        try:
+            future = executor.submit(fn, *args)
+            result = future.result(timeout=timeout)
+            with self._lock:
+                self.completed += 1
+                self._total_latency += time.perf_counter() - start
+            return result
+        except FutureTimeoutError:
+            recycle = False
+            with self._lock:
+                self.timeouts += 1
+            if not future.cancel():
+                # O worker segue ocupado com a análise: a vaga só volta quando ela terminar,
+                # senão novas chamadas entram na fila atrás dele e também estouram o tempo
+                release_when_done = True
+                with self._lock:
+                    self._stuck[future] = executor
+                    recycle = sum(1 for e in self._stuck.values() if e is executor) >= self.max_stuck
+                future.add_done_callback(self._unstick)
+            if recycle:
+                self._restart(executor, terminate=True)
+            raise TimeoutError(f"Análise de PII excedeu {timeout:g}s")
+        except BrokenProcessPool:
+            with self._lock:
+                self.failed += 1
+            self._restart(executor)
+            raise
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            if not release_when_done:
+                self._release_slot()
+
+    def _release_slot(self, _future=None) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _unstick(self, future: Future) -> None:
+        with self._lock:
+            self._stuck.pop(future, None)
+        self._release_slot()
+
+    def analyze(self, text: str, ner: bool = True) -> List[RecognizerResult]:
+        return [RecognizerResult(*span) for span in self._call(_analyze_spans, text, ner)]
+
+    def analyze_many(self, texts: Sequence[str], batch_size: int, ner: bool = True) -> List[List[RecognizerResult]]:
+        # Um lote inteiro é uma única chamada: o timeout cresce com o número de lotes do spaCy
+        n_batches = max(1, -(-len(texts) // max(1, batch_size)))
+        batches = self._call(_analyze_spans_many, list(texts), batch_size, ner, timeout=self.timeout * n_batches)
+        return [[RecognizerResult(*span) for span in spans] for spans in batches]
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "running": self._executor is not None,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "timeout": self.timeout,
+            "in_flight": self.in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+            "stuck": len(self._stuck),
+            "avg_latency_ms": round(self._total_latency / self.completed * 1000, 3) if self.completed else None,
+        }
@@ -0,0 +1,95 @@
+"""Sanitização incremental de saída para respostas em streaming.
+
+Os tokens do LLM chegam aos poucos; o texto só é liberado ao cliente depois de
+analisado. Para não vazar uma entidade (ou termo proibido) dividida entre dois
+chunks, fica retida uma cauda curta do buffer (``holdback``) e o corte é feito
+sempre em um espaço em branco e nunca no meio de uma entidade detectada.
+"""
+from typing import Dict, List
+
+from config import STREAM_HOLDBACK_CHARS, STREAM_MIN_FLUSH_CHARS
+from sanitization.output_sanitizer import OutputSanitizer
+
+
+class StreamingOutputSanitizer:
+    """Acumula chunks e devolve trechos já sanitizados, seguros para emitir."""
+
+    def __init__(
+        self,
+        sanitizer: OutputSanitizer,
+        holdback: int = STREAM_HOLDBACK_CHARS,
+        min_flush: int = STREAM_MIN_FLUSH_CHARS,
+    ):
+        self.sanitizer = sanitizer
+        self.holdback = holdback
+        self.min_flush = min_flush
+
+        self._buffer = ""
+        self._offset = 0  # caracteres do texto original já liberados
+        self.detected_entities: List[Dict[str, object]] = []
+        self.has_forbidden_content = False
+
+    def feed(self, chunk: str) -> str:
+        """Adiciona um chunk; devolve o trecho sanitizado que já pode ser emitido ("" se nenhum)."""
+        self.push(chunk)
+        return self.flush() if self.ready() else ""
+
+    def push(self, chunk: str) -> None:
+        """Só acumula o chunk (barato; a análise fica para flush)."""
+        self._buffer += chunk or ""
+
+    def ready(self) -> bool:
+        """Se já há texto suficiente além da cauda retida para valer uma análise."""
+        return len(self._buffer) >= self.holdback + self.min_flush
+
+    def flush(self) -> str:
+        """Sanitiza e libera o que for seguro, mantendo a cauda no buffer."""
+        return self._flush(final=False)
+
+    def finish(self) -> str:
+        """Sanitiza e devolve o que restou no buffer ao fim do stream."""
+        return self._flush(final=True)
+
+    def _flush(self, final: bool) -> str:
+        text = self._buffer
+        if not text:
+            return ""
+
+        # Analisa o buffer inteiro: a cauda dá contexto às entidades perto do corte
+        results = self.sanitizer.engines.analyze(text)
+
+        if final:
+            cut = len(text)
+        else:
+            limit = len(text) - self.holdback
+            cut = max(text.rfind(" ", 0, limit + 1), text.rfind("\n", 0, limit + 1))
+            if cut <= 0:
+                if len(text) < 4 * (self.holdback + self.min_flush):
+                    return ""
+                cut = limit  # token gigante sem espaços: corta no limite
+            # Nunca divide uma entidade detectada
+            for r in sorted(results, key=lambda r: r.start):
+                if r.start < cut < r.end:
+                    cut = r.start
+            if cut <= 0:
+                return ""
+
+        prefix = text[:cut]
+        result = self.sanitizer._build_result(prefix, [r for r in results if r.end <= cut])
+
+        for entity in result["detected_entities"]:
+            self.detected_entities.append(
+                dict(entity, start=entity["start"] + self._offset, end=entity["end"] + self._offset)
+            )
+        self.has_forbidden_content = self.has_forbidden_content or result["has_forbidden_content"]
+
+        self._buffer = text[cut:]
+        self._offset += cut
+        return result["sanitized_text"]
+
+    def summary(self) -> Dict[str, object]:
+        return {
+            "detected_entities": self.detected_entities,
+            "has_pii": len(self.detected_entities) > 0,
+            "has_forbidden_content": self.has_forbidden_content,
+        }
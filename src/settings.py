@@ -1,4 +1,5 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import List
 
 
 @dataclass
@@ -6,9 +7,15 @@ class RuntimeLLMSettings:
     provider: str = "mock"  # mock | ollama | gemini
     ollama_url: str = "http://localhost:11434"
     ollama_model: str = "llama3.1"
+    # Vários backends Ollama (vazio = só ollama_url) e cópia da requisição pelo p95
+    ollama_urls: List[str] = field(default_factory=list)
+    hedge: bool = False
 
     def normalize(self) -> "RuntimeLLMSettings":
         self.provider = (self.provider or "mock").strip().lower()
         self.ollama_url = (self.ollama_url or "http://localhost:11434").strip()
         self.ollama_model = (self.ollama_model or "llama3.1").strip()
+        urls = [u.strip().rstrip("/") for u in (self.ollama_urls or []) if u and u.strip()]
+        self.ollama_urls = list(dict.fromkeys(urls)) or [self.ollama_url.rstrip("/")]
+        self.ollama_url = self.ollama_urls[0]
         return self
@@ -7,7 +7,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from fastapi.testclient import TestClient
-from main import app
+from main import app, response_cache
 
 
 @pytest.fixture
@@ -47,3 +47,84 @@ class TestAPI:
         response = client.post("/chat", json=payload)
         assert response.status_code == 422  # Validation error
 
+
+    def test_chat_endpoint_mock_provider_async_pipeline(self, client):
+        """Testa o fluxo completo (assíncrono) do /chat com o provedor mock."""
+        payload = {"message": "Qual a capital do Brasil?", "user_id": "test_user", "user_role": "user"}
+        response = client.post("/chat", json=payload)
+        assert response.status_code == 200
+        body = response.json()
+        assert body["response"].startswith("OK (mock)")
+        assert [c["control"] for c in body["controls_applied"]] == [
+            "firewall", "input_sanitizer", "rbac", "llm_provider", "output_sanitizer"
+        ]
+        assert set(body["stage_timings"]) >= {"firewall", "rbac", "input_sanitizer", "llm", "output_sanitizer"}
+
+    def test_chat_endpoint_compact_mode_with_audit(self, client):
+        """Modo compacto devolve só o veredito; o corpo completo fica na trilha de auditoria."""
+        payload = {"message": "Qual a capital do Brasil?", "user_id": "test_user", "verbosity": "compact"}
+        response = client.post("/chat", json=payload)
+        assert response.status_code == 200
+        body = response.json()
+        assert set(body) == {"verdict", "response", "request_id", "risk_score"}
+        assert body["verdict"] == "allowed"
+
+        audit = client.get(f"/api/audit/{body['request_id']}")
+        assert audit.status_code == 200
+        assert audit.json()["controls_applied"]
+        assert client.get("/api/audit/inexistente").status_code == 404
+
+    def test_chat_batch_endpoint_results_in_order(self, client):
+        """Testa o /chat/batch: um resultado por item, na ordem, com o bloqueio no próprio item."""
+        payload = {"items": [
+            {"message": "Qual a capital do Brasil?", "user_id": "batch_user"},
+            {"message": "", "user_id": "batch_user"},
+            {"message": "E a da Argentina?", "user_id": "batch_user", "verbosity": "compact"},
+        ]}
+        response = client.post("/chat/batch", json=payload)
+        assert response.status_code == 200
+        body = response.json()
+        assert [r["index"] for r in body["results"]] == [0, 1, 2]
+        assert [r["verdict"] for r in body["results"]] == ["allowed", "blocked", "allowed"]
+        assert "controls_applied" not in body["results"][2]
+        assert body["summary"] == {"total": 3, "allowed": 2, "blocked": 1, "denied": 0, "error": 0}
+
+    def test_response_cache_hit_and_flush_on_provider_change(self, client):
+        """Testa se o prompt repetido vem do cache de respostas e se /api/provider o esvazia."""
+        response_cache.enabled = True
+        try:
+            payload = {"message": "Qual   o horário de atendimento?", "user_id": "faq_user"}
+            first = client.post("/chat", json=payload).json()
+            second = client.post("/chat", json={**payload, "message": "Qual o horário de atendimento?"}).json()
+            assert second["response"] == first["response"]
+            llm_control = next(c for c in second["controls_applied"] if c["control"] == "llm_provider")
+            assert llm_control["result"]["cached"] is True
+
+            client.post("/api/provider", json={"provider": "mock"})
+            assert client.get("/api/cache").json()["response"]["size"] == 0
+        finally:
+            response_cache.enabled = False
+            response_cache.clear()
+
+    def test_chat_stream_queue_full_and_sanitizer_error(self, client, monkeypatch):
+        """Fila cheia vira 503 antes do stream; falha na sanitização não é atribuída ao provedor."""
+        import asyncio
+        import main
+        from llm_service.priority_gate import PriorityGate
+
+        payload = {"message": "Qual a capital do Brasil?", "user_id": "test_user", "user_role": "user"}
+        gate = PriorityGate(1, {"low": (1, 0)})
+        asyncio.run(gate.acquire("low"))  # única vaga ocupada e fila sem espaço
+        monkeypatch.setattr(main.llm_stage, "gate", gate)
+        response = client.post("/chat/stream", json=payload)
+        assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+
+        gate.release()
+        def broken_finish(self):
+            raise RuntimeError("analyzer indisponível")
+        monkeypatch.setattr(main.StreamingOutputSanitizer, "finish", broken_finish)
+        response = client.post("/chat/stream", json=payload)
+        assert response.status_code == 200
+        assert "Erro na sanitização da saída" in response.text
+        assert "Erro no provedor de LLM" not in response.text
+        assert gate.active == 0
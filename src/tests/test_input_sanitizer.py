@@ -18,3 +18,83 @@ class TestInputSanitizer:
         assert "sanitized_text" in result
         assert "has_pii" in result
 
+    def test_prescreen_skips_ner_without_pii_signals(self):
+        """Testa a pré-triagem: textos sem sinais de PII dispensam o NER."""
+        from sanitization.prescreen import PIIPrescreen
+        prescreen = PIIPrescreen()
+        assert prescreen.needs_analysis("How do I sort a list in python?") is False
+        assert prescreen.needs_analysis("Meu CPF é 123.456.789-09") is True
+        assert prescreen.needs_analysis("Fale com a Maria amanhã") is True
+        assert PIIPrescreen(force_ner=True).needs_analysis("sem sinais aqui") is True
+
+    @pytest.mark.parametrize("text, entity_type", [
+        ("Servidor em fe80::1ff:fe23:4567:890a", "IP_ADDRESS"),
+        ("Acesse example.com para ver", "URL"),
+        ("Carteira bc1qar0srrr7xfkvy5l643lydnw9re59gtzzwf5mdq", "CRYPTO"),
+        ("meu cpf é 123 456 789 09", "PHONE_NUMBER"),
+        ("ligue para (11) 9 8765-4321", "PHONE_NUMBER"),
+        ("call 212-555-1234 now", "PHONE_NUMBER"),
+    ])
+    def test_pattern_recognizers_run_when_prescreen_skips_ner(self, text, entity_type):
+        """Testa se a pré-triagem só dispensa o NER: os recognizers de padrão rodam sempre."""
+        engines = self.sanitizer.engines
+        assert [r.entity_type for r in engines.analyze(text, ner=False)].count(entity_type) >= 1
+        assert [r.entity_type for r in engines.analyze_many([text], ner=False)[0]].count(entity_type) >= 1
+        assert self.sanitizer.sanitize(text)["has_pii"] is True
+
+    def test_sanitize_many_matches_single_item_results(self):
+        """Testa se o lote preserva a ordem e os offsets de cada item."""
+        texts = ["Meu e-mail é joao@example.com", "", "Qual é a capital do Brasil?", "Meu e-mail é joao@example.com"]
+        batch = self.sanitizer.sanitize_many(texts, batch_size=2)
+        assert len(batch) == len(texts)
+        assert batch[1]["sanitized_text"] == ""
+        for text, result in zip(texts, batch):
+            assert result == self.sanitizer.sanitize(text)
+
+    def test_pool_keeps_slot_while_timed_out_worker_is_busy(self):
+        """Testa se, após um timeout, a vaga só é devolvida quando o worker termina a análise."""
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        from sanitization.process_pool import PIIProcessPool, PoolSaturatedError
+
+        pool = PIIProcessPool(workers=1, max_pending=1, timeout=0.05, max_stuck=2)
+        pool._executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            with pytest.raises(TimeoutError):
+                pool._call(time.sleep, 0.3)
+            # Worker ainda ocupado: a chamada seguinte é recusada na hora, sem esperar o timeout
+            start = time.perf_counter()
+            with pytest.raises(PoolSaturatedError):
+                pool._call(len, "x", timeout=1.0)
+            assert time.perf_counter() - start < 0.1
+            assert pool.stats()["in_flight"] == 1
+
+            time.sleep(0.4)
+            assert pool.stats()["in_flight"] == 0 and pool.stats()["stuck"] == 0
+            assert pool._call(len, "abc", timeout=1.0) == 3
+        finally:
+            pool.shutdown()
+
+    def test_pool_recycles_workers_stuck_past_timeout(self):
+        """Testa se o pool troca o executor e encerra o worker preso após max_stuck timeouts."""
+        import multiprocessing
+        import time
+        from concurrent.futures import ProcessPoolExecutor
+        from sanitization.process_pool import PIIProcessPool
+
+        pool = PIIProcessPool(workers=1, max_pending=2, timeout=0.2, max_stuck=1)
+        pool._new_executor = lambda: ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            assert pool._call(len, "x", timeout=30) == 1
+            with pytest.raises(TimeoutError):
+                pool._call(time.sleep, 60)
+            assert pool.stats()["restarts"] == 1
+
+            # O worker antigo foi encerrado: a vaga volta e o executor novo atende
+            assert pool._call(len, "abc", timeout=30) == 3
+            deadline = time.monotonic() + 10
+            while pool.stats()["in_flight"] and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert pool.stats()["in_flight"] == 0 and pool.stats()["stuck"] == 0
+        finally:
+            pool.shutdown()
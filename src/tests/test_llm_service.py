@@ -0,0 +1,348 @@
+"""Testes unitários para a camada de provedores de LLM."""
+import asyncio
+
+import httpx
+import pytest
+
+from llm_service.circuit_breaker import BreakerClient, CircuitBreaker
+from llm_service.mock_client import MockClient
+from llm_service.ollama_client import OllamaClient
+from llm_service.ollama_pool import OllamaPoolClient
+from llm_service.priority_gate import PriorityGate, QueueFullError
+from llm_service.singleflight import CoalescingClient, SingleFlight
+
+
+class SlowClient:
+    model = "lento"
+
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+
+    async def agenerate_response(self, prompt, context=None):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("timeout no provedor")
+        return {"response": f"eco: {prompt}", "success": True, "provider": "lento"}
+
+
+class TestSingleFlight:
+    """Testes para a coalescência de gerações idênticas."""
+
+    def setup_method(self):
+        self.group = SingleFlight()
+
+    def test_identical_concurrent_calls_share_one_generation(self):
+        """Testa se chamadas idênticas simultâneas viram uma geração e prompts distintos não."""
+        upstream = SlowClient()
+        client = CoalescingClient(upstream, self.group, "lento")
+
+        async def burst():
+            calls = [client.agenerate_response("pergunta popular") for _ in range(10)]
+            return await asyncio.gather(*calls, client.agenerate_response("outra pergunta"))
+
+        results = asyncio.run(burst())
+
+        assert upstream.calls == 2
+        assert all(r["response"] == "eco: pergunta popular" for r in results[:10])
+        stats = self.group.stats()
+        assert stats["coalesced_calls"] == 9 and stats["in_flight"] == 0
+
+    def test_errors_reach_every_waiter(self):
+        """Testa se a exceção do provedor chega a todos os que aguardavam a geração."""
+        client = CoalescingClient(SlowClient(fail=True), self.group, "lento")
+
+        async def burst():
+            return await asyncio.gather(
+                *(client.agenerate_response("p") for _ in range(3)), return_exceptions=True
+            )
+
+        results = asyncio.run(burst())
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        with pytest.raises(RuntimeError):
+            asyncio.run(client.agenerate_response("p"))
+
+
+class TestOllamaConnectionPool:
+    """Testes para o pool de conexões persistentes do OllamaClient."""
+
+    def setup_method(self):
+        self.requests = 0
+
+        def handler(request):
+            self.requests += 1
+            return httpx.Response(200, json={"response": "OK", "done": True})
+
+        self.client = OllamaClient("http://ollama:11434", "llama3.1", transport=httpx.MockTransport(handler))
+
+    def test_calls_reuse_pool_and_close_waits_for_in_flight(self):
+        """Testa se as chamadas reutilizam o mesmo pool e se close espera a requisição em andamento."""
+        assert self.client.generate_response("a")["success"]
+        pool = self.client._client
+        assert self.client.generate_response("b")["success"]
+        assert self.client._client is pool and self.requests == 2
+
+        with self.client._session() as in_flight:
+            self.client.close()
+            assert not in_flight.is_closed
+        assert in_flight.is_closed and self.client._client is None
+
+    def test_async_pool_closed_on_aclose(self):
+        """Testa se o pool assíncrono é reutilizado e fechado no aclose."""
+        async def run():
+            await self.client.agenerate_response("a")
+            pool = self.client._aclients[asyncio.get_running_loop()].client
+            await self.client.agenerate_response("b")
+            assert self.client._aclients[asyncio.get_running_loop()].client is pool
+            await self.client.aclose()
+            return pool
+
+        assert asyncio.run(run()).is_closed
+        assert self.client._aclients == {}
+
+    def test_async_pool_per_event_loop(self):
+        """Testa se outro event loop ganha pool próprio e se close fecha cada um no seu loop."""
+        import threading
+        import time
+
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(self.client.agenerate_response("a"), loop).result(5)
+            pool = self.client._aclients[loop].client
+
+            assert asyncio.run(self.client.agenerate_response("b"))["success"]
+            assert self.client._aclients[loop].client is pool and not pool.is_closed
+
+            self.client.close()
+            deadline = time.monotonic() + 5
+            while not pool.is_closed and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert pool.is_closed and self.client._aclients == {}
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+
+class FakeBackend:
+    def __init__(self, delay=0.0, success=True):
+        self.delay, self.success = delay, success
+        self.calls = 0
+        self.cancelled = 0
+
+    async def agenerate_response(self, prompt, context=None):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return {"response": "OK", "success": self.success, "provider": "ollama"}
+
+    async def astream_response(self, prompt, context=None):
+        self.calls += 1
+        yield "OK"
+        await asyncio.sleep(self.delay)
+        yield "fim"
+
+
+class TestOllamaPool:
+    """Testes para balanceamento, ejeção e hedge entre backends Ollama."""
+
+    def setup_method(self):
+        self.pool = OllamaPoolClient(["http://gpu-a:11434", "http://gpu-b:11434"], "llama3.1")
+
+    def test_failing_backend_is_ejected(self):
+        """Testa se o backend com falhas consecutivas sai da rotação."""
+        bad, good = FakeBackend(success=False), FakeBackend()
+        self.pool.backends[0].client, self.pool.backends[1].client = bad, good
+
+        async def run():
+            for _ in range(10):
+                await self.pool.agenerate_response("p")
+
+        asyncio.run(run())
+
+        assert bad.calls == 3 and good.calls == 7
+        assert [b["ejected"] for b in self.pool.info()["backends"]] == [True, False]
+
+    def test_cold_start_burst_spreads_across_backends(self):
+        """Testa se uma rajada antes de qualquer amostra de latência não vai toda ao primeiro backend."""
+        a, b = FakeBackend(delay=0.01), FakeBackend(delay=0.01)
+        self.pool.backends[0].client, self.pool.backends[1].client = a, b
+
+        async def burst():
+            await asyncio.gather(*(self.pool.agenerate_response("p") for _ in range(4)))
+
+        asyncio.run(burst())
+        assert a.calls == 2 and b.calls == 2
+
+    def test_stream_disconnect_does_not_eject_backend(self):
+        """Testa se o cliente que abandona o stream não conta como falha do backend."""
+        slow = FakeBackend(delay=1.0)
+        self.pool.backends[0].client = self.pool.backends[1].client = slow
+
+        async def abandon():
+            stream = self.pool.astream_response("p")
+            assert await stream.__anext__() == "OK"
+            await stream.aclose()
+
+        for _ in range(5):
+            asyncio.run(abandon())
+
+        info = self.pool.info()["backends"]
+        assert all(not b["ejected"] and b["failures"] == 0 and b["outstanding"] == 0 for b in info)
+
+    def test_hedge_after_p95_cancels_the_loser(self):
+        """Testa se a cópia vai ao outro backend após o p95 e se a requisição lenta é cancelada."""
+        slow, fast = FakeBackend(delay=1.0), FakeBackend()
+        self.pool.backends[0].client, self.pool.backends[1].client = slow, fast
+        self.pool.hedge = True
+        self.pool._latencies.extend([0.01] * 50)
+
+        result = asyncio.run(self.pool.agenerate_response("p"))
+
+        assert result["success"]
+        assert slow.cancelled == 1 and fast.calls == 1
+        assert self.pool.hedge_wins == 1
+        assert all(b.outstanding == 0 for b in self.pool.backends)
+
+
+class TestCircuitBreaker:
+    """Testes para o circuit breaker dos provedores."""
+
+    def setup_method(self):
+        self.breaker = CircuitBreaker("ollama", window=4, min_calls=4, failure_rate=0.5, open_seconds=0.05)
+        self.upstream = FakeBackend(success=False)
+
+    def test_opens_fails_fast_and_recovers_through_half_open(self):
+        """Testa a sequência closed -> open (sem chamar o provedor) -> half_open -> closed."""
+        client = BreakerClient(self.upstream, self.breaker, "ollama")
+
+        async def run():
+            for _ in range(4):
+                await client.agenerate_response("p")
+            assert self.breaker.state == "open"
+            rejected = await client.agenerate_response("p")
+            assert rejected["circuit"] == "open" and self.upstream.calls == 4
+
+            await asyncio.sleep(0.06)
+            self.upstream.success = True
+            assert (await client.agenerate_response("p"))["success"]
+
+        asyncio.run(run())
+        assert self.breaker.state == "closed" and self.breaker.rejected == 1
+
+    def test_fallback_answers_while_open(self):
+        """Testa se o provedor reserva atende quando o circuito está aberto."""
+        client = BreakerClient(self.upstream, self.breaker, "ollama", fallback=MockClient())
+
+        async def run():
+            return [await client.agenerate_response("p") for _ in range(6)]
+
+        results = asyncio.run(run())
+
+        assert all(r["success"] and r["fallback_from"] == "ollama" for r in results)
+        assert self.upstream.calls == 4
+
+    def test_stream_slowness_is_time_to_first_token(self):
+        """Testa se um stream longo, mas com o primeiro token rápido, não conta como chamada lenta."""
+        breaker = CircuitBreaker("ollama", window=2, min_calls=2, slow_call_seconds=0.03, slow_call_rate=0.5)
+        client = BreakerClient(SlowStream(), breaker, "ollama")
+
+        async def run():
+            for _ in range(2):
+                assert [t async for t in client.astream_response("p")] == ["primeiro", "resto"]
+
+        asyncio.run(run())
+        assert breaker.state == "closed"
+
+    def test_open_circuit_skips_the_priority_gate(self):
+        """Testa se, com o circuito aberto, a chamada falha na hora em vez de esperar vaga na porta."""
+        from pipeline.stages import ChatContext, LLMStage, ProviderError
+
+        client = BreakerClient(self.upstream, self.breaker, "ollama")
+        gate = PriorityGate(1, {"low": (1, 0)})
+        stage = LLMStage(lambda: client, gate=gate)
+
+        async def run():
+            for _ in range(4):
+                await client.agenerate_response("p")
+            await gate.acquire("low")  # porta lotada e sem fila
+            with pytest.raises(ProviderError):
+                await stage.arun(ChatContext("oi"))
+
+        asyncio.run(run())
+        assert self.upstream.calls == 4 and self.breaker.rejected == 1
+
+
+class SlowStream:
+    async def astream_response(self, prompt, context=None):
+        yield "primeiro"
+        await asyncio.sleep(0.05)
+        yield "resto"
+
+
+class TestPriorityGate:
+    """Testes para a porta de prioridade das chamadas ao LLM."""
+
+    def setup_method(self):
+        self.gate = PriorityGate(
+            1,
+            {"high": (8, 10), "low": (1, 3)},
+            role_classes={"admin": "high", "guest": "low"},
+            demote_risk=30,
+        )
+
+    def test_classes_from_role_and_risk(self):
+        """Testa se papel define a classe e risco alto rebaixa para a de menor peso."""
+        assert self.gate.classify("admin", 10) == "high"
+        assert self.gate.classify("admin", 45) == "low"
+        assert self.gate.classify("desconhecido", 0) == "low"
+
+    def test_weighted_fair_order_and_queue_limit(self):
+        """Testa se a classe de maior peso passa à frente e se a fila cheia recusa na hora."""
+        order = []
+
+        async def call(cls, tag):
+            async with self.gate.slot(cls):
+                order.append(tag)
+                await asyncio.sleep(0)
+
+        async def run():
+            await self.gate.acquire("low")  # ocupa a única vaga
+            tasks = [asyncio.ensure_future(call("low", f"g{i}")) for i in range(3)]
+            tasks += [asyncio.ensure_future(call("high", f"a{i}")) for i in range(3)]
+            await asyncio.sleep(0)
+            with pytest.raises(QueueFullError):
+                await self.gate.acquire("low")
+            self.gate.release()
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
+
+        assert order == ["a0", "a1", "a2", "g0", "g1", "g2"]
+        info = self.gate.info()["classes"]
+        assert info["low"]["rejected"] == 1 and info["high"]["admitted"] == 3
+
+    def test_default_demote_threshold_ignores_role_and_hour_alone(self):
+        """Testa se, com a política padrão, fora do horário não rebaixa ninguém e comportamento de risco rebaixa."""
+        from datetime import datetime
+
+        from config import LLM_PRIORITY_CLASSES, LLM_PRIORITY_DEMOTE_RISK, LLM_PRIORITY_ROLES
+        from rbac_adaptativo.rbac import AdaptiveRBAC
+
+        gate = PriorityGate(1, LLM_PRIORITY_CLASSES, role_classes=LLM_PRIORITY_ROLES, demote_risk=LLM_PRIORITY_DEMOTE_RISK)
+        rbac = AdaptiveRBAC()
+        night = datetime(2024, 1, 1, 23, 0)
+        for role in ("admin", "user"):
+            score = rbac.calculate_risk_score(role, "Resuma este texto", timestamp=night)["risk_score"]
+            assert gate.classify(role, score) == LLM_PRIORITY_ROLES[role]
+
+        long_prompt = rbac.calculate_risk_score("user", "x" * 1800, timestamp=night)
+        assert long_prompt["action"] == "allow"
+        assert gate.classify("user", long_prompt["risk_score"]) == "low"
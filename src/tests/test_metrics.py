@@ -4,6 +4,7 @@ from src.metrics import (
     medir_latencia,
     calcular_throughput
 )
+import os
 import time
 
 
@@ -40,3 +41,59 @@ def test_latencia():
 def test_throughput():
     thr = calcular_throughput(100, 2)
     assert thr == 50  # 50 eventos por segundo
+
+
+def test_histogramas_prometheus_multiprocesso(tmp_path):
+    from src.metrics import MetricsRegistry
+
+    worker_a = MetricsRegistry()
+    worker_b = MetricsRegistry()
+    worker_a.enable_multiprocess(str(tmp_path), interval=60)
+    worker_b.multiprocess_dir = str(tmp_path)
+
+    worker_a.observe("stage_seconds", 0.0002, stage="firewall")
+    worker_a.inc("requests_total", outcome="ok")
+    worker_a.write_snapshot()
+    worker_a.disable_multiprocess()
+    # Simula o snapshot gravado por outro worker (outro pid)
+    (tmp_path / "metrics_1.json").write_text((tmp_path / f"metrics_{os.getpid()}.json").read_text())
+    (tmp_path / f"metrics_{os.getpid()}.json").unlink()
+    worker_b.observe("stage_seconds", 2.0, stage="firewall")
+
+    text = worker_b.render_prometheus()
+    assert 'stage_seconds_bucket{stage="firewall",le="0.00025"} 1' in text
+    assert 'stage_seconds_bucket{stage="firewall",le="+Inf"} 2' in text
+    assert 'stage_seconds_count{stage="firewall"} 2' in text
+    assert 'requests_total{outcome="ok"} 1' in text
+
+
+def test_trilha_de_auditoria_compartilhada_entre_workers(tmp_path):
+    """Entrada gravada por um worker é achada por outro (e sobrevive ao restart)."""
+    from metrics.audit_store import AuditTrail
+
+    path = tmp_path / "audit_log.jsonl"
+    worker_a, worker_b = AuditTrail(path), AuditTrail(path)
+    worker_a.record("req-1", {"verdict": "allowed", "controls_applied": [{"control": "firewall"}]})
+    worker_a.record("req-2", {"verdict": "blocked"})
+    worker_a.close()
+
+    assert worker_b.get("req-1")["controls_applied"] == [{"control": "firewall"}]
+    assert AuditTrail(path).get("req-2") == {"verdict": "blocked"}
+    assert worker_b.get("inexistente") is None
+    assert worker_a.stats()["written"] == 2
+
+
+def test_trilha_de_auditoria_rotaciona_e_mantem_o_indice(tmp_path):
+    """Arquivo cheio vira segmento numerado; entradas seguem achadas pelo índice até expirarem."""
+    from metrics.audit_store import AuditTrail
+
+    path = tmp_path / "audit_log.jsonl"
+    trail = AuditTrail(path, max_bytes=1, backups=2)
+    for i in range(4):
+        trail.record(f"req-{i}", {"i": i})
+        trail.close()
+
+    reader = AuditTrail(path)
+    assert trail.stats()["rotations"] == 3
+    assert [reader.get(f"req-{i}") for i in range(4)] == [None, {"i": 1}, {"i": 2}, {"i": 3}]
+    assert not (tmp_path / "audit_log.jsonl.1").exists()
@@ -17,3 +17,21 @@ class TestOutputSanitizer:
         assert len(result["sanitized_text"]) > 0
         assert "has_forbidden_content" in result
 
+    def test_engines_shared_with_input_sanitizer(self):
+        """Testa se os sanitizadores compartilham o mesmo registro de engines do Presidio."""
+        from sanitization.input_sanitizer import InputSanitizer
+        assert self.sanitizer.engines is InputSanitizer().engines
+
+
+    def test_streaming_sanitizer_catches_entity_split_across_chunks(self):
+        """Testa se uma entidade dividida entre chunks não vaza no streaming."""
+        from sanitization.streaming import StreamingOutputSanitizer
+        text = "Pode escrever para o suporte no endereco contato.suporte@empresa.com.br quando quiser, ok? " * 3
+        chunks = [text[i:i + 7] for i in range(0, len(text), 7)]
+
+        streamer = StreamingOutputSanitizer(self.sanitizer, holdback=32, min_flush=8)
+        emitted = "".join(streamer.feed(c) for c in chunks) + streamer.finish()
+
+        assert "empresa.com.br" not in emitted
+        assert emitted == self.sanitizer.sanitize(text)["sanitized_text"]
+        assert len(streamer.summary()["detected_entities"]) == len(self.sanitizer.sanitize(text)["detected_entities"])
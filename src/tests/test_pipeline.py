@@ -0,0 +1,125 @@
+"""Testes unitários para o pipeline de etapas do /chat."""
+import asyncio
+
+import pytest
+
+from pipeline.pipeline import ChatPipeline
+from pipeline.stages import ChatContext, Stage
+
+
+class Recorder(Stage):
+    def __init__(self, name, requires=(), provides=(), block=False, offload=False):
+        super().__init__()
+        self.name, self.requires, self.provides = name, requires, provides
+        self.block, self.offload = block, offload
+        self.batches = []
+
+    def run(self, ctx):
+        ctx.controls_applied.append(self.name)
+        if self.block is True or self.block == ctx.message:
+            ctx.response = {"response": "bloqueado"}
+
+    def run_batch(self, ctxs):
+        self.batches.append([ctx.message for ctx in ctxs])
+        super().run_batch(ctxs)
+
+
+class FlakyProvider(Stage):
+    name = "llm"
+    is_async = True
+
+    async def arun(self, ctx):
+        if ctx.message == "falha":
+            raise RuntimeError("provedor indisponível")
+        ctx.controls_applied.append(self.name)
+
+
+async def run_inline(fn, *args):
+    return fn(*args)
+
+
+class TestChatPipeline:
+    """Testes para ordem, validação e interrupção das etapas."""
+
+    def test_cheap_rejecting_stage_short_circuits_expensive_ones(self):
+        """Testa se uma etapa que rejeita interrompe o pipeline e registra tempos."""
+        gate = Recorder("gate", block=True)
+        ner = Recorder("ner", offload=True)
+        pipeline = ChatPipeline([gate, ner], run_inline)
+
+        ctx = asyncio.run(pipeline.run(ChatContext("oi")))
+
+        assert ctx.controls_applied == ["gate"]
+        assert ctx.stopped_at == "gate"
+        assert set(ctx.timings) == {"gate"}
+        assert ner.calls == 0 and gate.short_circuits == 1
+
+    def test_order_validated_against_declared_inputs(self):
+        """Testa se uma ordem que usa um dado antes de produzi-lo é rejeitada."""
+        sanitizer = Recorder("sanitizer", provides=("sanitized_prompt",))
+        llm = Recorder("llm", requires=("sanitized_prompt",))
+        ChatPipeline([sanitizer, llm], run_inline)
+        with pytest.raises(ValueError):
+            ChatPipeline([llm, sanitizer], run_inline)
+
+    def test_llm_requires_security_stages_and_sanitized_output(self):
+        """Testa se ordens que pulam firewall/RBAC ou a sanitização da saída são rejeitadas."""
+        from pipeline.stages import (
+            FirewallStage, InputSanitizerStage, LengthCheckStage, LLMStage, OutputSanitizerStage, RBACStage,
+        )
+
+        registry = {
+            stage.name: stage
+            for stage in (
+                LengthCheckStage(None), FirewallStage(None), InputSanitizerStage(None), RBACStage(None),
+                LLMStage(lambda: None), OutputSanitizerStage(None),
+            )
+        }
+        build = lambda names: ChatPipeline.from_names(names, registry, run_inline, outputs=("output",))
+
+        build(["firewall", "input_sanitizer", "rbac", "llm", "output_sanitizer"])
+        for names in (
+            ["input_sanitizer", "llm", "firewall", "rbac", "output_sanitizer"],
+            ["length_check", "input_sanitizer", "rbac", "llm", "output_sanitizer"],
+            ["firewall", "input_sanitizer", "rbac", "llm"],
+        ):
+            with pytest.raises(ValueError):
+                build(names)
+
+    def test_rbac_scores_the_sanitized_prompt(self):
+        """Testa se o RBAC roda fora do event loop e sobre o prompt já sanitizado."""
+        from pipeline.stages import InputSanitizerStage, RBACStage
+
+        class Sanitizer:
+            def sanitize(self, text):
+                return {"sanitized_text": text.replace("joao@example.com", "<EMAIL_ADDRESS>")}
+
+        class RBAC:
+            def evaluate_access(self, user_id, role, prompt, timestamp):
+                self.prompt = prompt
+                return {"allowed": True, "risk_score": 0}
+
+        rbac = RBAC()
+        stages = [InputSanitizerStage(Sanitizer()), RBACStage(rbac)]
+        with pytest.raises(ValueError):
+            ChatPipeline(stages[::-1], run_inline)
+
+        asyncio.run(ChatPipeline(stages, run_inline).run(ChatContext("escreva para joao@example.com")))
+        assert RBACStage.offload and rbac.prompt == "escreva para <EMAIL_ADDRESS>"
+
+    def test_batch_runs_each_stage_once_and_isolates_failures(self):
+        """Testa se o lote passa uma vez por etapa e se falhas/bloqueios ficam no próprio item."""
+        gate = Recorder("gate", block="bloquear")
+        ner = Recorder("ner", offload=True)
+        pipeline = ChatPipeline([gate, ner, FlakyProvider()], run_inline)
+
+        ctxs = [ChatContext(m) for m in ("a", "bloquear", "falha", "b")]
+        asyncio.run(pipeline.run_batch(ctxs, concurrency=2))
+
+        assert gate.batches == [["a", "bloquear", "falha", "b"]]
+        assert ner.batches == [["a", "falha", "b"]]
+        assert [c.controls_applied for c in ctxs] == [
+            ["gate", "ner", "llm"], ["gate"], ["gate", "ner"], ["gate", "ner", "llm"]
+        ]
+        assert ctxs[1].stopped_at == "gate"
+        assert isinstance(ctxs[2].error, RuntimeError)
@@ -0,0 +1,91 @@
+"""Testes unitários para o rate limiting (token bucket + middleware)."""
+from typing import List
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from rate_limit.middleware import RateLimitMiddleware
+from rate_limit.token_bucket import RateLimiter, TokenBucketStore
+
+
+class Payload(BaseModel):
+    message: str
+    user_id: str = "anon"
+
+
+class BatchPayload(BaseModel):
+    items: List[Payload]
+
+
+class TestRateLimit:
+    """Testes para limitação de taxa."""
+
+    def setup_method(self):
+        """Configuração antes de cada teste."""
+        self.limiter = RateLimiter(requests=2, window=60)
+        app = FastAPI()
+        app.add_middleware(RateLimitMiddleware, limiter=self.limiter, paths=("/chat",))
+
+        @app.post("/chat")
+        def chat(req: Payload):
+            return {"echo": req.message, "user_id": req.user_id}
+
+        @app.post("/chat/batch")
+        def chat_batch(req: BatchPayload):
+            return {"items": len(req.items)}
+
+        self.client = TestClient(app)
+
+    def test_token_bucket_refill_and_key_cap(self):
+        """Testa consumo, reabastecimento e limite de chaves do store."""
+        store = TokenBucketStore(capacity=1, refill_rate=0.5, max_keys=2)
+        assert store.acquire("a", now=0.0) == (True, 0.0)
+        allowed, retry_after = store.acquire("a", now=1.0)
+        assert not allowed and retry_after == pytest.approx(1.0)
+        assert store.acquire("a", now=2.0)[0]
+        store.acquire("b", now=2.0)
+        store.acquire("c", now=2.0)
+        assert len(store) == 2 and store.evictions == 1
+
+    def test_user_limit_returns_429_and_body_reaches_endpoint(self):
+        """Testa 429 com Retry-After por usuário e o corpo intacto quando permitido."""
+        self.limiter.by_ip = TokenBucketStore(capacity=100, refill_rate=1)
+        ok = self.client.post("/chat", json={"message": "oi", "user_id": "u1"})
+        assert ok.status_code == 200
+        assert ok.json() == {"echo": "oi", "user_id": "u1"}
+
+        # Header não verificado não troca o bucket: conta para o user_id do corpo
+        self.client.post("/chat", json={"message": "oi", "user_id": "u1"}, headers={"X-User-Id": "u2"})
+        limited = self.client.post("/chat", json={"message": "oi", "user_id": "u1"}, headers={"X-User-Id": "u9"})
+        assert limited.status_code == 429
+        assert int(limited.headers["Retry-After"]) >= 1
+        assert limited.json()["detail"]["scope"] == "user"
+        assert self.limiter.stats()["user"]["rejected"] == 1
+        # Outro usuário (mesmo IP) continua passando
+        assert self.client.post("/chat", json={"message": "oi", "user_id": "u3"}).status_code == 200
+
+    def test_rotating_user_header_does_not_escape_ip_limit(self):
+        """Testa se trocar o X-User-Id a cada requisição não contorna o bucket do IP."""
+        statuses = [
+            self.client.post("/chat", json={"message": "oi"}, headers={"X-User-Id": f"r{i}"}).status_code
+            for i in range(3)
+        ]
+        assert statuses == [200, 200, 429]
+        assert self.limiter.stats()["ip"]["rejected"] == 1
+
+    def test_batch_charges_one_token_per_item_and_each_user(self):
+        """Testa se o lote cobra um token do IP por item e o bucket de cada user_id."""
+        self.limiter.by_ip = TokenBucketStore(capacity=5, refill_rate=0.001)
+        batch = {"items": [{"message": "a", "user_id": "u1"}, {"message": "b", "user_id": "u1"}]}
+        assert self.client.post("/chat/batch", json=batch).status_code == 200
+
+        # u1 já gastou os 2 tokens do seu bucket nos itens do lote
+        limited = self.client.post("/chat/batch", json={"items": [{"message": "c", "user_id": "u1"}]})
+        assert limited.status_code == 429 and limited.json()["detail"]["scope"] == "user"
+
+        # Restam 2 tokens no IP: um lote de 3 itens de outros usuários é recusado
+        others = {"items": [{"message": "d", "user_id": f"u{i}"} for i in range(2, 5)]}
+        limited = self.client.post("/chat/batch", json=others)
+        assert limited.status_code == 429 and limited.json()["detail"]["scope"] == "ip"
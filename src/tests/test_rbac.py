@@ -22,3 +22,102 @@ class TestAdaptiveRBAC:
         assert result["risk_level"] in ["low", "medium", "high", "critical"]
         assert result["action"] in ["allow", "step_up", "block"]
 
+
+    def test_request_history_window_and_user_cap(self):
+        """Testa a janela deslizante do histórico e o limite de usuários em memória."""
+        from rbac_adaptativo.history import InMemoryRequestHistory
+        history = InMemoryRequestHistory(window=300, max_per_user=100, max_users=2)
+
+        for t in range(150):
+            history.record("u1", 1000.0 + t)
+        assert history.count("u1", 1149.0) == 100
+        assert history.count("u1", 1000.0 + 149 + 250) == 50
+
+        history.record("u2", 1200.0)
+        history.record("u3", 1201.0)
+        assert len(history) == 2
+        assert "u1" not in history
+        # Usuário ocioso além da janela sai do histórico
+        history.record("u4", 1600.0)
+        assert "u2" not in history and "u3" not in history
+
+    def test_sqlite_history_shared_between_instances(self, tmp_path):
+        """Testa se o backend SQLite é visto por outra instância (outro worker) e lê as próprias escritas."""
+        from rbac_adaptativo.history import SQLiteRequestHistory
+        path = str(tmp_path / "rbac_state.db")
+        worker_a = SQLiteRequestHistory(path, flush_interval=60)
+        worker_b = SQLiteRequestHistory(path, flush_interval=60)
+        try:
+            for t in range(12):
+                worker_a.record("u1", 1000.0 + t)
+            assert worker_a.count("u1", 1011.0) == 12
+            worker_a.flush()
+            worker_b.record("u1", 1012.0)
+            assert worker_b.count("u1", 1012.0) == 13
+            assert worker_b.count("u1", 1012.0 + 305) == 0
+        finally:
+            worker_a.close()
+            worker_b.close()
+
+    def test_sqlite_history_failed_flush_keeps_increments(self, tmp_path):
+        """Testa se uma gravação que falha devolve os incrementos à fila e se a thread grava sem novo tráfego."""
+        import sqlite3
+        import time
+        from rbac_adaptativo.history import SQLiteRequestHistory
+        path = str(tmp_path / "rbac_state.db")
+        worker_a = SQLiteRequestHistory(path, flush_interval=60, flush_size=1)
+        worker_b = SQLiteRequestHistory(path, flush_interval=60)
+        locker = sqlite3.connect(path, isolation_level=None)
+        try:
+            locker.execute("BEGIN IMMEDIATE")  # outro processo segurando o banco
+            worker_a._conn.execute("PRAGMA busy_timeout = 0")
+            worker_a.record("u1", 1000.0)
+            assert worker_a.stats()["flush_errors"] == 1 and worker_a.stats()["pending"] == 1
+            assert worker_a.count("u1", 1000.0) == 1
+            locker.execute("ROLLBACK")
+            assert worker_a.flush() and worker_b.count("u1", 1000.0) == 1
+
+            # Worker sem novo tráfego: a thread de gravação publica o incremento
+            worker_c = SQLiteRequestHistory(path, flush_interval=0.05)
+            worker_c.record("u2", 1000.0)
+            deadline = time.monotonic() + 2
+            while worker_b.count("u2", 1000.0) < 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert worker_b.count("u2", 1000.0) == 1
+            worker_c.close()
+        finally:
+            locker.close()
+            worker_a.close()
+            worker_b.close()
+
+    def test_evaluate_access_uses_compiled_policy(self, tmp_path):
+        """Testa a decisão de acesso pela política declarativa e a troca de política sem deploy."""
+        import json
+        from datetime import datetime
+        from rbac_adaptativo.policy import DEFAULT_POLICY_PATH
+
+        night = datetime(2024, 1, 1, 23, 0)
+        result = self.rbac.evaluate_access(user_id="g1", role="guest", prompt="Teste", timestamp=night)
+        assert result["risk_score"] == 70
+        assert result["action"] == "step_up"
+        assert result["allowed"] is False
+        assert self.rbac.evaluate_access(user_id="u1", role="user", prompt="Teste")["allowed"] is True
+
+        policy = json.loads(DEFAULT_POLICY_PATH.read_text(encoding="utf-8"))
+        policy["version"] = "2.0.0"
+        policy["allow_actions"] = ["allow", "step_up"]
+        path = tmp_path / "policy.json"
+        path.write_text(json.dumps(policy), encoding="utf-8")
+        self.rbac.reload_policy(str(path))
+
+        result = self.rbac.evaluate_access(user_id="g1", role="guest", prompt="Teste", timestamp=night)
+        assert result["allowed"] is True
+        assert result["policy_version"] == "2.0.0"
+
+        # Política que não nega nem o risk_score máximo é recusada; a atual continua
+        policy["version"] = "3.0.0"
+        policy["allow_actions"] = ["allow", "step_up", "block"]
+        path.write_text(json.dumps(policy), encoding="utf-8")
+        with pytest.raises(ValueError):
+            self.rbac.reload_policy(str(path))
+        assert self.rbac.policy.version == "2.0.0"